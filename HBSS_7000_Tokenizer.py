@@ -0,0 +1,83 @@
+"""HBSS 7000 Tokenizer
+
+Event based reader shared by the HIPS 7 engines in HBSS_Classes (IPS_FW_7000,
+IPS_AB_7000 and HIPS_7000).  Every HIPS 7 export is a list of
+EPOPolicySettings sections holding Setting name/value pairs, so the engines
+only need three events, which tokenizeExport delivers to a handler object:
+
+    beginSection(attributes)    an EPOPolicySettings element starts, with its
+                                attributes as a dictionary
+    setting(name, value)        a Setting element anywhere inside it
+    endSection()                the EPOPolicySettings element ends
+
+EPOPolicySettings sections are never nested, so a section is ended when the
+next one begins or the export ends; this saves a Python callback for every
+closing tag, which is a fair share of the parse time of a large export.
+
+The export is read in binary mode by expat, through HBSS_Input_Stream so a
+.xml.gz or .zip export is decompressed as it is read, and the engines do not
+depend on how the export is laid out: one element per line, indented, or the
+whole export on a single line all give the same events.  Values are passed with the
+XML entities already replaced (&quot; is ", &apos; is ', &amp; is &).
+"""
+
+import xml.parsers.expat
+
+import HBSS_Input_Stream
+
+
+class SectionHandler():
+    '''Base class for the handlers passed to tokenizeExport.  Every event is
+ignored unless the subclass overrides it.
+'''
+    def beginSection(self, attributes):
+        pass
+
+    def setting(self, name, value):
+        pass
+
+    def endSection(self):
+        pass
+
+
+def tokenizeExport(xml_file, handler):
+    '''Parses xml_file, the path of a plain or compressed export (see
+HBSS_Input_Stream) or a file object opened in binary mode, and
+calls the beginSection, setting and endSection methods of handler for every
+EPOPolicySettings section and Setting element.  Returns handler.  Raises
+xml.parsers.expat.ExpatError if the export is not well-formed, for example
+when it was cut short.
+'''
+    beginSection = handler.beginSection
+    setting = handler.setting
+    endSection = handler.endSection
+    open_section = []
+
+    def start(name, attr):
+        #ePO writes every Setting as name="..." value="...", anything else
+        #goes through a dictionary
+        if (name == 'Setting'):
+            if (attr[2:3] == ['value'] and attr[0] == 'name'):
+                setting(attr[1], attr[3])
+            else:
+                attributes = dict(zip(attr[::2], attr[1::2]))
+                setting(attributes.get('name', ''),
+                        attributes.get('value', ''))
+        elif (name == 'EPOPolicySettings'):
+            if open_section:
+                endSection()
+            else:
+                open_section.append(name)
+            beginSection(dict(zip(attr[::2], attr[1::2])))
+
+    parser = xml.parsers.expat.ParserCreate(intern = {})
+    parser.ordered_attributes = True
+    parser.StartElementHandler = start
+    if hasattr(xml_file, 'read'):
+        parser.ParseFile(xml_file)
+    else:
+        with HBSS_Input_Stream.openExport(xml_file) as export_file:
+            parser.ParseFile(export_file)
+    if open_section:
+        endSection()
+    return handler
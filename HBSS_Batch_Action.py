@@ -0,0 +1,237 @@
+"""HBSS XML Parser - Batch Conversion
+
+Converts every supported ePO export in a directory, plain or compressed
+(.xml.gz, .zip), with a pool of worker processes.  Each file is classified once, sent to exactly one engine, and the
+outcome of every file (outputs written or the error raised) is collected into
+a summary instead of being discarded.
+
+HIPS 8 FW rule sets are kept in an HBSS_Parse_Cache (by default .hbss_cache in
+the export directory), so exports that have not changed since the last run are
+not parsed again.
+
+With --stats or --stats-json every worker records the phases of its
+conversions (see HBSS_Stats) and they are reported together with the summary.
+--profile converts the files one at a time in this process, so that a single
+cProfile profile covers all of them.
+
+usage: python3 HBSS_Batch_Action.py [directory] [--workers N] [--since MM-DD-YYYY ...]
+                                    [--cache-dir DIR | --no-cache]
+                                    [--stats] [--stats-json FILE]
+                                    [--trace-memory] [--profile FILE]
+"""
+
+import argparse, os, sys, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import HBSS_Classes, HBSS_Input_Stream, HBSS_Parse_Cache, HBSS_Stats
+
+
+class BatchResult():
+    '''The outcome of converting a single XML file.  The outputs list holds
+the CSV files that were written, and error holds the formatted traceback if
+the conversion failed.  If statistics were recorded, stats holds the phases of
+the conversion as HBSS_Stats dictionaries.
+'''
+    def __init__(self, xml_file, product = None):
+        self.xml_file = xml_file
+        self.product = product
+        self.outputs = []
+        self.error = None
+        self.cached = False
+        self.seconds = 0.0
+        self.stats = None
+
+    def ok(self):
+        return self.error is None
+
+    def status(self):
+        '''Returns the status of the file as shown in the batch report.'''
+        if not self.ok():
+            return 'FAILED'
+        elif not self.product:
+            return 'SKIPPED (unsupported)'
+        elif self.cached:
+            return 'OK (cached)'
+        return 'OK'
+
+
+class BatchSummary():
+    '''Collects the BatchResult of every file in a batch run.'''
+    def __init__(self):
+        self.results = []
+        self.seconds = 0.0
+
+    def add(self, result):
+        self.results.append(result)
+
+    def converted(self):
+        return [result for result in self.results
+                if result.product and result.ok()]
+
+    def unsupported(self):
+        return [result for result in self.results
+                if not result.product and result.ok()]
+
+    def failed(self):
+        return [result for result in self.results if not result.ok()]
+
+    def report(self, out = None):
+        '''Prints one line per file followed by the totals, and the traceback
+of each failure.
+'''
+        out = out or sys.stdout
+        for result in sorted(self.results, key = lambda r: r.xml_file):
+            print('%-24s %-18s %7.2fs  %s' % (result.status(),
+                                              result.product or '',
+                                              result.seconds,
+                                              result.xml_file), file = out)
+        print('\n%d converted, %d unsupported, %d failed in %.2fs' %
+              (len(self.converted()), len(self.unsupported()),
+               len(self.failed()), self.seconds), file = out)
+        for result in self.failed():
+            print('\n' + result.xml_file + ':\n' + result.error, file = out)
+
+
+def convertXML(xml_file, since_dates = (), cache_dir = None,
+               record_stats = False, trace_memory = False):
+    '''Worker entry point: classifies a single xml_file and converts it with
+the engine registered for its product, using the parse cache in cache_dir if
+one is given.  With record_stats the phases of the conversion are recorded on
+the result, with their heap peaks if trace_memory is set.  Never raises;
+failures are recorded on the returned BatchResult.
+'''
+    result = BatchResult(xml_file)
+    started = time.time()
+    stats = None
+    if record_stats:
+        stats = HBSS_Stats.PhaseStats(trace_memory)
+        stats.start()
+    try:
+        cache = None
+        if cache_dir:
+            cache = HBSS_Parse_Cache.ParseCache(cache_dir)
+        hbss_parser = HBSS_Classes.HBSSXMLParser(since_dates, cache, stats)
+        hbss_object = hbss_parser.hbssObjectCreator(xml_file)
+        if (hbss_object):
+            result.product = hbss_object.featureid
+            hbss_object.parseAndWriteToCSV()
+            result.outputs = hbss_object.outputFiles()
+            result.cached = bool(cache and cache.hits)
+    except Exception:
+        result.error = traceback.format_exc()
+    if (stats is not None):
+        stats.stop()
+        result.stats = stats.toDicts()
+    result.seconds = time.time() - started
+    return result
+
+
+def batchConvert(xml_files, workers = None, since_dates = (), cache_dir = None,
+                 stats = None):
+    '''Converts every file in xml_files with a ProcessPoolExecutor of the
+given number of workers (default: one per CPU) and returns a BatchSummary.
+With workers == 1 the files are converted in this process.  cache_dir is the
+HBSS_Parse_Cache directory to use, or None to always parse.  If stats (an
+HBSS_Stats.PhaseStats) is given, the phases recorded for every file are added
+to it.
+'''
+    summary = BatchSummary()
+    started = time.time()
+    since_dates = list(since_dates)
+    stats_options = (stats is not None,
+                     stats is not None and stats.trace_memory)
+    if (workers == 1):
+        for xml_file in xml_files:
+            summary.add(convertXML(xml_file, since_dates, cache_dir,
+                                   *stats_options))
+    else:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            futures = {pool.submit(convertXML, xml_file, since_dates,
+                                   cache_dir, *stats_options): xml_file
+                       for xml_file in xml_files}
+            for future in as_completed(futures):
+                try:
+                    summary.add(future.result())
+                except Exception:
+                    #the worker process itself died
+                    result = BatchResult(futures[future])
+                    result.error = traceback.format_exc()
+                    summary.add(result)
+    if (stats is not None):
+        for result in sorted(summary.results, key = lambda r: r.xml_file):
+            stats.extend(result.stats or [])
+    summary.seconds = time.time() - started
+    return summary
+
+
+def directoryXMLList(directory = '.'):
+    '''Returns the paths of all .xml, .xml.gz and .zip exports in
+directory.
+'''
+    return [os.path.join(directory, each_file)
+            for each_file in sorted(os.listdir(directory))
+            if HBSS_Input_Stream.isExport(each_file)]
+
+
+def positiveInt(value):
+    '''argparse type for --workers: value must be a whole number above
+zero.
+'''
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if (number < 1):
+        raise argparse.ArgumentTypeError('invalid positive integer: ' +
+                                         repr(value))
+    return number
+
+
+def sinceDate(value):
+    '''argparse type for --since: value must be a MM-DD-YYYY date.  The
+string itself is returned, as it is part of the output file name.
+'''
+    try:
+        time.strptime(value, '%m-%d-%Y')
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid MM-DD-YYYY date: ' +
+                                         repr(value))
+    return value
+
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(
+        description = 'Convert a directory of ePO XML exports to CSV.')
+    arg_parser.add_argument('directory', nargs = '?', default = '.')
+    arg_parser.add_argument('--workers', type = positiveInt, default = None,
+                            help = 'worker processes (default: CPU count)')
+    arg_parser.add_argument('--since', action = 'append', default = [],
+                            type = sinceDate, metavar = 'MM-DD-YYYY',
+                            help = 'also write HIPS 8 FW rules changed since '
+                            'this date (may be repeated)')
+    arg_parser.add_argument('--cache-dir', default = None,
+                            help = 'parse cache directory '
+                            '(default: DIRECTORY/.hbss_cache)')
+    arg_parser.add_argument('--no-cache', action = 'store_true',
+                            help = 'always parse every export')
+    HBSS_Stats.addArguments(arg_parser)
+    args = arg_parser.parse_args(argv)
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(args.directory,
+                                                   '.hbss_cache')
+    workers = args.workers
+    if args.profile:
+        #worker processes would not show up in the profile
+        workers = 1
+    stats = HBSS_Stats.statsFromArguments(args)
+    summary = HBSS_Stats.runProfiled(args.profile, batchConvert,
+                                     directoryXMLList(args.directory), workers,
+                                     args.since, cache_dir, stats)
+    summary.report()
+    HBSS_Stats.reportFromArguments(stats, args)
+    return 1 if summary.failed() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""HBSS Benchmark
+
+Measures every conversion engine on synthetic exports of increasing size (see
+HBSS_Synthetic_Export) and saves the results as JSON, so a change in the
+throughput or peak memory of an engine shows up when the results of two
+releases are compared with --baseline.
+
+Each engine is timed stage by stage, in a fresh child process per export so
+the peak memory of one run does not carry over to the next:
+
+    HOSTIPS_8000_FW     parse, resolve (aggregates), order (groups), write
+    HOSTIPS_7000_FW     parse, order, resolve (cleaning, groups, values), write
+    HOSTIPS_7000_APP    parse, order, write
+    HOSTIPS_8000_IPS    parse, write
+    HOSTIPS_7000_IPS    parse, write, match
+
+The HIPS 8 IPS engine normally streams exceptions straight into the CSV; here
+they are collected first so parsing and writing can be timed apart.  The match
+stage of the HIPS 7 IPS engine times HIPS_Core.xmlMatch on its own over every
+setting of the export, after the conversion; it repeats work done during the
+parse, so it is left out of the total.  Peak
+memory is the child's peak resident set size where the platform reports it,
+and with --traced-memory also the peak of the Python heap, measured in a second
+run under tracemalloc (which slows the run down, so its times are not used).
+
+Generated exports are kept in the work directory and reused by later runs.
+
+usage: python3 HBSS_Benchmark.py [--products FEATUREID ...] [--sizes N ...]
+                                 [--output results.json] [--baseline old.json]
+                                 [--work-dir DIR] [--seed N] [--traced-memory]
+"""
+
+import argparse, datetime, json, os, platform, subprocess, sys, time
+import tracemalloc
+
+import HBSS_7000_Tokenizer, HBSS_Classes, HBSS_Synthetic_Export
+import HIPS_8_FW_XML_Parser_Action
+
+try:
+    import resource
+except ImportError:
+    #not available on Windows, peak_rss_mb is reported as None
+    resource = None
+
+
+class EngineRun():
+    '''Runs the engine of one product on xml_file, timing each stage.  The
+stages dictionary maps a stage name to its duration in seconds, and rules is
+the number of rules (or exceptions) the engine produced.  The side_stages are
+measured apart from the conversion and do not count towards its total.
+'''
+    side_stages = ('match',)
+
+    def __init__(self, xml_file):
+        self.xml_file = xml_file
+        self.stages = {}
+        self.rules = 0
+        self.output_files = []
+        self.product_dict = {
+            HBSS_Classes.HIPS_8000_FW.featureid:self.runFW8000,
+            HBSS_Classes.IPS_FW_7000.featureid:self.runFW7000,
+            HBSS_Classes.IPS_AB_7000.featureid:self.runAB7000,
+            HBSS_Classes.HIPS_8000.featureid:self.runIPS8000,
+            HBSS_Classes.HIPS_7000.featureid:self.runIPS7000
+            }
+
+    def run(self, featureid):
+        self.product_dict[featureid]()
+        return self
+
+    def stage(self, name, function, *args):
+        '''Calls function(*args), adding its duration to the named stage, and
+returns its result.
+'''
+        started = time.perf_counter()
+        result = function(*args)
+        self.stages[name] = (self.stages.get(name, 0.0) +
+                             time.perf_counter() - started)
+        return result
+
+    def runFW8000(self):
+        policy = self.stage('parse', HIPS_8_FW_XML_Parser_Action.parsexml,
+                            self.xml_file)
+        self.stage('resolve', policy.linkaggregates)
+        orderedruleset = self.stage('order', policy.order)
+        outputspecs = [HIPS_8_FW_XML_Parser_Action.OutputSpec(None, True)]
+        self.stage('write', HIPS_8_FW_XML_Parser_Action.writeoutputs,
+                   self.xml_file, policy.rules, orderedruleset, outputspecs)
+        self.rules = len(orderedruleset)
+        self.output_files = [spec.filename(self.xml_file)
+                             for spec in outputspecs]
+
+    def runFW7000(self):
+        hbss_object = HBSS_Classes.IPS_FW_7000(self.xml_file)
+        policy_list, rule_seq_dict = self.stage('parse',
+                                                hbss_object.initialParse)
+        policy_list = self.stage('order', hbss_object.policyOrderer,
+                                 policy_list, rule_seq_dict)
+        self.rules = len(policy_list)
+        #the engine writes the rows as policyRowStream produces them, they are
+        #collected here so the transform and the CSV writer are timed apart
+        policy_list = self.stage('resolve', list,
+                                 hbss_object.policyRowStream(policy_list))
+        self.stage('write', hbss_object.csvWriter, policy_list)
+        self.output_files = hbss_object.outputFiles()
+
+    def runAB7000(self):
+        hbss_object = HBSS_Classes.IPS_AB_7000(self.xml_file)
+        policy_list, rule_seq_dict = self.stage('parse',
+                                                hbss_object.initialParse)
+        policy_list = self.stage('order', hbss_object.policyOrderer,
+                                 policy_list, rule_seq_dict)
+        self.rules = len(policy_list)
+        policy_list.insert(0, hbss_object.header_list)
+        self.stage('write', hbss_object.csvWriter, policy_list)
+        self.output_files = hbss_object.outputFiles()
+
+    def runIPS8000(self):
+        hbss_object = HBSS_Classes.HIPS_8000(self.xml_file)
+        rows = self.stage('parse', list,
+                          hbss_object.HIPS8_iterIPSExceptions(self.xml_file))
+        self.runIPSWrite(hbss_object, rows)
+
+    def runIPS7000(self):
+        hbss_object = HBSS_Classes.HIPS_7000(self.xml_file)
+        rows = self.stage('parse', hbss_object.parserIPSMacro, self.xml_file,
+                          hbss_object.xml_control, hbss_object.running_csv,
+                          hbss_object.csv_d, hbss_object.default_d)
+        self.runIPSWrite(hbss_object, rows)
+        match_run = MatchRun(self, hbss_object.xmlMatch)
+        HBSS_7000_Tokenizer.tokenizeExport(self.xml_file, match_run)
+        match_run.flush()
+
+    def runIPSWrite(self, hbss_object, rows):
+        self.rules = len(rows)
+        self.stage('write', hbss_object.csvWriter, hbss_object.output_csv_file,
+                   hbss_object.header_list, rows)
+        self.output_files = hbss_object.outputFiles()
+
+
+class MatchRun(HBSS_7000_Tokenizer.SectionHandler):
+    '''Times xml_match, the xmlMatch method of a HIPS 7 IPS engine, over
+every setting of an export as the match stage of engine_run.  The settings are
+collected batch_size at a time outside the timed stage, so reading the export
+is not counted and memory does not grow with the size of the export.
+'''
+    batch_size = 10000
+
+    def __init__(self, engine_run, xml_match):
+        self.engine_run = engine_run
+        self.xml_match = xml_match
+        self.lines = []
+
+    def setting(self, name, value):
+        self.lines.append(HBSS_Classes.IPS7000ExceptionStream.settingLine(
+            name, value))
+        if (len(self.lines) == self.batch_size):
+            self.flush()
+
+    def flush(self):
+        self.engine_run.stage('match', self.matchLines, self.lines)
+        self.lines = []
+
+    def matchLines(self, lines):
+        xml_match = self.xml_match
+        for this_line in lines:
+            xml_match(this_line)
+
+
+def peakRSS():
+    '''Returns the peak resident set size of this process in MB, or None.'''
+    if (resource is None):
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if (sys.platform == 'darwin'):
+        return peak / 1048576.0
+    return peak / 1024.0
+
+
+def roundMB(value):
+    return None if (value is None) else round(value, 1)
+
+
+def childMain(featureid, xml_file, traced = False):
+    '''Child process entry point: runs one engine and prints its measurements
+as a JSON object.  The CSV files written by the engine are removed.
+'''
+    if traced:
+        tracemalloc.start()
+    engine_run = EngineRun(xml_file).run(featureid)
+    measurement = {'rules': engine_run.rules, 'stages': engine_run.stages,
+                   'peak_rss_mb': peakRSS()}
+    if traced:
+        measurement['peak_traced_mb'] = (tracemalloc.get_traced_memory()[1] /
+                                         1048576.0)
+        tracemalloc.stop()
+    for output_file in engine_run.output_files:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+    print(json.dumps(measurement))
+    return 0
+
+
+def measureChild(featureid, xml_file, traced = False):
+    '''Runs childMain in a fresh interpreter and returns its measurements.'''
+    command = [sys.executable, os.path.abspath(__file__), '--child', featureid,
+               xml_file]
+    if traced:
+        command.append('--traced-memory')
+    completed = subprocess.run(command, stdout = subprocess.PIPE,
+                               stderr = subprocess.PIPE,
+                               universal_newlines = True)
+    if (completed.returncode != 0):
+        raise RuntimeError('%s failed on %s:\n%s' % (featureid, xml_file,
+                                                     completed.stderr))
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def syntheticExport(featureid, size, seed, work_dir, regenerate = False):
+    '''Returns the path of the synthetic export of featureid and size in
+work_dir and the seconds spent generating it (0 if it was reused).
+'''
+    xml_file = os.path.join(work_dir, '%s_%d_seed%d.xml' % (featureid, size,
+                                                            seed))
+    if (os.path.exists(xml_file) and not regenerate):
+        return xml_file, 0.0
+    started = time.perf_counter()
+    HBSS_Synthetic_Export.SyntheticExport(size, seed).writeExport(featureid,
+                                                                  xml_file)
+    return xml_file, time.perf_counter() - started
+
+
+def benchmark(products, sizes, seed = 0, work_dir = 'hbss_benchmark',
+              traced = False, regenerate = False, out = None):
+    '''Measures every product at every size and returns the results
+dictionary that is saved as JSON.
+'''
+    out = out or sys.stdout
+    os.makedirs(work_dir, exist_ok = True)
+    results = []
+    for size in sizes:
+        for featureid in products:
+            xml_file, generate_seconds = syntheticExport(featureid, size, seed,
+                                                         work_dir, regenerate)
+            xml_bytes = os.path.getsize(xml_file)
+            measurement = measureChild(featureid, xml_file)
+            if traced:
+                measurement['peak_traced_mb'] = measureChild(
+                    featureid, xml_file, True)['peak_traced_mb']
+            stages = {}
+            for name, seconds in measurement['stages'].items():
+                stages[name] = {'seconds': round(seconds, 4),
+                                'rules_per_second':
+                                round(measurement['rules'] / seconds)
+                                if seconds else None}
+            if stages.get('parse', {}).get('seconds'):
+                stages['parse']['mb_per_second'] = round(
+                    xml_bytes / 1048576.0 / stages['parse']['seconds'], 2)
+            result = {'product': featureid, 'size': size,
+                      'rules': measurement['rules'], 'xml_bytes': xml_bytes,
+                      'generate_seconds': round(generate_seconds, 2),
+                      'stages': stages,
+                      'total_seconds': round(sum(
+                          seconds for name, seconds
+                          in measurement['stages'].items()
+                          if name not in EngineRun.side_stages), 4),
+                      'peak_rss_mb': roundMB(measurement['peak_rss_mb']),
+                      'peak_traced_mb':
+                      roundMB(measurement.get('peak_traced_mb'))}
+            results.append(result)
+            print('%-18s %8d rules %9.3fs  %s MB peak  %s' % (
+                featureid, result['rules'], result['total_seconds'],
+                '%.0f' % result['peak_rss_mb']
+                if result['peak_rss_mb'] is not None else '?',
+                '  '.join('%s %.3fs' % (name, stage['seconds'])
+                          for name, stage in stages.items())), file = out)
+    return {'tool_version': HBSS_Classes.tool_version,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created': datetime.datetime.now(
+                datetime.timezone.utc).isoformat(timespec = 'seconds'),
+            'seed': seed, 'results': results}
+
+
+def compareResults(results, baseline, threshold = 1.2, min_seconds = 0.05,
+                   out = None):
+    '''Prints each stage time and peak memory against the matching entry
+(same product and size) of a baseline results dictionary, and returns the
+number of values that grew by more than threshold times.  Stages that got
+slower by less than min_seconds are not counted, as the shortest stages are
+mostly timer noise.
+'''
+    out = out or sys.stdout
+    previous = {(result['product'], result['size']): result
+                for result in baseline['results']}
+    regressions = 0
+    print('\ncompared with tool_version %s (%s):' % (
+        baseline.get('tool_version'), baseline.get('created')), file = out)
+    for result in results['results']:
+        old = previous.get((result['product'], result['size']))
+        if (old is None):
+            continue
+        values = [(name, old['stages'][name]['seconds'], stage['seconds'], 's')
+                  for name, stage in result['stages'].items()
+                  if name in old['stages']]
+        for key in ('peak_rss_mb', 'peak_traced_mb'):
+            if (old.get(key) and result.get(key)):
+                values.append((key, old[key], result[key], ' MB'))
+        for name, old_value, new_value, unit in values:
+            ratio = new_value / old_value if old_value else 1.0
+            flag = ''
+            if ((ratio > threshold) and
+                ((unit != 's') or (new_value - old_value >= min_seconds))):
+                flag = '  REGRESSION'
+                regressions += 1
+            print('%-18s %8d %-16s %10.3f%s -> %10.3f%s  x%.2f%s' % (
+                result['product'], result['size'], name, old_value, unit,
+                new_value, unit, ratio, flag), file = out)
+    return regressions
+
+
+def main(argv = None):
+    products = list(HBSS_Synthetic_Export.SyntheticExport(0).product_dict)
+    arg_parser = argparse.ArgumentParser(
+        description = 'Benchmark the conversion engines on synthetic exports.')
+    arg_parser.add_argument('--products', nargs = '+', default = products,
+                            choices = products, metavar = 'FEATUREID')
+    arg_parser.add_argument('--sizes', nargs = '+', type = int,
+                            default = [1000, 10000, 100000])
+    arg_parser.add_argument('--output', default = 'hbss_benchmark.json',
+                            help = 'results file (default: %(default)s)')
+    arg_parser.add_argument('--baseline', default = None,
+                            help = 'earlier results file to compare with')
+    arg_parser.add_argument('--threshold', type = float, default = 1.2,
+                            help = 'slowdown ratio reported as a regression')
+    arg_parser.add_argument('--work-dir', default = 'hbss_benchmark',
+                            help = 'directory for the synthetic exports')
+    arg_parser.add_argument('--seed', type = int, default = 0)
+    arg_parser.add_argument('--regenerate', action = 'store_true',
+                            help = 'write the synthetic exports again')
+    arg_parser.add_argument('--traced-memory', action = 'store_true',
+                            help = 'also measure the Python heap peak')
+    arg_parser.add_argument('--child', nargs = 2, default = None,
+                            metavar = ('FEATUREID', 'XML'),
+                            help = argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+    if args.child:
+        return childMain(args.child[0], args.child[1], args.traced_memory)
+    results = benchmark(args.products, args.sizes, args.seed, args.work_dir,
+                        args.traced_memory, args.regenerate)
+    with open(args.output, 'w') as results_file:
+        json.dump(results, results_file, indent = 2)
+    print('results written to ' + args.output)
+    if args.baseline:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if compareResults(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,11 @@ Developed by: Wade, Timothy J
 tjwade.sd@gmail.com
 """
 
-tool_version = 0.201
+tool_version = 0.216
 
-import csv, os, copy, xml.dom.minidom
+import csv, itertools, os, re, sys, xml.parsers.expat, xml.sax.saxutils
+import HBSS_7000_Tokenizer, HBSS_Input_Stream, HBSS_IP_Decoder, HBSS_Stats
+import HIPS_8_FW_XML_Parser_Action
 
 ################################################################################
 # BEGIN CLASS DECLARATION
@@ -31,18 +33,33 @@ the hbss_object_list is appended with an object that contains the necessary
 dictionaries and methods to parse that .XML file and create a spreadsheet
 appropriate to its function.
 '''
-    def __init__(self):
+    featureid_pattern = re.compile(
+        rb'<EPOPolicySettings\s[^>]*?\bfeatureid\s*=\s*["\']([^"\']+)["\']')
+    policyname_pattern = re.compile(
+        rb'<EPOPolicySettings\s[^>]*?\bname\s*=\s*["\']([^"\':]*)')
+
+    def __init__(self, since_dates = None, cache = None, stats = None):
         '''An HBSSXMLParser Object begins with two empty lists, and a dictionary
-of supported products.  This dictionary ties supported products to the function
-necessary to build objects associated with each supported product.
+of supported products.  This dictionary ties the featureid declared by each
+supported product class to the function necessary to build objects associated
+with that product.  The optional since_dates are handed to HIPS 8 FW objects,
+which write an additional CSV of the rules changed since each date, and the
+optional cache (an HBSS_Parse_Cache.ParseCache) lets them skip parsing exports
+that have not changed.  The optional stats (an HBSS_Stats.PhaseStats) is handed
+to every object created, which records the phases of its conversion in it.
 '''
    
         self.xml_list = []
         self.hbss_object_list = []
-        self.product_dict = {'HOSTIPS_7000_IPS':self.ips7000HipsBLDR,
-                             'HOSTIPS_8000_IPS':self.ips8000HipsBLDR,
-                             'HOSTIPS_7000_FW':self.ips7000FWBLDR,
-                             'HOSTIPS_7000_APP':self.ips7000ABBLDR
+        self.since_dates = list(since_dates or [])
+        self.cache = cache
+        self.stats = stats
+        self.sniff_size = 16384
+        self.product_dict = {HIPS_7000.featureid:self.ips7000HipsBLDR,
+                             HIPS_8000.featureid:self.ips8000HipsBLDR,
+                             IPS_FW_7000.featureid:self.ips7000FWBLDR,
+                             IPS_AB_7000.featureid:self.ips7000ABBLDR,
+                             HIPS_8000_FW.featureid:self.ips8000FWBLDR
                              }
 
     def singleFileXMLListBLDR(self, file):
@@ -55,10 +72,10 @@ xml_list, for the conversion into a single .CSV file.
         '''The currentDirXMLListBLDR is used to create a list of .XML files
 based on the current directory that this object resides in, as determined by
 the os.listdir() function. (This creates the dependancy that requires an
-'import os'.)
+'import os'.)  Compressed .xml.gz and .zip exports are listed too.
 '''
         for each_file in os.listdir():
-            if each_file.endswith('.xml'):
+            if HBSS_Input_Stream.isExport(each_file):
                 self.xml_list.append(each_file)
 
     def ips7000HipsBLDR(self, xml_file):
@@ -94,6 +111,13 @@ this functionality is instead found in the IPS component using signature
 '''
         return IPS_AB_7000(xml_file)
 
+    def ips8000FWBLDR(self, xml_file):
+        '''The ips8000FWBLDR function creates an object of type HIPS_8000_FW,
+which hands a HIPS 8 FW policy to the HIPS_8_FW_XML_Parser_Action parser.
+It is passed an xml_file that will be associated with that object.
+'''
+        return HIPS_8000_FW(xml_file, self.since_dates, self.cache)
+
     def hbssObjectListBLDR(self):
         '''The hbssObjectListBLDR function iterates through each element of the
 xml_list attribute of this class and invokes the hbssObjectCreator function.
@@ -105,25 +129,47 @@ object to the hbss_object_list.
             if (hbss_object):
                 self.hbss_object_list.append(hbss_object)
 
+    def productSniffer(self, xml_file):
+        '''The productSniffer function reads a fixed size prefix of the
+xml_file, sniff_size bytes, and returns the featureid attribute of the first
+EPOPolicySettings element found in it, or None if there is none.  Only the
+start of a compressed export is decompressed.
+'''
+        with HBSS_Input_Stream.openExport(xml_file) as product_checker:
+            prefix = product_checker.read(self.sniff_size)
+        found = self.featureid_pattern.search(prefix)
+        if (found):
+            return found.group(1).decode('ascii', 'replace')
+
+    def policyNameSniffer(self, xml_file):
+        '''The policyNameSniffer function returns the name of the policy an
+xml_file was exported from, taken from the name attribute of the first
+EPOPolicySettings element in its first sniff_size bytes (the part before the
+first colon), or None if there is none.
+'''
+        with HBSS_Input_Stream.openExport(xml_file) as product_checker:
+            prefix = product_checker.read(self.sniff_size)
+        found = self.policyname_pattern.search(prefix)
+        if (found):
+            return xml.sax.saxutils.unescape(
+                found.group(1).decode('utf-8', 'replace'),
+                {'&quot;': '"', '&apos;': "'"})
+
     def hbssObjectCreator(self,xml_file):
         '''The hbssObjectCreator function is passed an xml_file by the function
-hbssObjectListBldr.  It opens that xml_file, and begins to iterate through each
-line of the xml file, checking each line against its dictionary of supported
-products.  If a key value from that dictionary is found in a line of the XML
-it will use that key to call the function associated to that key, passing
-the xml_file, and then return the resultant object from that function call.
-
-It will check up to 20 lines of an XML before aborting.
-'''
-        with open(xml_file, 'r') as product_checker:
-            x = 0
-            for current_line in product_checker:
-                if (x > 20):
-                    return
-                for key in self.product_dict:
-                    if key in current_line:                        
-                        return self.product_dict[key](xml_file)
-                x += 1
+hbssObjectListBldr.  It sniffs the featureid of that xml_file, and if that
+featureid is a key of its dictionary of supported products, it will use that
+key to call the function associated to that key, passing the xml_file, and
+then return the resultant object from that function call.
+
+Only the first sniff_size bytes of the XML are read to identify it.
+'''
+        builder = self.product_dict.get(self.productSniffer(xml_file))
+        if (builder):
+            hbss_object = builder(xml_file)
+            if (self.stats is not None):
+                hbss_object.stats = self.stats
+            return hbss_object
         
     def hbssObjParseToCSV(self):
         '''The hbssObjParseToCSV function will iterate through each element of
@@ -133,10 +179,7 @@ resulting in specially formatted CSV spreadsheets based on that product.
 '''
         for hbss_object in self.hbss_object_list:
             try:
-                if ("HOSTIPS_8000" in hbss_object.PolicyType):
-                    hbss_object.HIPS8_parseAndWriteToCSV()
-                elif ("HOSTIPS_7000" in hbss_object.PolicyType):
-                    hbss_object.parseAndWriteToCSV()
+                hbss_object.parseAndWriteToCSV()
             except AttributeError:
                 pass
 
@@ -153,11 +196,125 @@ resulting in specially formatted CSV spreadsheets based on that product.
 # HBSSMasterObject
 class HBSSMasterObject:
     '''The HBSSMasterObject is the parent class of all HBSS supported objects
-below.
+below.  The stats attribute is the HBSS_Stats.PhaseStats that the phases of
+parseAndWriteToCSV are recorded in; by default nothing is recorded.
+
+The 7000 series engines with a rule sequence (IPS_FW_7000 and IPS_AB_7000)
+share ruleSeqDictCreator and policyOrderer, which keep the problems found in
+the rule sequence in repeated_sequence_entries and sequence_problems.
 '''
+    featureid = None
+    stats = HBSS_Stats.nostats
+    sequence_report_limit = 10
+
     def __init__(self, input_xml_file = None):
         self.input_xml_file = input_xml_file
-        self.output_csv_file = self.input_xml_file[:-4] + '_CSV.csv'
+        self.output_csv_file = (HBSS_Input_Stream.exportBase(input_xml_file) +
+                                '_CSV.csv')
+        self.repeated_sequence_entries = []
+        self.sequence_problems = {}
+
+    def outputFiles(self):
+        '''Returns the list of files written by parseAndWriteToCSV.'''
+        return [self.output_csv_file]
+
+    def phaseCall(self, method, *args):
+        '''Calls method(*args) as a phase of the conversion named after the
+method and returns its result.  If the result is a list, its length is
+recorded as the rows of the phase.
+'''
+        with self.stats.phase(method.__name__) as phase:
+            result = method(*args)
+            if isinstance(result, list):
+                phase.counts['rows'] = len(result)
+        return result
+
+    def parsePhaseCall(self, method, *args):
+        '''Calls the initial parse method(*args) of a 7000 series engine as a
+phase, recording the bytes of the input, the rules found and the length of the
+rule sequence.  Returns the (rules, rule sequence) result.
+'''
+        self.stats.setSource(self.input_xml_file)
+        with self.stats.phase(method.__name__) as phase:
+            policy_list, rule_seq_dict = method(*args)
+            phase.counts.update(bytes = os.path.getsize(self.input_xml_file),
+                                rules = len(policy_list),
+                                sequence = len(rule_seq_dict))
+        return policy_list, rule_seq_dict
+
+    def ruleSeqDictCreator(self, setting_name, rule_ID_num, rule_seq_dict):
+        '''Builds the rules sequence dictionary from a single rule sequence
+setting.  A rule ID listed more than once keeps its last sequence number and is
+recorded in repeated_sequence_entries.
+'''
+        rule_sequence_num = setting_name.split('#')[1]
+        if (rule_ID_num in rule_seq_dict):
+            self.repeated_sequence_entries.append(rule_ID_num)
+        rule_seq_dict[rule_ID_num] = rule_sequence_num
+        return rule_seq_dict
+
+    def policyOrderer(self, running_list, rule_seq_dict):
+        '''Places policy in order based on the sequencing dictionary.  The
+rule ID is the last field of every rule.  The rules are sorted on their
+sequence number by a stable sort, so rules with the same number keep the order
+they were read in, and memory and time depend on the number of rules only and
+not on how large their rule IDs or sequence numbers are.  Rules without a
+usable sequence entry are placed after the others in the order they were read.
+The problems found are kept in sequence_problems and printed to stderr.
+'''
+        unplaced = float('inf')
+        positions = []
+        unsequenced = []
+        for rule in running_list:
+            try:
+                positions.append(int(rule_seq_dict[rule[-1]]))
+            except (KeyError, ValueError):
+                positions.append(unplaced)
+                unsequenced.append(rule[-1])
+        order = sorted(range(len(running_list)), key = positions.__getitem__)
+        placed = len(running_list) - len(unsequenced)
+        shared_positions = []
+        if (len(set(positions)) < placed + (1 if unsequenced else 0)):
+            for x in range(1, placed):
+                position = positions[order[x]]
+                if (position == positions[order[x - 1]] and
+                    (not shared_positions or shared_positions[-1] != position)):
+                    shared_positions.append(position)
+        unused = []
+        if (shared_positions or len(rule_seq_dict) != placed):
+            rule_IDs = set(rule[-1] for rule in running_list)
+            unused = [rule_ID_num for rule_ID_num in rule_seq_dict
+                      if (rule_ID_num not in rule_IDs)]
+        self.sequence_problems = {'unsequenced':unsequenced,
+                                  'unused':unused,
+                                  'shared':shared_positions,
+                                  'repeated':list(self.repeated_sequence_entries)
+                                  }
+        self.reportSequenceProblems()
+        return [running_list[x] for x in order]
+
+    def reportSequenceProblems(self, out = None):
+        '''Prints one line to stderr for every kind of problem found in the
+rule sequence by policyOrderer, naming the first few rules or positions.
+'''
+        messages = {'unsequenced':'rules without a rule sequence entry were '
+                                  'placed last, RuleID',
+                    'unused':'rule sequence entries have no rule, RuleID',
+                    'shared':'rule sequence positions hold more than one '
+                             'rule, position',
+                    'repeated':'rules are listed more than once in the rule '
+                               'sequence, RuleID'
+                    }
+        out = out or sys.stderr
+        for problem, message in messages.items():
+            found = self.sequence_problems.get(problem)
+            if found:
+                listed = ', '.join(str(value) for value
+                                   in found[:self.sequence_report_limit])
+                if (len(found) > self.sequence_report_limit):
+                    listed += ', ...'
+                print('%s: %d %s %s' % (self.input_xml_file, len(found),
+                                        message, listed), file = out)
         
 ################################################################################
 # END: HBSS Master Object Class
@@ -168,6 +325,134 @@ below.
 ################################################################################
 #
 #
+# HIPS8ExceptionStream
+class HIPS8ExceptionStream():
+    '''The HIPS8ExceptionStream holds the expat handlers used by
+HIPS_Core.HIPS8_iterIPSExceptions.  Only the exception currently being read is
+kept; each finished exception is appended to the rows list as a single line
+for the spreadsheet, and the caller empties that list as it goes.
+'''
+    def __init__(self, row_length):
+        self.row_length = row_length
+        self.rows = []
+        self.isException = False
+        self.section_depth = 0
+
+    def start(self, name, attr):
+        if (name == 'Setting'):
+            if (self.isException and self.section_depth):
+                self.setting(attr.get('name', ''), attr.get('value', ''))
+        elif (name == 'Section'):
+            self.section_depth += 1
+        elif (name == 'EPOPolicySettings'):
+            self.isException = (attr.get('param_int') == '1')
+            self.section_depth = 0
+            if self.isException:
+                self.running_csv = ['']*self.row_length
+                self.app_path = ''
+                self.target_app_path = ''
+                self.signatureID = ''
+                self.users = ''
+                self.all_sig = True
+                self.all_user = True
+
+    def setting(self, setting_name, setting_value):
+        running_csv = self.running_csv
+        if (setting_name == 'Name'):
+            running_csv[0] = setting_value
+        if ('2$SignatureID#' in setting_name):
+            self.signatureID += setting_value + ' '
+            self.all_sig = False
+        if ('OSUserName#' in setting_name):
+            self.users += setting_value + ' '
+            self.all_user = False
+        if ('+AppPath#' in setting_name):
+            self.app_path += setting_value + ' '
+        if ('+TargetAppPath#' in setting_name):
+            self.target_app_path += setting_value + ' '
+        if ('+$' in setting_name):
+            running_csv[4] += setting_name[2:-2] + ':' + setting_value + ' '
+        if (setting_name == 'Note'):
+            running_csv[5] = setting_value
+        if (setting_name == 'LastModifyDate'):
+            running_csv[6] = setting_value.split('T')[0]
+
+    def end(self, name):
+        if (name == 'Section'):
+            self.section_depth -= 1
+        elif (name == 'EPOPolicySettings' and self.isException):
+            self.isException = False
+            running_csv = self.running_csv
+            if (self.all_sig):
+                running_csv[1] = 'All signatures'
+            else:
+                running_csv[1] = self.signatureID
+            if (self.all_user):
+                running_csv[2] = 'All users'
+            else:
+                running_csv[2] = self.users
+            if (self.app_path != ''):
+                running_csv[3] = 'app_path: ' + self.app_path
+            if (self.target_app_path != ''):
+                running_csv[3] += 'target_app_path: ' + self.target_app_path
+            self.rows.append(running_csv)
+            self.running_csv = None
+#
+#
+# IPS7000ExceptionStream
+class IPS7000ExceptionStream(HBSS_7000_Tokenizer.SectionHandler):
+    '''The IPS7000ExceptionStream consumes the HBSS_7000_Tokenizer events of a
+HIPS 7 IPS policy for HIPS_Core.parserIPSMacro.  Every setting of an exception
+section is matched against the xml_d dictionary of the HIPS_Core object by its
+xmlMatch method, which is handed the setting as it appears in the export
+(settingLine) and returns both the column of the setting and the signature flag
+it sets.
+'''
+    def __init__(self, hips_object, xml_control, csv_d, default_d):
+        self.hips_object = hips_object
+        self.xmlMatch = hips_object.xmlMatch
+        self.xml_control = xml_control
+        self.csv_d = csv_d
+        self.default_d = default_d
+        self.rows = []
+        self.isException = False
+        self.running_csv = None
+
+    def beginSection(self, attributes):
+        exception = self.xml_control['exception']
+        for value in attributes.values():
+            if (exception in value):
+                self.isException = True
+                self.running_csv = ['']*len(self.csv_d)
+                break
+
+    def setting(self, name, value):
+        if not self.isException:
+            return
+        csv_mapper, flag = self.xmlMatch(self.settingLine(name, value))
+        if flag:
+            setattr(self.hips_object, flag, True)
+        if (csv_mapper):
+            column = self.csv_d[csv_mapper[0]]
+            param_type = csv_mapper[1]
+            if (param_type == 'NA'):
+                param_type = ''
+            if (self.running_csv[column]):
+                self.running_csv[column] += ' '
+            self.running_csv[column] += param_type + value
+
+    @staticmethod
+    def settingLine(name, value):
+        return '<Setting name="' + name + '" value="' + value + '"/>'
+
+    def endSection(self):
+        if self.isException:
+            self.isException = False
+            if self.hips_object.sigBooleanChecker(self.running_csv):
+                self.rows.append(self.hips_object.defaultIPSValueCreator(
+                    self.running_csv, self.default_d))
+#
+#
 # HIPS_CORE child of HBSSMasterObject
 class HIPS_Core(HBSSMasterObject):
     '''The HIPS_Core class is a child of the HBSSMasterObject and contains
@@ -181,10 +466,18 @@ number of header columns that have been defined in the code.  The xml_dkey is
 a key that operates on the list entries of the xml_d dictionary.  The xml_d is a
 dictionary that maps the strings associated with specific XML tags to the
 csv_d dictionary, and parameter type.  The xml_control dictionary includes the
-strings associated with controlling the main loop of XML parsing such as where
-to begin exceptions, where to end exceptions, and how to split lines into a
-tag/value.  The header_list is used to define the first line of the spreadsheet.
+string that marks an EPOPolicySettings section as an exception.  The
+header_list is used to define the first line of the spreadsheet.  The
+signature_flags map the strings that set the 'has_signature' and
+'all_signatures' flags to the name of the flag.  A line that contains the
+custom_param_tag but none of the xml_d tags is a custom parameter, named by the
+text that follows the tag.
 '''
+    signature_flags = {'2$SignatureID#':'has_signature',
+                       '"IncludeAllSignatures" value="1"':'all_signatures'
+                       }
+    custom_param_tag = '+$'
+
     def __init__(self, input_xml_file = None):
         '''A HIPS_Core object is passed an xml_file that has been validated to
 contain key information identifying it as an XML associated with an IPS product.
@@ -236,10 +529,7 @@ being written to the final output.
                       'excep_name':['<Setting name="Name"', 'excep_name', 'NA'],
                       'Last_modified':['<Setting name="LastModify', 'Last_modified', 'NA']
                      }
-        self.xml_control = {'val_split':'value="',
-                           'begin_tag':'<EPOPolicySettings',
-                           'end_tag':'</EPOPolicySettings>',
-                           'exception':'IPSException'
+        self.xml_control = {'exception':'IPSException'
                            }
         self.header_list = ['Exception Name',
                             'Signature',
@@ -251,6 +541,8 @@ being written to the final output.
                             ]
         self.has_signature = False
         self.all_signatures = False
+        self.xml_matcher = None
+        self.xml_results = {}
         
     def adjustInputFile(self, input_file):
         '''This method allows the input_xml_file to be modified at runtime.
@@ -270,124 +562,76 @@ passing a number of its attributes to the parserIPSMacro function.  This
 pased_list will be passed to the csvWriter function, along with the
 output_csv_file, and the header_list.
 '''
-        parsed_list = self.parserIPSMacro(self.input_xml_file,
-                                          self.xml_control,
-                                          self.running_csv,
-                                          self.csv_d,
-                                          self.default_d)
-        self.csvWriter(self.output_csv_file, self.header_list,
-                       parsed_list)
+        self.stats.setSource(self.input_xml_file)
+        with self.stats.phase('parserIPSMacro') as phase:
+            parsed_list = self.parserIPSMacro(self.input_xml_file,
+                                              self.xml_control,
+                                              self.running_csv,
+                                              self.csv_d,
+                                              self.default_d)
+            phase.counts.update(bytes = os.path.getsize(self.input_xml_file),
+                                exceptions = len(parsed_list))
+        with self.stats.phase('csvWriter') as phase:
+            phase.counts['rows'] = self.csvWriter(self.output_csv_file,
+                                                  self.header_list, parsed_list)
     
-    def HIPS8_parseAndWriteToCSV(self):         
-        parsed_list = self.HIPS8_parserIPSMacro(self.input_xml_file,
-                                          self.xml_control,
-                                          self.running_csv,
-                                          self.csv_d, self.default_d)
-        self.csvWriter(self.output_csv_file, self.header_list,
-                       parsed_list)
-      
+    def HIPS8_parseAndWriteToCSV(self):
+        '''HIPS 8 counterpart of parseAndWriteToCSV.  Exceptions are streamed
+from the XML straight into the CSV writer, so no more than one exception is
+held in memory at a time, and parsing and writing are a single phase.
+'''
+        self.stats.setSource(self.input_xml_file)
+        with self.stats.phase('HIPS8_iterIPSExceptions+csvWriter') as phase:
+            exceptions = self.csvWriter(
+                self.output_csv_file, self.header_list,
+                self.HIPS8_iterIPSExceptions(self.input_xml_file))
+            phase.counts.update(bytes = os.path.getsize(self.input_xml_file),
+                                exceptions = exceptions)
+
     def HIPS8_parserIPSMacro(self, input_xml_file, xml_control, running_csv, csv_d, default_d):
-        node = []
-        section = []
-        setting = []
-        single_line_list = []
-        app_path = ""
-        target_app_path = ""
-        parameter_name = ""
-        parameter_value = ""
-        signatureID = ""
-        users = ""
-        all_sig = True
-        all_user = True
-        dom = xml.dom.minidom.parse(input_xml_file)
-        for node in dom.getElementsByTagName("EPOPolicySettings"):
-            isException = False            
-            if (node.getAttribute ("param_int") == "1"):                
-                isException = True
-                running_csv = ['']*len(self.csv_d)
-                app_path = ""
-                target_app_path = ""
-                parameter_name = ""
-                parameter_value = ""
-                signatureID = ""
-                users = ""
-                all_sig = True
-                all_user = True
-            if isException:                                      
-                for section in node.getElementsByTagName('Section'):  
-                    for setting in section.getElementsByTagName('Setting'):
-                        if (setting.getAttribute ("name") == "Name"):
-                            running_csv[0] = setting.getAttribute ("value")
-                        if ("2$SignatureID#" in setting.getAttribute ("name")):
-                            signatureID += setting.getAttribute ("value") + ' '
-                            all_sig = False
-                        if ("OSUserName#" in setting.getAttribute ("name")):
-                            users += setting.getAttribute ("value") + ' '
-                            all_user = False
-                        if ("+AppPath#" in setting.getAttribute ("name")):
-                            app_path += setting.getAttribute ("value") + ' '   
-                        if ("+TargetAppPath#" in setting.getAttribute ("name")):
-                            target_app_path += setting.getAttribute ("value") + ' '
-                        if ("+$" in setting.getAttribute ("name")):
-                            parameter_name = setting.getAttribute ("name")[2:-2]
-                            parameter_value = setting.getAttribute ("value")
-                            running_csv[4] += parameter_name + ":" + parameter_value + ' '
-                        if (setting.getAttribute ("name") == "Note"):
-                            running_csv[5] = setting.getAttribute ("value")
-                        if (setting.getAttribute ("name") == "LastModifyDate"):
-                            justdate = setting.getAttribute ("value").split('T')
-                            running_csv[6] = justdate[0]
-                if (all_sig):
-                    running_csv[1] = "All signatures"
-                else:
-                    running_csv[1] = signatureID
-                if (all_user):
-                    running_csv[2] = "All users"
-                else:
-                    running_csv[2] = users
-                if (app_path != ""):
-                    running_csv[3] = "app_path: " + app_path
-                if (target_app_path != ""):
-                    running_csv[3] += "target_app_path: " + target_app_path
-                single_line_list.append(running_csv)
-        return single_line_list        
+        '''Returns the list of every exception row in a HIPS 8 IPS policy.  The
+rows are produced by HIPS8_iterIPSExceptions; this method is kept for callers
+that want the whole list at once.
+'''
+        return list(self.HIPS8_iterIPSExceptions(input_xml_file))
+
+    def HIPS8_iterIPSExceptions(self, input_xml_file, chunk_size = 65536):
+        '''Generator yielding one row per EPOPolicySettings block with
+param_int="1" in a HIPS 8 IPS policy.  The XML is fed to expat chunk_size
+bytes at a time and every other element is discarded as it is seen, so peak
+memory does not grow with the size of the export.
+'''
+        exception_stream = HIPS8ExceptionStream(len(self.csv_d))
+        parser = xml.parsers.expat.ParserCreate()
+        parser.StartElementHandler = exception_stream.start
+        parser.EndElementHandler = exception_stream.end
+        with HBSS_Input_Stream.openExport(input_xml_file) as ips_xml:
+            while True:
+                chunk = ips_xml.read(chunk_size)
+                parser.Parse(chunk, not chunk)
+                if exception_stream.rows:
+                    rows, exception_stream.rows = exception_stream.rows, []
+                    yield from rows
+                if not chunk:
+                    break
 
     def parserIPSMacro(self, input_xml_file, xml_control, running_csv,
                        csv_d, default_d):
         '''This is the main logic loop for parsing an HBSS product XML.  It
 uses a single line builder logic, such that a single exeception is placed on
-a single line.  It will call the parserIPSMicro to identify if each XML line
+a single line.  The XML is read by HBSS_7000_Tokenizer, and an
+IPS7000ExceptionStream calls xmlMatch to identify if each setting
 contains information that is related to an exception line for the resulting
 spreadsheet.  Once an entire exception has been captured, that exception will
-be placed in the single_line_list, which is a master list for each single
-exception.  
-Only lines that are related to exceptions are processed, skip the rest of the lines.
-'''
-        single_line_list = []
-        isException = False
-        with open(input_xml_file, 'r') as ips_xml:
-            for each_line in ips_xml:                 
-                if each_line.startswith(xml_control['begin_tag']) and xml_control['exception'] in each_line:
-                    isException = True
-                    running_csv = ['']*len(self.csv_d)
-                if isException:
-                    self.sigBooleanSetter(each_line)                    
-                    csv_mapper = self.parserIPSMicro(each_line)
-                    if (csv_mapper):
-                        entry = each_line.split(xml_control['val_split'])
-                        if (csv_mapper[1] == 'NA'):
-                            csv_mapper[1] = ''
-                        if (running_csv[csv_d[csv_mapper[0]]]):
-                            running_csv[csv_d[csv_mapper[0]]] += ' '
-                        running_csv[csv_d[csv_mapper[0]]] += (csv_mapper[1] +
-                                                          entry[1][:-4])
-                    if (each_line.startswith(xml_control['end_tag'])):
-                        isException = False
-                        if self.sigBooleanChecker(running_csv):
-                            running_csv = self.defaultIPSValueCreator(running_csv,
-                                                                  default_d)
-                            single_line_list.append(running_csv)
-        return single_line_list
+be placed in the list returned, which is a master list for each single
+exception.
+Only sections that are exceptions are processed, the rest are skipped.
+'''
+        self.compileXMLMatcher()
+        exception_stream = IPS7000ExceptionStream(self, xml_control, csv_d,
+                                                  default_d)
+        HBSS_7000_Tokenizer.tokenizeExport(input_xml_file, exception_stream)
+        return exception_stream.rows
 
     def sigBooleanChecker(self, running_csv):
         '''This function checks the boolean values that are marked when an
@@ -402,29 +646,48 @@ check has been made.
             self.all_signature = False
             return True
 
-    def sigBooleanSetter(self, this_line):
-        '''Sets flags to support signature control logic.'''
-
-        if ('2$SignatureID#' in this_line):
-            self.has_signature = True
-        if ('\"IncludeAllSignatures\" value=\"1\"' in this_line):
-            self.all_signatures = True
-            
-    def parserIPSMicro(self, this_line):
-        '''The parserIPSMicro is the logic necessary to be passed a single line
-from the input XML, and comparse that line to the IPS dictionary.  If a match
-is found, appropriate data related to that match is passed back to the
-parserIPSMacro function.
-'''
-        for key in self.xml_d:            
-            if (self.xml_d[key][self.xml_dkey['xml_tag']] in this_line):
-                return ([self.xml_d[key][self.xml_dkey['cell_array']],
-                         self.xml_d[key][self.xml_dkey['param_type']]])
-        if ('+$' in this_line):      
-            custom_param = this_line.split('+$')
-            custom_param = custom_param[1].split('#')
-            return ('param_val', custom_param[0] + ': ')
-        return False
+    def compileXMLMatcher(self):
+        '''Compiles the xml_tag of every xml_d entry, the signature_flags and
+the custom_param_tag into xml_matcher, a single regular expression of all of
+them in that order, and fills xml_results with the (csv_mapper, flag) result of
+each string it can match.  A tag starting with '$' is also matched with a '+' in
+front of it, so it is found before the custom_param_tag it starts inside of.
+parserIPSMacro compiles the matcher again before every parse, so changes made
+to xml_d are picked up.
+'''
+        xml_results = {}
+        for key in self.xml_d:
+            xml_entry = self.xml_d[key]
+            xml_tag = xml_entry[self.xml_dkey['xml_tag']]
+            result = ([xml_entry[self.xml_dkey['cell_array']],
+                       xml_entry[self.xml_dkey['param_type']]],
+                      self.signature_flags.get(xml_tag))
+            if xml_tag.startswith('$'):
+                xml_results.setdefault('+' + xml_tag, result)
+            xml_results.setdefault(xml_tag, result)
+        for flag_string, flag in self.signature_flags.items():
+            xml_results.setdefault(flag_string, (False, flag))
+        xml_results.setdefault(self.custom_param_tag, (None, None))
+        self.xml_results = xml_results
+        self.xml_matcher = re.compile('|'.join(re.escape(xml_string)
+                                               for xml_string in xml_results))
+
+    def xmlMatch(self, this_line):
+        '''Scans this_line once and returns (csv_mapper, flag): csv_mapper is
+the [column, parameter type] of the setting, or False, and flag is the name of
+the signature flag the line sets, or None.  The leftmost string found decides,
+so a tag in the value of a setting does not override the tag in its name.
+'''
+        if (self.xml_matcher is None):
+            self.compileXMLMatcher()
+        match = self.xml_matcher.search(this_line)
+        if (match is None):
+            return False, None
+        csv_mapper, flag = self.xml_results[match.group()]
+        if (csv_mapper is None):
+            custom_param = this_line[match.end():].split(self.custom_param_tag)
+            return ('param_val', custom_param[0].split('#')[0] + ': '), None
+        return csv_mapper, flag
 
     def defaultIPSValueCreator(self, running_csv, default_d):
         '''This method will load the default entries of an empty cell into that
@@ -437,13 +700,16 @@ cell for final spreadsheet formatting.
 
     def csvWriter(self, output_csv_file, header_list, master_list):
         '''This method will iterate through the final formatted list of IPS
-exceptions, writing a CSV file.
+exceptions, writing a CSV file, and returns the number of exceptions written.
 '''
+        row_count = 0
         with open(output_csv_file, 'w', newline = '') as output_file:
             hips_writer = csv.writer(output_file, delimiter = ',')
             hips_writer.writerow(header_list)
             for each_entry in master_list:
-                hips_writer.writerow(each_entry)        
+                hips_writer.writerow(each_entry)
+                row_count += 1
+        return row_count
 #
 #
 # HIPS_7000 child of HIPS_CORE
@@ -451,6 +717,8 @@ class HIPS_7000(HIPS_Core):
     '''The HIPS_7000 class is a child of the HIPS_Core class, and contains the
 unique elements of HIPS 7 to allow product specific parsing.
 '''
+    featureid = 'HOSTIPS_7000_IPS'
+
     def __init__(self, input_xml = None):
         '''The xml_d is updated with the full suite of HIPS 7 specific XML tags
 and HIPS 7 parameters
@@ -479,6 +747,8 @@ unique elements of HIPS 8 to allow product specific parsing.
 THIS CLASS IS WORK IN PROGRESS
 
 '''
+    featureid = 'HOSTIPS_8000_IPS'
+
     def __init__(self, input_xml = None):
         '''The xml_d is updated with the full suite of HIPS 8 specific XML tags
 and HIPS 8 parameters
@@ -494,6 +764,10 @@ HIPS 8 dictionary at this time.
                                      'Target Exectuable: ']
         self.xml_d['target_handler'] = ['+HandlerAppPath#', 'param_val',
                                         'Target Handler: ']
+
+    def parseAndWriteToCSV(self):
+        '''HIPS 8 policies are written by HIPS8_parseAndWriteToCSV.'''
+        self.HIPS8_parseAndWriteToCSV()
 ################################################################################
 # END: IPS Classes
 ################################################################################
@@ -512,24 +786,75 @@ common elements between Firewall products.
         HBSSMasterObject.__init__(self, input_xml_file)
         self.PolicyType = "HOSTIPS_7000_FW"
     def csvWriter(self, final_list, output_csv_file = None):
+        '''Writes every row of final_list, which may be any iterable of rows,
+and returns the number of rows written.
+'''
         output_csv_file = output_csv_file or self.output_csv_file
+        row_count = 0
         with open(output_csv_file, 'w', newline = '') as output_file:
             hips_writer = csv.writer(output_file, delimiter = ',')
             for each_row in final_list:
                 hips_writer.writerow(each_row)
+                row_count += 1
+        return row_count
+#
+#
+# FW7000RuleStream
+class FW7000RuleStream(HBSS_7000_Tokenizer.SectionHandler):
+    '''The FW7000RuleStream consumes the HBSS_7000_Tokenizer events of a
+HIPS 7 FW policy for IPS_FW_7000.initialParse.  Each section with a Data
+setting becomes one rule: the comma separated fields of its Data followed by
+its LastModifyDate and RuleID, in the order they appear.  The rule sequence
+settings fill rule_seq_dict.
+'''
+    def __init__(self, fw_object, parse_dict, num_of_rule_fields):
+        self.fw_object = fw_object
+        self.num_of_rule_fields = num_of_rule_fields
+        self.data_tag = parse_dict['data_tag']
+        self.rule_ID = parse_dict['rule_ID']
+        self.Last_modified = parse_dict['Last_modified']
+        self.rule_order = parse_dict['rule_order']
+        self.initial_parse_list = []
+        self.rule_seq_dict = {}
+        self.single_entry = []
+        self.data_written = False
+
+    def beginSection(self, attributes):
+        self.single_entry = []
+        self.data_written = False
+
+    def setting(self, name, value):
+        if (name == self.data_tag):
+            single_entry = value.split(',')
+            if (len(single_entry) > self.num_of_rule_fields):
+                single_entry = self.fw_object.dataStringFixer(single_entry)
+            self.single_entry = single_entry
+            self.data_written = True
+        elif (self.data_written and name == self.Last_modified):
+            self.single_entry.append(value[:10])
+        elif (self.data_written and name == self.rule_ID):
+            self.single_entry.append(value)
+        elif name.startswith(self.rule_order):
+            self.fw_object.ruleSeqDictCreator(name, value, self.rule_seq_dict)
+
+    def endSection(self):
+        if self.data_written:
+            self.initial_parse_list.append(self.single_entry)
 #
 #
 # IPS_FW_7000 child of IPS_FW_Core
 class IPS_FW_7000(IPS_FW_Core):
+        featureid = 'HOSTIPS_7000_FW'
+
         def __init__(self, input_xml_file = None):
             IPS_FW_Core.__init__(self, input_xml_file)
             self.num_of_rule_fields = 37
-            self.parse_dict = {'begin':'<EPOPolicySettings',
-                               'data_tag':'<Setting name="Data" value="',
-                               'rule_ID':'<Setting name="RuleID" value="',
-                               'Last_modified':'<Setting name="LastModifyDate" value="',
-                               'rule_order':'<Setting name="+RuleIDSequence#',
-                               'end':'</EPOPolicySettings>'
+            #names of the settings read by FW7000RuleStream, rule_order is
+            #the prefix of the rule sequence settings
+            self.parse_dict = {'data_tag':'Data',
+                               'rule_ID':'RuleID',
+                               'Last_modified':'LastModifyDate',
+                               'rule_order':'+RuleIDSequence#'
                                }
             self.cleaner_dict = {0:{'TRUE':'Enabled', 'FALSE':'Disabled'},
                                  1:{'TRUE':'Allow', 'FALSE':'Block'},
@@ -581,13 +906,132 @@ class IPS_FW_7000(IPS_FW_Core):
                                       
         
         def parseAndWriteToCSV(self):
-            policy_list, rule_seq_dict = self.initialParse()
-            policy_list = self.policyOrderer(policy_list, rule_seq_dict)
-            policy_list = self.policyFieldCleaner(policy_list)
-            policy_list = self.groupRuleDivisionCreator(policy_list)
-            policy_list = self.valuesFromCleanerDictionary(policy_list)
-            policy_list = self.headerToPolicyAdder(policy_list)
-            self.csvWriter(policy_list)
+            '''The ordered rules are cleaned, divided into groups, translated
+and written one rule at a time by policyRowStream, so no intermediate copy of
+the policy is made.
+'''
+            policy_list, rule_seq_dict = self.parsePhaseCall(self.initialParse)
+            policy_list = self.phaseCall(self.policyOrderer, policy_list,
+                                         rule_seq_dict)
+            with self.stats.phase('policyRowStream+csvWriter') as phase:
+                phase.counts['rows'] = self.csvWriter(
+                    self.policyRowStream(policy_list))
+
+        def policyRowStream(self, running_list):
+            '''Generator yielding the rows of the spreadsheet, header first,
+for the ordered running_list, with a constant amount of work per field.
+'''
+            if not running_list:
+                return iter([self.headerRow(0)])
+            last_line = self.ruleFieldCleaner(running_list[-1])
+            lines = self.groupRuleDivisionStream(
+                map(self.ruleFieldCleaner, running_list), last_line)
+            lines = map(self.valueFromCleanerDictionary, lines)
+            return self.headerRowStream(lines)
+
+        def ruleFieldCleaner(self, rule):
+            '''Returns the cleaned line of a single rule: the IP field decoded,
+the ports combined and the strings and fingerprint formatted.  The rule is not
+modified.
+'''
+            if not rule:
+                return ['']
+            single_line = rule[0:6]
+            single_line.append(self.ipFieldFromHex(rule[6]))
+            single_line.append(rule[7])
+            single_line.append(self.portFieldCombiner(rule[8:14]))
+            single_line.append(self.portFieldCombiner(rule[14:20]))
+            single_line.append(self.dataStringFormat(rule[20]))
+            single_line.append(self.dataStringFormat(rule[21]))
+            if (len(rule) > 22):
+                single_line.append(self.dataFingerPrint(rule[22]))
+                single_line += rule[23:]
+            else:
+                single_line.append('')
+            return single_line
+
+        def groupRuleDivisionStream(self,
+                                    lines,
+                                    last_line,
+                                    group_column = 14,
+                                    name_column = 10):
+            '''Generator replacing the first line of every rule group with a
+BEGIN GROUP line and closing the group with an END GROUP line.  The first line
+is compared with last_line, the last line of the policy.  An END GROUP line is only written once a group has begun, and a
+policy that ends inside a group is closed by a final END GROUP line.
+'''
+            ender_length = len(last_line)
+            previous_line = last_line
+            current_group = None
+            for single_line in lines:
+                if (single_line != [''] and previous_line != ['']):
+                    if ((single_line[group_column] != '2') and
+                        (previous_line[group_column] == '2') and
+                        (current_group is not None)):
+                        previous_line = [''] * ender_length
+                        previous_line[name_column] = ('END GROUP: ' +
+                                                      current_group)
+                        yield previous_line
+                    if (single_line[group_column] == '1'):
+                        current_group = single_line[name_column]
+                        single_line = [''] * len(previous_line)
+                        single_line[name_column] = ('BEGIN GROUP: ' +
+                                                    current_group)
+                yield single_line
+                previous_line = single_line
+            if (current_group is not None and previous_line != [''] and
+                previous_line[group_column] == '2'):
+                previous_line = [''] * ender_length
+                previous_line[name_column] = 'END GROUP: ' + current_group
+                yield previous_line
+
+        def valueFromCleanerDictionary(self,
+                                       single_line,
+                                       cleaner_dict = None):
+            '''Translates the values of a single line with direct lookups in
+the cleaner_dict.
+'''
+            cleaner_dict = cleaner_dict or self.cleaner_dict
+            line_length = len(single_line)
+            for y, cleaner_values in cleaner_dict.items():
+                if (y < line_length):
+                    value = single_line[y]
+                    single_line[y] = cleaner_values.get(value, value)
+            if (single_line[0] == 'Disabled'):
+                single_line[1] = 'Disabled'
+            return single_line
+
+        def headerColumns(self,
+                          header_on_off_key = None,
+                          header_dict = None):
+            '''Returns the sorted columns switched on in header_on_off_key.'''
+            header_on_off_key = header_on_off_key or self.header_on_off_key
+            header_dict = header_dict or self.header_dict
+            return [y for y in sorted(header_dict)
+                    if header_on_off_key.get(header_dict[y]) == 'Y']
+
+        def headerRow(self, line_count):
+            '''Returns the header for a policy of line_count lines, which only
+names the columns numbered below line_count.
+'''
+            return [self.header_dict[y] for y in self.headerColumns()
+                    if (y < line_count)]
+
+        def headerRowStream(self, lines):
+            '''Generator yielding the header and then the switched on columns
+of every line.  Only the first lines are held back, until it is known whether the header needs all of its
+columns.
+'''
+            columns = self.headerColumns()
+            last_column = columns[-1] if columns else -1
+            held_lines = list(itertools.islice(lines, last_column + 1))
+            yield self.headerRow(len(held_lines))
+            for single_line in itertools.chain(held_lines, lines):
+                if (len(single_line) > last_column):
+                    yield [single_line[y] for y in columns]
+                else:
+                    yield [single_line[y] for y in columns
+                           if (y < len(single_line))]
 
         def initialParse(self,
                          input_xml_file = None,
@@ -596,65 +1040,22 @@ class IPS_FW_7000(IPS_FW_Core):
             input_xml_file = input_xml_file or self.input_xml_file
             parse_dict = parse_dict or self.parse_dict
             num_of_rule_fields = num_of_rule_fields or self.num_of_rule_fields
-            initial_parse_list, rule_seq_dict = [], {}
-            with open(input_xml_file, 'r') as hips_file:
-                for this_entry in hips_file:
-                    if this_entry.startswith(parse_dict['begin']):
-                        single_entry = []
-                        data_written = False
-                    if this_entry.startswith(parse_dict['data_tag']):
-                        single_entry = this_entry.split(
-                            parse_dict['data_tag'])                       
-                        single_entry = single_entry[1][:-4].split(',')
-                        if (len(single_entry) > num_of_rule_fields):
-                            single_entry = self.dataStringFixer(single_entry)
-                        data_written = True
-                    if (this_entry.startswith(parse_dict['Last_modified']) and
-                    data_written == True):
-                        fw_last_modified = this_entry.split(parse_dict['Last_modified'])
-                        fw_last_modified = fw_last_modified[1][:10]
-                        single_entry.append(fw_last_modified)
-                    if (this_entry.startswith(parse_dict['rule_ID']) and
-                        data_written == True):
-                        rule_id = this_entry.split(parse_dict['rule_ID'])
-                        single_entry.append(rule_id[1][:-4])
-                    if (this_entry.startswith(parse_dict['end']) and
-                        data_written == True):
-                        initial_parse_list.append(single_entry)
-                    if this_entry.startswith(parse_dict['rule_order']):
-                        rule_set_dict = self.ruleSeqDictCreator(this_entry,
-                                                                rule_seq_dict)
-                return initial_parse_list, rule_seq_dict
+            self.repeated_sequence_entries = []
+            rule_stream = FW7000RuleStream(self, parse_dict, num_of_rule_fields)
+            HBSS_7000_Tokenizer.tokenizeExport(input_xml_file, rule_stream)
+            return rule_stream.initial_parse_list, rule_stream.rule_seq_dict
 
         def dataStringFixer(self, data):
             x, max_loops = 0, len(data)
             while (x < max_loops):
-                if ((data[x].startswith('&quot;') == True) and
-                    (data[x].endswith('&quot;') == False)):
-                    while(data[x].endswith('&quot;') == False):
+                if ((data[x].startswith('"') == True) and
+                    (data[x].endswith('"') == False)):
+                    while(data[x].endswith('"') == False):
                         data[x] = data[x] + ',' + data.pop(x+1)
                         max_loops =- 1
                 x += 1
             return data
 
-        def ruleSeqDictCreator(self, entry, rule_seq_dict):
-            entry = entry.split('" value="')
-            rule_sequence_num = entry[0].split('#')[1]
-            rule_ID_num = entry[1][:-4]
-            rule_seq_dict[rule_ID_num] = rule_sequence_num
-            return rule_seq_dict
-
-        def policyOrderer(self, running_list, rule_seq_dict):
-            final_list = [''] * len(rule_seq_dict)
-            for z in range(len(running_list)):
-                key = running_list[z][-1]
-                x = int(rule_seq_dict[key])
-                final_list[x] = running_list[z]
-            try:
-                final_list.remove('')
-            finally:
-                return final_list
-
         def portFieldCombiner(self, single_line):
             if (single_line[0] == '0'):
                 if (single_line[2] == '0'):
@@ -679,48 +1080,11 @@ class IPS_FW_7000(IPS_FW_Core):
                 return 'Any'
 
         def ipFieldFromHex(self, hex_field):
-            ip_dict = {'0000:0000:0000:0000:0000:0000:0000:0000':'Any',
-                       '[trusted]':'Trusted'}
-            subnet_mask = ''
-            for key in ip_dict:
-                if key in hex_field:
-                    return ip_dict[key]
-            if hex_field.startswith('0000:0000:0000:0000:0000:ffff:'):
-                hex_field = hex_field.replace(
-                    '0000:0000:0000:0000:0000:ffff:', '')
-                ip_v4 = True
-            if (ip_v4 != True):
-                return hex_field
-            if ('-' in hex_field):
-                hex_field = hex_field.split('-')
-                for y in range(2):
-                    hex_field[y] = hex_field[y].split(':')
-                    for z in range(2):
-                        first_oct = int(hex_field[y][z][:2], 16)
-                        second_oct = int(hex_field[y][z][2:], 16)
-                        hex_field[y][z] = (str(first_oct) + '.' +
-                                           str(second_oct))
-                    hex_field[y] = hex_field[y][0] + '.' + hex_field[y][1]
-                hex_field = hex_field[0] + ' - ' + hex_field[1]
-                return hex_field
-            if ('/' in hex_field):
-                hex_field = hex_field.split('/')
-                subnet_mask = int(hex_field[1]) - 96
-                subnet_mask = '/' + str(subnet_mask)
-                hex_field = hex_field[0]
-            hex_field = hex_field.split(':')
-            for z in range(2):
-                first_oct = int(hex_field[z][:2], 16)
-                second_oct = int(hex_field[z][2:], 16)
-                hex_field[z] = (str(first_oct) + '.' + str(second_oct))
-            hex_field = hex_field[0] + '.' + hex_field[1]
-            hex_field  = hex_field + subnet_mask
-            return hex_field
+            return HBSS_IP_Decoder.ipFieldFromHex(hex_field)
         
         def dataStringFormat(self, string):
-            new_string = string.replace('&quot;', '')
-            new_string = new_string.replace('&apos;', '\'')
-            new_string = new_string.replace('&lt;--&gt;', '--')
+            new_string = string.replace('"', '')
+            new_string = new_string.replace('<-->', '--')
             return new_string
 
         def dataFingerPrint(self, finger_print):
@@ -728,94 +1092,39 @@ class IPS_FW_7000(IPS_FW_Core):
                 finger_print = ''
             return finger_print
 
-        def policyFieldCleaner(self, running_list):
-            cleaned_list = []
-            for x in range(len(running_list)):
-                single_line = []
-                if(running_list[x]):
-                    for y in range(6):
-                        single_line.append(running_list[x].pop(0))
-                    single_line.append(self.ipFieldFromHex(
-                        running_list[x].pop(0)))
-                    single_line.append(running_list[x].pop(0))
-                    for y in range(2):                        
-                        single_line.append(self.portFieldCombiner(
-                            running_list[x][:6]))
-                        running_list[x][:6] = []
-                    for y in range(2):
-                        single_line.append(self.dataStringFormat(
-                            running_list[x].pop(0)))
-                try:
-                    single_line.append(self.dataFingerPrint(
-                        running_list[x].pop(0)))
-                except Exception:
-                    single_line.append('')
-                single_line += running_list[x]
-                cleaned_list.append(single_line)
-            return cleaned_list
-
-        def groupRuleDivisionCreator(self,
-                                     running_list,
-                                     group_column = 14,
-                                     name_column = 10):
-            group_ender_list = [''] *len(running_list[-1])
-            group_begin_list = group_ender_list
-            x = 0
-            while (x < len(running_list)):
-                if(running_list[x] != [''] and
-                   running_list[x-1] !=['']):
-                    if ((running_list[x][group_column] != '2') and
-                        (running_list[x-1][group_column] == '2')):
-                        group_ender_list[name_column] = ('END GROUP: ' +
-                                                         current_group)
-                        running_list.insert(x, copy.deepcopy(group_ender_list))
-                        x = x + 1
-                    if (running_list[x][group_column] == '1'):
-                        current_group = running_list[x][name_column]
-                        running_list[x] = [''] *len(running_list[x-1])
-                        running_list[x][name_column] = ('BEGIN GROUP: ' +
-                                                        current_group)
-                x = x + 1
-            return running_list
-
-        def valuesFromCleanerDictionary(self,
-                                        running_list,
-                                        cleaner_dict = None):
-            cleaner_dict = cleaner_dict or self.cleaner_dict
-            for x in range(len(running_list)):
-                for y in range(len(running_list[x])):
-                    if y in cleaner_dict:
-                        for key in cleaner_dict[y]:
-                            if (key == running_list[x][y]):
-                                running_list[x][y] = cleaner_dict[y][key]
-            for x in range(len(running_list)):
-                if (running_list[x][0] == 'Disabled'):
-                    running_list[x][1] = 'Disabled'
-            return running_list
-
-        def headerToPolicyAdder(self,
-                                running_list,
-                                header_on_off_key = None,
-                                header_dict = None):
-            header_on_off_key = header_on_off_key or self.header_on_off_key
-            header_dict = header_dict or self.header_dict
-            finished_list, header_list = [], []
-            for x in range(len(running_list)):
-                if x in header_dict:
-                    if header_dict[x] in header_on_off_key:
-                        if (header_on_off_key[header_dict[x]] == 'Y'):
-                            header_list.append(header_dict[x])
-            finished_list.append(header_list)
-            
-            for x in range(len(running_list)):
-                single_line = []
-                for y in range(len(running_list[x])):
-                    if (y in header_dict):
-                        if (header_dict[y] in header_on_off_key):
-                            if (header_on_off_key[header_dict[y]] == 'Y'):
-                                single_line.append(running_list[x][y])
-                finished_list.append(single_line)
-            return finished_list
+#
+#
+# HIPS_8000_FW child of HBSSMasterObject
+class HIPS_8000_FW(HBSSMasterObject):
+    '''The HIPS_8000_FW class registers HIPS 8 FW policies as a supported
+product.  The policy is parsed by HIPS_8_FW_XML_Parser_Action in a single pass,
+writing the full rule set plus one additional CSV for each of the since_dates.
+If a cache is given, the resolved rule set is loaded from it when the export has
+not changed.
+'''
+    featureid = 'HOSTIPS_8000_FW'
+
+    def __init__(self, input_xml_file = None, since_dates = (), cache = None):
+        HBSSMasterObject.__init__(self, input_xml_file)
+        self.PolicyType = "HOSTIPS_8000_FW"
+        self.since_dates = list(since_dates)
+        self.cache = cache
+
+    def outputSpecs(self):
+        outputspecs = [HIPS_8_FW_XML_Parser_Action.OutputSpec(None, True)]
+        for since_date in self.since_dates:
+            outputspecs.append(
+                HIPS_8_FW_XML_Parser_Action.OutputSpec(since_date, True))
+        return outputspecs
+
+    def outputFiles(self):
+        return [spec.filename(self.input_xml_file)
+                for spec in self.outputSpecs()]
+
+    def parseAndWriteToCSV(self):
+        HIPS_8_FW_XML_Parser_Action.convert(self.input_xml_file,
+                                            self.outputSpecs(), self.cache,
+                                            self.stats)
                                                    
 ################################################################################
 # END: Firewall Classes
@@ -826,38 +1135,91 @@ class IPS_FW_7000(IPS_FW_Core):
 ################################################################################
 #
 #
+# AB7000RuleStream
+class AB7000RuleStream(HBSS_7000_Tokenizer.SectionHandler):
+    '''The AB7000RuleStream consumes the HBSS_7000_Tokenizer events of a
+HIPS 7 Application Blocking policy for IPS_AB_7000.initialParse.  Each section
+with a Data setting becomes one rule of [name, process, note, last modified,
+rule ID]; the settings other than Data are only read once Data has been seen.
+The rule sequence settings fill rule_seq_dict.
+'''
+    def __init__(self, ab_object, parse_dict):
+        self.ab_object = ab_object
+        self.parse_dict = parse_dict
+        self.initial_parse_list = []
+        self.rule_seq_dict = {}
+        self.rule_id = ''
+        self.beginSection(None)
+
+    def beginSection(self, attributes):
+        self.ab_path, self.ab_rule_name = '', ''
+        self.ab_note, self.ab_last_modified = '', ''
+        self.data_written = False
+
+    def setting(self, name, value):
+        parse_dict = self.parse_dict
+        if (name == parse_dict['data_tag']):
+            self.ab_path = self.ab_object.dataStringFormat(
+                value.split(',')[3])
+            self.data_written = True
+        elif not self.data_written:
+            if name.startswith(parse_dict['rule_order']):
+                self.ab_object.ruleSeqDictCreator(name, value,
+                                                  self.rule_seq_dict)
+        elif (name == parse_dict['rule_ID']):
+            self.rule_id = value
+        elif (name == parse_dict['ab_rule_name']):
+            self.ab_rule_name = self.ab_object.dataStringFormat(value)
+        elif (name == parse_dict['Last_modified']):
+            self.ab_last_modified = self.ab_object.dataStringFormat(value[:10])
+        elif (name == parse_dict['ab_note']):
+            self.ab_note = value
+        elif name.startswith(parse_dict['rule_order']):
+            self.ab_object.ruleSeqDictCreator(name, value, self.rule_seq_dict)
+
+    def endSection(self):
+        if self.data_written:
+            self.initial_parse_list.append([self.ab_rule_name, self.ab_path,
+                                            self.ab_note,
+                                            self.ab_last_modified,
+                                            self.rule_id])
+#
+#
 # IPS_AB_7000 child of HBSSMasterObject
 class IPS_AB_7000(HBSSMasterObject):
     '''Object for IPS_7000 Application Blocking.  There is no IPS_8000
 equivalent because Application Blocking has been moved into IPS policy for
 HIPS 8.
 '''
+    featureid = 'HOSTIPS_7000_APP'
+
     def __init__(self, input_xml_file = None):
-        '''The self.parse_dict is used to keep the control text necessary
-to navigate through an Application Blocking XML file.
+        '''The self.parse_dict is used to keep the names of the settings
+read from an Application Blocking XML file; rule_order is the prefix of the
+rule sequence settings.
 '''
         HBSSMasterObject.__init__(self, input_xml_file)
         self.PolicyType = "HOSTIPS_7000_AB"
         self.input_xml_file = input_xml_file
-        self.output_csv_file = self.input_xml_file[:-4] + '_CSV.csv'
-        self.parse_dict = {'begin':'<EPOPolicySettings',
-                           'data_tag':'<Setting name="Data" value="',
-                           'rule_ID':'<Setting name="RuleID" value="',
-                           'ab_rule_name':'<Setting name="Name" value="',
-                           'ab_note':'<Setting name="Note" value="',
-                           'Last_modified':'<Setting name="LastModifyDate" value="',
-                           'rule_order':'<Setting name="+RuleIDSequence#',
-                           'end':'</EPOPolicySettings>'
+        self.output_csv_file = (HBSS_Input_Stream.exportBase(input_xml_file) +
+                                '_CSV.csv')
+        self.parse_dict = {'data_tag':'Data',
+                           'rule_ID':'RuleID',
+                           'ab_rule_name':'Name',
+                           'ab_note':'Note',
+                           'Last_modified':'LastModifyDate',
+                           'rule_order':'+RuleIDSequence#'
                            }
         self.header_list = ['Rule Name', 'Process', 'Notes', 'Last Modified', 'Rule ID']
 
     def parseAndWriteToCSV(self):
         '''Common method found in all HBSS objects.
 '''
-        policy_list, rule_seq_dict = self.initialParse()
-        policy_list = self.policyOrderer(policy_list, rule_seq_dict)
+        policy_list, rule_seq_dict = self.parsePhaseCall(self.initialParse)
+        policy_list = self.phaseCall(self.policyOrderer, policy_list,
+                                     rule_seq_dict)
         policy_list.insert(0, self.header_list)
-        self.csvWriter(policy_list)
+        self.phaseCall(self.csvWriter, policy_list)
 
     def initialParse(self,
                      input_xml_file = None,
@@ -867,83 +1229,16 @@ to subsequently build appropriate output file.
 '''
         input_xml_file = input_xml_file or self.input_xml_file
         parse_dict = parse_dict or self.parse_dict
-        initial_parse_list, rule_seq_dict = [], {}
-        with open(input_xml_file, 'r') as hips_file:
-            for this_entry in hips_file:
-                if this_entry.startswith(parse_dict['begin']):
-                    single_entry = []
-                    ab_path, ab_rule_name, ab_note, ab_last_modified = '', '', '', ''
-                    data_written = False
-                if this_entry.startswith(parse_dict['data_tag']):
-                    ab_path = this_entry.split(parse_dict['data_tag'])
-                    ab_path = ab_path[1][:-4].split(',')
-                    ab_path = ab_path[3]
-                    ab_path = self.dataStringFormat(ab_path)
-                    data_written = True
-                if (this_entry.startswith(parse_dict['rule_ID']) and
-                    data_written == True):
-                    rule_id = this_entry.split(parse_dict['rule_ID'])
-                    rule_id = rule_id[1][:-4]
-                if (this_entry.startswith(parse_dict['ab_rule_name']) and
-                    data_written == True):
-                    ab_rule_name = this_entry.split(parse_dict['ab_rule_name'])
-                    ab_rule_name = ab_rule_name[1][:-4]
-                    ab_rule_name = self.dataStringFormat(ab_rule_name)
-                if (this_entry.startswith(parse_dict['Last_modified']) and
-                    data_written == True):
-                    ab_last_modified = this_entry.split(parse_dict['Last_modified'])
-                    ab_last_modified = ab_last_modified[1][:10]
-                    ab_last_modified = self.dataStringFormat(ab_last_modified)
-                if (this_entry.startswith(parse_dict['ab_note']) and
-                    data_written == True):
-                    ab_note = this_entry.split(parse_dict['ab_note'])
-                    ab_note = ab_note[1][:-4]
-                if (this_entry.startswith(parse_dict['end']) and
-                    data_written == True):
-                    single_entry.append(ab_rule_name)
-                    single_entry.append(ab_path)
-                    single_entry.append(ab_note)
-                    single_entry.append(ab_last_modified)
-                    single_entry.append(rule_id)
-                    initial_parse_list.append(single_entry)
-                if this_entry.startswith(parse_dict['rule_order']):
-                    rule_set_dict = self.ruleSeqDictCreator(this_entry,
-                                                            rule_seq_dict)
-            return initial_parse_list, rule_seq_dict
-
-    def ruleSeqDictCreator(self, entry, rule_seq_dict):
-        '''Builds the rules sequence dictionary.
-'''
-        entry = entry.split('" value="')
-        rule_sequence_num = entry[0].split('#')[1]
-        rule_ID_num = entry[1][:-4]
-        rule_seq_dict[rule_ID_num] = rule_sequence_num
-        return rule_seq_dict
-    
+        self.repeated_sequence_entries = []
+        rule_stream = AB7000RuleStream(self, parse_dict)
+        HBSS_7000_Tokenizer.tokenizeExport(input_xml_file, rule_stream)
+        return rule_stream.initial_parse_list, rule_stream.rule_seq_dict
+
     def dataStringFormat(self, string):
         '''Cleans up strings for final human-readable presentation.
 '''
-        new_string = string.replace('&quot;', '')
-        new_string = new_string.replace('&apos;', '\'')
-        return new_string
+        return string.replace('"', '')
         
-    def policyOrderer(self, running_list, rule_seq_dict):
-        '''Places policy in order based on the sequencing dictionary.
-'''
-        highest_ruleID = 0
-        for rule in range(len(running_list)):
-            if (int(running_list[rule][-1]) > highest_ruleID):
-                highest_ruleID = int(running_list[rule][-1])
-        final_list = [''] * highest_ruleID
-        for z in range(len(running_list)):
-            key = running_list[z][-1]
-            x = int(rule_seq_dict[key])
-            final_list[x] = running_list[z]
-        try:
-            final_list.remove('')
-        finally:
-            return final_list
-                        
     def csvWriter(self, final_list, output_csv_file = None):
         '''Writes output to CSV file.
 '''
@@ -967,6 +1262,61 @@ to subsequently build appropriate output file.
 ################################################################################
 # BEGIN: Changelog
 ################################################################################
+#   v0.216 -    HIPS 8 FW rules keep their TCP flags and schedule; the version is
+#               bumped so HBSS_Parse_Cache entries without them are rebuilt.
+#   v0.215 -    HIPS 8 FW rules keep their LastModifyingUsername; the version is
+#               bumped so HBSS_Parse_Cache entries without it are rebuilt.
+#   v0.214 -    Every engine and the product sniffers open exports through
+#               HBSS_Input_Stream, so gzip (.xml.gz) and zip (.zip) exports are
+#               decompressed as they are parsed instead of being expanded to disk
+#               first.  Output files are named after the export without its
+#               suffix, so NAME.xml.gz writes NAME_CSV.csv.
+#   v0.213 -    HIPS_Core matches every line of a HIPS 7 IPS exception against a
+#               single regular expression compiled from xml_d and the signature
+#               flags (compileXMLMatcher, xmlMatch) instead of searching the line
+#               for each tag in turn, and gets its column and flags in one scan.
+#               The leftmost tag in the line decides, so text in a Note or Name
+#               that looks like a tag no longer moves it to another column.
+#               sigBooleanSetter and parserIPSMicro, which no longer had
+#               callers, are removed.
+#   v0.212 -    IPS_FW_7000 and IPS_AB_7000 share one policyOrderer that sorts the
+#               rules on their sequence number instead of placing them in a list
+#               as long as the highest RuleID or sequence, so no blank lines are
+#               left in the spreadsheet.  Rules missing from the sequence are
+#               placed last instead of raising a KeyError, and missing, unused,
+#               shared and repeated sequence entries are reported on stderr.
+#   v0.211 -    The HIPS 7 FW, Application Blocking and IPS engines read their
+#               exports through the expat based HBSS_7000_Tokenizer instead of
+#               matching the start of every text line, so exports that are
+#               indented, on a single line or with attributes in another order
+#               parse the same.  Values are unescaped by expat, so &amp;, &apos;
+#               and &lt; no longer show up as entities in the spreadsheets.
+#   v0.210 -    IPS_FW_7000 cleans, groups, translates and writes each rule in a
+#               single streamed pass (policyRowStream) instead of rewriting the
+#               whole policy list four times.  A policy ending inside a rule group
+#               gets a closing END GROUP line instead of an UnboundLocalError.
+#               The list builders it replaced (policyFieldCleaner,
+#               groupRuleDivisionCreator, valuesFromCleanerDictionary and
+#               headerToPolicyAdder) are removed.
+#   v0.209 -    Every product object records the phases of parseAndWriteToCSV
+#               (initialParse, policyOrderer, policyRowStream, ...) in the
+#               HBSS_Stats.PhaseStats handed to HBSSXMLParser.
+#   v0.208 -    HIPS 8 FW rules are slotted objects, cached rule sets of earlier
+#               versions are parsed again.
+#   v0.207 -    HIPS 8 FW rules carry message type and physical medium conditions,
+#               cached rule sets of earlier versions are parsed again.
+#   v0.206 -    HBSSXMLParser.policyNameSniffer returns the policy name of an
+#               export, used by HBSS_SQLite_Export to key exports.
+#   v0.205 -    HIPS 8 FW objects accept an HBSS_Parse_Cache.  tool_version is part
+#               of every cache key, so bump it whenever parsed output changes.
+#   v0.204 -    IPS_FW_7000.ipFieldFromHex uses the shared HBSS_IP_Decoder, which
+#               also fixes the unbound ip_v4 error on non IPv4-mapped addresses.
+#   v0.203 -    Supported products are identified by the featureid of the first
+#               EPOPolicySettings element in a fixed size byte prefix of the
+#               XML.  HOSTIPS_8000_FW added to the supported products.
+#   v0.202 -    HIPS 8 IPS exceptions are streamed through expat by
+#               HIPS8_iterIPSExceptions instead of building a minidom tree of
+#               the whole export.
 #   v0.200 -    CND-A adopted the script.  Fixed logic error where multi-value  
 #               of signature IDs and paths could not be displayed.  Missing IPS 
 #               exceptions is also fixed.
@@ -0,0 +1,55 @@
+"""HBSS IP Decoder
+
+Shared decoder for the address fields found in ePO firewall exports.  Both the
+HIPS 7 firewall (HBSS_Classes.IPS_FW_7000) and the HIPS 8 firewall
+(HIPS_8_FW_XML_Parser_Action) store addresses as full IPv6 hex strings, with
+IPv4 addresses written in their IPv4-mapped form, e.g.
+
+    0000:0000:0000:0000:0000:ffff:a4bf:6013            -> 164.191.96.19
+    0000:0000:0000:0000:0000:ffff:0a00:0000/104        -> 10.0.0.0/8
+    0000:0000:0000:0000:0000:ffff:0a00:0001-0000:...   -> 10.0.0.1 - 10.0.0.9
+
+Exports reuse the same few hundred addresses across thousands of rules, so
+decoded values are kept in a bounded LRU cache.
+"""
+
+import functools, ipaddress
+
+ip_dict = {'0000:0000:0000:0000:0000:0000:0000:0000':'Any',
+           '[trusted]':'Trusted'}
+v4_mapped_prefix = '0000:0000:0000:0000:0000:ffff:'
+cache_size = 4096
+
+
+@functools.lru_cache(maxsize = cache_size)
+def ipFieldFromHex(hex_field):
+    '''Returns the human readable form of an address field: a single address,
+a CIDR network or a "first - last" range.  IPv4-mapped addresses are written
+in dotted quad form with CIDR prefixes reduced by 96 bits; anything else
+(native IPv6, DNS suffixes, unparseable values) is returned unchanged.
+'''
+    for key in ip_dict:
+        if key in hex_field:
+            return ip_dict[key]
+    if not hex_field.startswith(v4_mapped_prefix):
+        return hex_field
+    try:
+        if ('-' in hex_field):
+            first, last = hex_field.split('-')
+            return mappedAddress(first) + ' - ' + mappedAddress(last)
+        if ('/' in hex_field):
+            address, prefix = hex_field.split('/')
+            return mappedAddress(address) + '/' + str(int(prefix) - 96)
+        return mappedAddress(hex_field)
+    except ValueError:
+        return hex_field
+
+
+def mappedAddress(hex_address):
+    '''Returns the dotted quad IPv4 address of an IPv4-mapped IPv6 address
+string, raising ValueError if it is not one.
+'''
+    mapped = ipaddress.IPv6Address(hex_address.strip()).ipv4_mapped
+    if (mapped is None):
+        raise ValueError('not an IPv4-mapped address: ' + hex_address)
+    return str(mapped)
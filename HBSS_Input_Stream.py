@@ -0,0 +1,75 @@
+"""HBSS Input Stream
+
+Opens ePO exports for the conversion engines, whether they are stored as plain
+XML or compressed:
+
+    NAME.xml        the export as written by ePO
+    NAME.xml.gz     a gzip compressed export
+    NAME.zip        a zip archive holding a single .xml export
+
+openExport returns a binary file object that decompresses the export as it is
+read.  Every engine hands that file object to expat, which reads it a chunk at
+a time, so a compressed export is parsed without first being expanded to disk
+and without the whole export ever being held in memory.  The product sniffers
+read only the first few kilobytes, so classifying a compressed export only
+decompresses its beginning.
+
+The output files of an export are named after exportBase, the export without
+its suffix, so NAME.xml, NAME.xml.gz and NAME.zip all write NAME_CSV.csv (or
+NAME_CSV_TR.csv, ...) next to the export.
+"""
+
+import gzip, io, zipfile
+
+plain_suffix = '.xml'
+gzip_suffix = '.xml.gz'
+zip_suffix = '.zip'
+export_suffixes = (plain_suffix, gzip_suffix, zip_suffix)
+
+#zip members are read through a buffer of this size, as expat asks for a few
+#kilobytes at a time and every read of a zip member runs Python code
+zip_buffer_size = 1 << 16
+
+
+def isExport(file_name):
+    '''Returns True if file_name has the suffix of a plain or compressed
+export.
+'''
+    return file_name.endswith(export_suffixes)
+
+
+def exportBase(xml_file):
+    '''Returns xml_file without its export suffix.  Any other name loses its
+last four characters, as the engines have always done.
+'''
+    for suffix in export_suffixes:
+        if xml_file.endswith(suffix):
+            return xml_file[:-len(suffix)]
+    return xml_file[:-4]
+
+
+def zipMember(archive):
+    '''Returns the ZipInfo of the only .xml export in a zipfile.ZipFile.
+Raises ValueError if the archive holds no export or more than one.
+'''
+    members = [info for info in archive.infolist()
+               if (info.filename.endswith(plain_suffix) and not info.is_dir())]
+    if (len(members) != 1):
+        raise ValueError('%s holds %d .xml exports, expected one' %
+                         (archive.filename, len(members)))
+    return members[0]
+
+
+def openExport(xml_file):
+    '''Returns a binary file object reading the XML of xml_file, which is
+decompressed as it is read if xml_file is a .xml.gz or .zip export.  The
+caller closes it, normally with a with statement.
+'''
+    if xml_file.endswith(gzip_suffix):
+        return gzip.open(xml_file, 'rb')
+    if xml_file.endswith(zip_suffix):
+        #the member keeps the archive file open until it is closed itself
+        with zipfile.ZipFile(xml_file) as archive:
+            return io.BufferedReader(archive.open(zipMember(archive)),
+                                     zip_buffer_size)
+    return open(xml_file, 'rb')
@@ -0,0 +1,222 @@
+"""HBSS Parse Cache
+
+Persistent cache of resolved, ordered HIPS 8 FW rule sets.  Entries are keyed
+by a hash of the export's content plus HBSS_Classes.tool_version, so a changed
+export or a new parser version is always parsed again, while an unchanged
+export is loaded straight from the cache and any output can be regenerated
+from it without touching the XML.
+
+Each entry is the (rules, orderedruleset) pair written as zlib compressed JSON:
+every rule is the list of its FWRule slot values, and the resolved aggregates
+the rules share are stored once and referred to by their index.  Entries hold
+only plain data, never pickles, because the default cache directory lies in
+the export drop folder where other accounts may be able to write.  Loading a
+tampered or corrupt entry can therefore never run code; an entry that does not
+decode into rules counts as a miss and the export is parsed again.
+
+To avoid re-hashing large unchanged exports on every run, the digest of each
+file is remembered together with its size and modification time.
+
+The cache is trimmed every time an entry is stored.  Loading an entry or a
+digest touches its modification time, so the files least recently used are
+removed first once there are more than max_entries of them, files unused for
+max_age seconds are removed, and entries written by another tool_version,
+which can never be loaded again, are removed straight away.
+
+The cache directory may be deleted at any time.
+"""
+
+import hashlib, json, os, sys, time, zlib
+
+import HBSS_Classes
+from HIPS_8_FW_XML_Parser_Action import (AggregateType, FWRule,
+                                         ResolvedAggregate, novalues)
+
+#FWRule slots holding ResolvedAggregates, stored as indexes into the entry's
+#aggregate table
+aggregate_slots = frozenset(('applications', 'remoteaggregates',
+                             'localaggregates'))
+
+
+def encodeEntry(rules, orderedruleset):
+    '''Returns the JSON text of an entry holding the rules of orderedruleset.
+'''
+    aggregate_index = {}
+    encoded_rules = {}
+    for ID in orderedruleset:
+        if ID in encoded_rules:
+            continue
+        values = []
+        for slot in FWRule.__slots__:
+            value = getattr(rules[ID], slot)
+            if slot in aggregate_slots:
+                value = [aggregate_index.setdefault(agg, len(aggregate_index))
+                         for agg in value]
+            elif isinstance(value, (list, tuple)):
+                value = list(value)
+            values.append(value)
+        encoded_rules[ID] = values
+    return json.dumps({'aggregates': list(aggregate_index),
+                       'rules': encoded_rules,
+                       'order': orderedruleset}, separators = (',', ':'))
+
+
+def decodeEntry(text):
+    '''Returns the (rules, orderedruleset) of an entry's JSON text.  Raises
+ValueError, TypeError, KeyError or IndexError if the entry is not well formed.
+'''
+    entry = json.loads(text)
+    aggregates = [ResolvedAggregate(GUID, AggregateType(agg_type), *fields)
+                  for GUID, agg_type, *fields in entry['aggregates']]
+    slot_count = len(FWRule.__slots__)
+    rules = {}
+    for ID, values in entry['rules'].items():
+        if (len(values) != slot_count):
+            raise ValueError('rule %s has %d values, expected %d' %
+                             (ID, len(values), slot_count))
+        rule = FWRule()
+        for slot, value in zip(FWRule.__slots__, values):
+            if slot in aggregate_slots:
+                value = [aggregates[index] for index in value] or novalues
+            elif isinstance(value, list):
+                #the parser interns the values repeated across rules
+                value = [sys.intern(item) for item in value] or novalues
+            elif isinstance(value, str):
+                value = sys.intern(value)
+            setattr(rule, slot, value)
+        rules[sys.intern(ID)] = rule
+    orderedruleset = [sys.intern(ID) for ID in entry['order']]
+    missing = set(orderedruleset).difference(rules)
+    if missing:
+        raise KeyError('ordered rules without an entry: %s' %
+                       ', '.join(sorted(missing)[:5]))
+    return rules, orderedruleset
+
+
+class ParseCache():
+    '''A cache of resolved rule sets stored under cache_dir.'''
+    hash_chunk_size = 1 << 20
+    compress_level = 1
+    entry_suffix = '.json.z'
+    max_entries = 256
+    max_age = 30 * 24 * 60 * 60
+
+    def __init__(self, cache_dir = '.hbss_cache', max_entries = None,
+                 max_age = None):
+        self.cache_dir = cache_dir
+        self.version = str(HBSS_Classes.tool_version)
+        if max_entries is not None:
+            self.max_entries = max_entries
+        if max_age is not None:
+            self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(cache_dir, 'stat'), exist_ok = True)
+
+    def fileDigest(self, xml_file):
+        '''Returns the content hash of xml_file, reusing the stored digest if
+the file's size and modification time have not changed since it was hashed.
+'''
+        file_stat = os.stat(xml_file)
+        stat_key = [file_stat.st_size, file_stat.st_mtime_ns]
+        stat_file = os.path.join(self.cache_dir, 'stat', hashlib.sha1(
+            os.path.abspath(xml_file).encode('utf-8')).hexdigest() + '.json')
+        try:
+            with open(stat_file, 'r') as stat_entry:
+                entry = json.load(stat_entry)
+            if (entry['stat'] == stat_key):
+                self.touch(stat_file)
+                return entry['digest']
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+        digest = hashlib.blake2b(digest_size = 20)
+        with open(xml_file, 'rb') as hash_input:
+            for chunk in iter(lambda: hash_input.read(self.hash_chunk_size), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self.atomicWrite(stat_file, json.dumps(
+            {'stat': stat_key, 'digest': digest}).encode('utf-8'))
+        return digest
+
+    def entryFile(self, xml_file):
+        return os.path.join(self.cache_dir, self.fileDigest(xml_file) + '-' +
+                            self.version + self.entry_suffix)
+
+    def load(self, xml_file):
+        '''Returns the cached (rules, orderedruleset) of xml_file, or None if
+this content has not been cached by this tool_version.
+'''
+        try:
+            entry_file = self.entryFile(xml_file)
+            with open(entry_file, 'rb') as cache_entry:
+                cached = decodeEntry(zlib.decompress(cache_entry.read()))
+        except (OSError, zlib.error, ValueError, TypeError, KeyError,
+                IndexError, AttributeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touch(entry_file)
+        return cached
+
+    def store(self, xml_file, rules, orderedruleset):
+        '''Stores the ordered rules of xml_file.  Only the rules that appear in
+orderedruleset are kept.
+'''
+        self.atomicWrite(self.entryFile(xml_file), zlib.compress(
+            encodeEntry(rules, orderedruleset).encode('utf-8'),
+            self.compress_level))
+        self.prune()
+
+    def touch(self, path):
+        '''Marks path as just used, so prune keeps it.'''
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def prune(self):
+        '''Removes the entries of other tool_versions, then the entries and
+stored digests unused for max_age seconds, then the least recently used ones
+beyond max_entries.  Returns the number of files removed.  Files another
+process removes first are skipped.
+'''
+        removed = 0
+        current_suffix = '-' + self.version + self.entry_suffix
+        for directory, suffix in ((self.cache_dir, self.entry_suffix),
+                                  (os.path.join(self.cache_dir, 'stat'),
+                                   '.json')):
+            used = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith(suffix):
+                            continue
+                        try:
+                            mtime = entry.stat().st_mtime
+                        except OSError:
+                            continue
+                        if ((suffix == self.entry_suffix) and
+                            not entry.name.endswith(current_suffix)):
+                            mtime = 0
+                        used.append((mtime, entry.path))
+            except OSError:
+                continue
+            used.sort(reverse = True)
+            oldest = time.time() - self.max_age
+            for position, (mtime, path) in enumerate(used):
+                if ((position >= self.max_entries) or (mtime < oldest)):
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def atomicWrite(self, path, data):
+        '''Writes data to path through a temporary file, so concurrent worker
+processes never see a partially written entry.
+'''
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
@@ -0,0 +1,309 @@
+"""HBSS SQLite Export
+
+Loads parsed ePO exports into a local SQLite database for querying, as an
+alternative to the CSV spreadsheets.  Each export is a row of the exports table
+keyed by its policy name, export time (the modification time of the XML unless
+one is given) and product, so any number of exports, of any number of policies,
+accumulate in one database.  Loading the same export again replaces it.
+
+    HOSTIPS_8000_FW     fw_rules (one row per rule in policy order),
+                        fw_rule_ports, fw_aggregates, fw_rule_aggregates and
+                        fw_group_members
+    HOSTIPS_8000_IPS    ips_exceptions
+    HOSTIPS_7000_APP    ab_rules
+
+The rows of an export are bulk inserted with executemany inside a single
+transaction.  Example query, every rule of the latest export of a policy that
+allows traffic to local port 445:
+
+    SELECT r.* FROM fw_rules r JOIN fw_rule_ports p
+        ON p.export_id = r.export_id AND p.rule_guid = r.guid
+    WHERE r.export_id = ? AND r.action = 'ALLOW' AND p.side = 'local'
+        AND p.port_low <= 445 AND p.port_high >= 445
+
+usage: python3 HBSS_SQLite_Export.py DATABASE XML_OR_DIRECTORY [...]
+                                     [--export-time TIME] [--cache-dir DIR]
+"""
+
+import argparse, itertools, os, sqlite3, sys, time
+
+import HBSS_Batch_Action, HBSS_Classes, HBSS_Input_Stream, HBSS_Parse_Cache
+import HIPS_8_FW_XML_Parser_Action
+
+
+#ePO has a policy of the same name (My Default) for every product, so the
+#product is part of the key of an export
+schema = '''
+CREATE TABLE IF NOT EXISTS exports (
+    export_id INTEGER PRIMARY KEY,
+    policy_name TEXT NOT NULL,
+    export_time TEXT NOT NULL,
+    product TEXT NOT NULL,
+    source_file TEXT,
+    loaded TEXT,
+    tool_version TEXT,
+    UNIQUE (policy_name, export_time, product));
+
+CREATE TABLE IF NOT EXISTS fw_rules (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    guid TEXT NOT NULL,
+    is_group INTEGER NOT NULL,
+    group_name TEXT,
+    name TEXT,
+    action TEXT,
+    direction TEXT,
+    status TEXT,
+    network_protocol TEXT,
+    transport_protocol TEXT,
+    remote_address TEXT,
+    remote_service TEXT,
+    local_address TEXT,
+    local_service TEXT,
+    application TEXT,
+    app_path TEXT,
+    fingerprint TEXT,
+    signer TEXT,
+    exe_note TEXT,
+    rule_note TEXT,
+    last_modified TEXT,
+    last_modifying_user TEXT,
+    PRIMARY KEY (export_id, position));
+CREATE INDEX IF NOT EXISTS fw_rules_guid ON fw_rules (guid);
+CREATE INDEX IF NOT EXISTS fw_rules_group ON fw_rules (group_name);
+CREATE INDEX IF NOT EXISTS fw_rules_action ON fw_rules (action);
+CREATE INDEX IF NOT EXISTS fw_rules_direction ON fw_rules (direction);
+CREATE INDEX IF NOT EXISTS fw_rules_last_modified ON fw_rules (last_modified);
+CREATE INDEX IF NOT EXISTS fw_rules_user ON fw_rules (last_modifying_user);
+
+CREATE TABLE IF NOT EXISTS fw_rule_ports (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    rule_guid TEXT NOT NULL,
+    side TEXT NOT NULL,
+    port_low INTEGER NOT NULL,
+    port_high INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS fw_rule_ports_rule ON fw_rule_ports (export_id, rule_guid);
+CREATE INDEX IF NOT EXISTS fw_rule_ports_port ON fw_rule_ports (port_low, port_high);
+
+CREATE TABLE IF NOT EXISTS fw_aggregates (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    guid TEXT NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT,
+    app_path TEXT,
+    app_name TEXT,
+    app_hash TEXT,
+    app_signer TEXT,
+    exe_note TEXT,
+    address TEXT,
+    PRIMARY KEY (export_id, guid));
+
+CREATE TABLE IF NOT EXISTS fw_rule_aggregates (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    rule_guid TEXT NOT NULL,
+    aggregate_guid TEXT NOT NULL,
+    PRIMARY KEY (export_id, rule_guid, aggregate_guid));
+CREATE INDEX IF NOT EXISTS fw_rule_aggregates_aggregate ON fw_rule_aggregates (aggregate_guid);
+
+CREATE TABLE IF NOT EXISTS fw_group_members (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    group_guid TEXT NOT NULL,
+    member_guid TEXT NOT NULL,
+    PRIMARY KEY (export_id, position));
+CREATE INDEX IF NOT EXISTS fw_group_members_group ON fw_group_members (group_guid);
+CREATE INDEX IF NOT EXISTS fw_group_members_member ON fw_group_members (member_guid);
+
+CREATE TABLE IF NOT EXISTS ips_exceptions (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    signature TEXT,
+    users TEXT,
+    executable TEXT,
+    parameters TEXT,
+    notes TEXT,
+    last_modified TEXT,
+    PRIMARY KEY (export_id, position));
+CREATE INDEX IF NOT EXISTS ips_exceptions_last_modified ON ips_exceptions (last_modified);
+
+CREATE TABLE IF NOT EXISTS ab_rules (
+    export_id INTEGER NOT NULL REFERENCES exports ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    process TEXT,
+    notes TEXT,
+    last_modified TEXT,
+    rule_id TEXT,
+    PRIMARY KEY (export_id, position));
+CREATE INDEX IF NOT EXISTS ab_rules_last_modified ON ab_rules (last_modified);
+'''
+
+
+class SQLiteExporter():
+    '''Loads ePO exports into the SQLite database in database_file, creating
+the tables and indexes if they do not exist yet.  The optional cache (an
+HBSS_Parse_Cache.ParseCache) is used for HIPS 8 FW exports.
+'''
+    def __init__(self, database_file, cache = None):
+        self.database_file = database_file
+        self.cache = cache
+        self.hbss_parser = HBSS_Classes.HBSSXMLParser()
+        self.product_dict = {
+            HBSS_Classes.HIPS_8000_FW.featureid:self.insertFWRules,
+            HBSS_Classes.HIPS_8000.featureid:self.insertIPSExceptions,
+            HBSS_Classes.IPS_AB_7000.featureid:self.insertABRules
+            }
+        self.connection = sqlite3.connect(database_file)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def exportTime(self, xml_file):
+        '''Returns the modification time of xml_file in ISO 8601 UTC form.'''
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                             time.gmtime(os.path.getmtime(xml_file)))
+
+    def exportFile(self, xml_file, export_time = None):
+        '''Loads xml_file into the database in a single transaction and
+returns its export_id, or None if the product is not supported.  An earlier
+load of the same policy name, export time and product is replaced.
+'''
+        featureid = self.hbss_parser.productSniffer(xml_file)
+        inserter = self.product_dict.get(featureid)
+        if not inserter:
+            return None
+        policy_name = (self.hbss_parser.policyNameSniffer(xml_file) or
+                       HBSS_Input_Stream.exportBase(
+                           os.path.basename(xml_file)))
+        export_time = export_time or self.exportTime(xml_file)
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM exports WHERE policy_name = ? AND '
+                'export_time = ? AND product = ?',
+                (policy_name, export_time, featureid))
+            export_id = self.connection.execute(
+                'INSERT INTO exports (policy_name, export_time, product, '
+                'source_file, loaded, tool_version) VALUES (?, ?, ?, ?, ?, ?)',
+                (policy_name, export_time, featureid,
+                 os.path.abspath(xml_file),
+                 time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                 str(HBSS_Classes.tool_version))).lastrowid
+            inserter(export_id, xml_file)
+        return export_id
+
+    def insertFWRules(self, export_id, xml_file):
+        '''Inserts the ordered rules of a HIPS 8 FW export together with their
+ports, the resolved aggregates they reference and the group membership.
+'''
+        rules, orderedruleset = HIPS_8_FW_XML_Parser_Action.loadpolicy(
+            xml_file, self.cache)
+        rule_rows, port_rows, link_rows, aggregates = [], [], [], {}
+        seen = set()
+        for position, ID in enumerate(orderedruleset):
+            rule = rules[ID]
+            rule_rows.append((export_id, position, ID, int(rule.isgroup),
+                              rule.group, rule.name) + rule.row()[2:])
+            if ID in seen:
+                #a group referenced more than once is listed again in order
+                continue
+            seen.add(ID)
+            for side, ports in (('remote', rule.remoteport),
+                                ('local', rule.localport)):
+                for low, high in HIPS_8_FW_XML_Parser_Action.portranges(ports):
+                    port_rows.append((export_id, ID, side, low, high))
+            for resolved in itertools.chain(rule.applications,
+                                            rule.remoteaggregates,
+                                            rule.localaggregates):
+                aggregates[resolved.GUID] = resolved
+                link_rows.append((export_id, ID, resolved.GUID))
+        aggregate_rows = [(export_id, resolved.GUID, resolved.type.name,
+                           resolved.name, resolved.apppath, resolved.appname,
+                           resolved.apphash, resolved.appsigner,
+                           resolved.exenote, resolved.address)
+                          for resolved in aggregates.values()]
+        cursor = self.connection.cursor()
+        cursor.executemany('INSERT INTO fw_rules VALUES (' +
+                           ', '.join(['?'] * 23) + ')', rule_rows)
+        cursor.executemany('INSERT INTO fw_rule_ports VALUES (?, ?, ?, ?, ?)',
+                           port_rows)
+        cursor.executemany('INSERT INTO fw_aggregates VALUES (' +
+                           ', '.join(['?'] * 10) + ')', aggregate_rows)
+        cursor.executemany('INSERT OR IGNORE INTO fw_rule_aggregates '
+                           'VALUES (?, ?, ?)', link_rows)
+        cursor.executemany('INSERT INTO fw_group_members VALUES (?, ?, ?, ?)',
+                           ((export_id,) + member for member in
+                            groupMembers(rules, orderedruleset)))
+
+    def insertIPSExceptions(self, export_id, xml_file):
+        '''Inserts the exceptions of a HIPS 8 IPS export as they are streamed
+from the XML.
+'''
+        hips_object = HBSS_Classes.HIPS_8000(xml_file)
+        self.connection.executemany(
+            'INSERT INTO ips_exceptions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            ((export_id, position) + tuple(row) for position, row in
+             enumerate(hips_object.HIPS8_iterIPSExceptions(xml_file))))
+
+    def insertABRules(self, export_id, xml_file):
+        '''Inserts the ordered rules of a HIPS 7 Application Blocking export.'''
+        ab_object = HBSS_Classes.IPS_AB_7000(xml_file)
+        policy_list, rule_seq_dict = ab_object.initialParse()
+        policy_list = ab_object.policyOrderer(policy_list, rule_seq_dict)
+        self.connection.executemany(
+            'INSERT INTO ab_rules VALUES (?, ?, ?, ?, ?, ?, ?)',
+            ((export_id, position) + tuple(row) for position, row in
+             enumerate(policy_list) if row))
+
+
+def groupMembers(rules, orderedruleset):
+    '''Yields (position, group GUID, member GUID) for every rule of the
+ordered rule set that belongs to a group.
+'''
+    parents = HIPS_8_FW_XML_Parser_Action.groupparents(rules, orderedruleset)
+    for position, parent in enumerate(parents):
+        if parent is not None:
+            yield (position, orderedruleset[parent], orderedruleset[position])
+
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(
+        description = 'Load ePO XML exports into a SQLite database.')
+    arg_parser.add_argument('database')
+    arg_parser.add_argument('paths', nargs = '+',
+                            help = 'XML exports or directories of exports')
+    arg_parser.add_argument('--export-time', default = None,
+                            help = 'export time to record (default: the '
+                            'modification time of each XML)')
+    arg_parser.add_argument('--cache-dir', default = None,
+                            help = 'HBSS_Parse_Cache directory for HIPS 8 FW '
+                            'exports')
+    args = arg_parser.parse_args(argv)
+    cache = None
+    if args.cache_dir:
+        cache = HBSS_Parse_Cache.ParseCache(args.cache_dir)
+    xml_files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            xml_files.extend(HBSS_Batch_Action.directoryXMLList(path))
+        else:
+            xml_files.append(path)
+    exporter = SQLiteExporter(args.database, cache)
+    try:
+        for xml_file in xml_files:
+            started = time.time()
+            export_id = exporter.exportFile(xml_file, args.export_time)
+            if export_id is None:
+                print('SKIPPED (unsupported)  ' + xml_file)
+            else:
+                print('OK %-6d %7.2fs  %s' % (export_id,
+                                              time.time() - started, xml_file))
+    finally:
+        exporter.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""HBSS Stats
+
+Per-phase instrumentation of the conversion engines.  A PhaseStats object is
+handed to an engine (HIPS_8_FW_XML_Parser_Action.convert, or any HBSS_Classes
+product object through HBSSXMLParser), which wraps each phase of its pipeline
+in stats.phase(name).  Every phase records:
+
+    wall        elapsed seconds (time.perf_counter)
+    cpu         process CPU seconds (time.process_time)
+    counts      what the phase worked through: bytes, rules, aggregates, ...
+    peak_mb     peak of the Python heap during the phase, only when tracing
+                memory (tracemalloc slows the engines down noticeably)
+
+Functions called once per rule inside a phase (FWRule.row, the date filter)
+are wrapped with stats.timed(name, function) instead, which only adds up their
+wall time and number of calls; they show up indented under their phase.
+
+The results are printed as a table (report) or saved as JSON (writeJSON), and
+runProfiled runs any engine under cProfile and dumps the profile for pstats or
+snakeviz.  Engines that are not given a PhaseStats use nostats, which records
+nothing.
+
+The command line tools (HIPS_8_FW_XML_Parser_Action, HBSS_Batch_Action) take
+the options added by addArguments:
+
+    --stats             print the phase table when the conversion is done
+    --stats-json FILE   save the phases as JSON
+    --trace-memory      also record the peak heap of every phase
+    --profile FILE      dump a cProfile profile of the conversion to FILE
+"""
+
+import cProfile, json, sys, time, tracemalloc
+
+
+class Phase():
+    '''A single timed phase.  parent is the name of the phase a timed
+function was called from, and calls the number of times it was called.
+'''
+    def __init__(self, name, source = None, parent = None):
+        self.name = name
+        self.source = source
+        self.parent = parent
+        self.calls = 1
+        self.wall = 0.0
+        self.cpu = None
+        self.counts = {}
+        self.peak = None
+        self.peak_seen = 0
+
+    def toDict(self):
+        return {'name':self.name,
+                'source':self.source,
+                'parent':self.parent,
+                'calls':self.calls,
+                'wall_seconds':round(self.wall, 6),
+                'cpu_seconds':(None if self.cpu is None
+                               else round(self.cpu, 6)),
+                'counts':dict(self.counts),
+                'peak_mb':(None if self.peak is None
+                           else round(self.peak / 1048576.0, 3))
+                }
+
+    @classmethod
+    def fromDict(cls, phase_dict):
+        phase = cls(phase_dict['name'], phase_dict['source'],
+                    phase_dict['parent'])
+        phase.calls = phase_dict['calls']
+        phase.wall = phase_dict['wall_seconds']
+        phase.cpu = phase_dict['cpu_seconds']
+        phase.counts = dict(phase_dict['counts'])
+        if (phase_dict['peak_mb'] is not None):
+            phase.peak = int(phase_dict['peak_mb'] * 1048576)
+        return phase
+
+
+class PhaseContext():
+    '''Context manager returned by PhaseStats.phase.  Entering it returns the
+Phase being recorded, so the engine can fill in its counts.
+'''
+    def __init__(self, stats, phase):
+        self.stats = stats
+        self.phase = phase
+
+    def __enter__(self):
+        self.stats.begin(self.phase)
+        return self.phase
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.end(self.phase)
+        return False
+
+
+class PhaseStats():
+    '''Records the phases of one or more conversions.  source is the file
+the next phases belong to; engines set it with setSource.  With trace_memory
+tracemalloc is started by start() (or by entering the object in a with
+statement) and the heap peak of every phase is recorded.
+'''
+    def __init__(self, trace_memory = False):
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.source = None
+        self.open_phases = []
+        self.started_tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def start(self):
+        if (self.trace_memory and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def setSource(self, source):
+        self.source = source
+
+    def phase(self, name):
+        '''Returns a context manager timing the phase called name.'''
+        return PhaseContext(self, Phase(name, self.source))
+
+    def begin(self, phase):
+        if (self.trace_memory and tracemalloc.is_tracing()):
+            #the enclosing phase keeps the peak seen so far, since the peak
+            #is reset for this one
+            if self.open_phases:
+                enclosing = self.open_phases[-1]
+                enclosing.peak_seen = max(enclosing.peak_seen,
+                                          tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            phase.peak = 0
+        self.open_phases.append(phase)
+        phase.cpu = time.process_time()
+        phase.wall = time.perf_counter()
+
+    def end(self, phase):
+        phase.wall = time.perf_counter() - phase.wall
+        phase.cpu = time.process_time() - phase.cpu
+        self.open_phases.remove(phase)
+        if (phase.peak is not None and tracemalloc.is_tracing()):
+            phase.peak = max(phase.peak_seen,
+                             tracemalloc.get_traced_memory()[1])
+            if self.open_phases:
+                enclosing = self.open_phases[-1]
+                enclosing.peak_seen = max(enclosing.peak_seen, phase.peak)
+        self.phases.append(phase)
+
+    def timed(self, name, function):
+        '''Returns function wrapped so that the wall time and number of its
+calls add up into a phase called name, listed under the phase it is called
+from.
+'''
+        parent = None
+        if self.open_phases:
+            parent = self.open_phases[-1].name
+        phase = Phase(name, self.source, parent)
+        phase.calls = 0
+        self.phases.append(phase)
+        clock = time.perf_counter
+        def timedFunction(*args):
+            started = clock()
+            try:
+                return function(*args)
+            finally:
+                phase.wall += clock() - started
+                phase.calls += 1
+        return timedFunction
+
+    def extend(self, phase_dicts):
+        '''Adds phases recorded elsewhere (by toDicts in a worker process).'''
+        for phase_dict in phase_dicts:
+            self.phases.append(Phase.fromDict(phase_dict))
+
+    def toDicts(self):
+        return [phase.toDict() for phase in self.phases]
+
+    def writeJSON(self, json_file):
+        with open(json_file, 'w') as output_file:
+            json.dump({'trace_memory':self.trace_memory,
+                       'phases':self.toDicts()}, output_file, indent = 2)
+            output_file.write('\n')
+
+    def orderedPhases(self):
+        '''Returns the phases in the order they started, each timed function
+directly after the phase it was called from.
+'''
+        ordered, children = [], {}
+        for phase in self.phases:
+            if (phase.parent is not None):
+                children.setdefault((phase.source, phase.parent),
+                                    []).append(phase)
+        for phase in self.phases:
+            if (phase.parent is None):
+                ordered.append(phase)
+                ordered.extend(children.pop((phase.source, phase.name), []))
+        for orphans in children.values():
+            ordered.extend(orphans)
+        return ordered
+
+    def report(self, out = None):
+        '''Prints one line per phase, grouped by source file.'''
+        out = out or sys.stdout
+        source = False
+        for phase in self.orderedPhases():
+            if (phase.source != source):
+                source = phase.source
+                print('\n%s' % (source or '(no file)'), file = out)
+                print('  %-34s %10s %10s %10s  %s' % ('phase', 'wall s',
+                                                      'cpu s', 'peak MB',
+                                                      'counts'), file = out)
+            if (phase.parent is None):
+                name = phase.name
+            else:
+                name = '  %s (%d calls)' % (phase.name, phase.calls)
+            line = '  %-34s %10.3f %10s %10s  %s' % (
+                name, phase.wall,
+                '' if phase.cpu is None else '%.3f' % phase.cpu,
+                '' if phase.peak is None else '%.1f' % (phase.peak / 1048576.0),
+                ', '.join('%s=%s' % item for item in phase.counts.items()))
+            print(line.rstrip(), file = out)
+
+
+class NullPhase():
+    '''Stands in for a Phase when nothing is recorded.'''
+    def __init__(self):
+        self.counts = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullStats():
+    '''The PhaseStats of an engine that is not instrumented.'''
+    null_phase = NullPhase()
+
+    def setSource(self, source):
+        pass
+
+    def phase(self, name):
+        self.null_phase.counts.clear()
+        return self.null_phase
+
+    def timed(self, name, function):
+        return function
+
+
+nostats = NullStats()
+
+
+def runProfiled(profile_file, function, *args):
+    '''Calls function(*args) and returns its result.  If profile_file is
+given, the call runs under cProfile and the profile is dumped to that file.
+'''
+    if not profile_file:
+        return function(*args)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        profiler.dump_stats(profile_file)
+
+
+def addArguments(arg_parser):
+    '''Adds the --stats, --stats-json, --trace-memory and --profile options
+to an argparse parser.
+'''
+    arg_parser.add_argument('--stats', action = 'store_true',
+                            help = 'print the time and counts of every phase')
+    arg_parser.add_argument('--stats-json', default = None, metavar = 'FILE',
+                            help = 'save the phase statistics as JSON')
+    arg_parser.add_argument('--trace-memory', action = 'store_true',
+                            help = 'also record the peak heap of every phase '
+                            '(slower)')
+    arg_parser.add_argument('--profile', default = None, metavar = 'FILE',
+                            help = 'dump a cProfile profile to FILE')
+
+
+def statsFromArguments(args):
+    '''Returns a PhaseStats for the options parsed by addArguments, or None
+if no statistics were asked for.  --trace-memory on its own implies --stats.
+'''
+    if (args.trace_memory and not args.stats_json):
+        args.stats = True
+    if (args.stats or args.stats_json):
+        return PhaseStats(args.trace_memory)
+
+
+def reportFromArguments(stats, args, out = None):
+    '''Prints and saves stats as asked for by the parsed options.'''
+    if (stats is None):
+        return
+    if args.stats:
+        stats.report(out)
+    if args.stats_json:
+        stats.writeJSON(args.stats_json)
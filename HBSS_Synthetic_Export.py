@@ -0,0 +1,499 @@
+"""HBSS Synthetic Export
+
+Writes synthetic ePO policy exports of any size for every supported product,
+so the conversion engines can be measured at scale (see HBSS_Benchmark).  The
+exports follow the layout of real ePO exports closely enough for every engine
+and for HBSSXMLParser.productSniffer:
+
+    HOSTIPS_8000_FW     rules, nested rule groups (JUMP rules with their own
+                        sequence) and a pool of shared network, application
+                        and DNS suffix aggregates referenced by many rules
+    HOSTIPS_8000_IPS    IPS exceptions mixed with other IPS settings sections
+    HOSTIPS_7000_FW     Data rows in shuffled order with a RuleIDSequence,
+                        flat rule groups and quoted names containing commas
+    HOSTIPS_7000_APP    Application Blocking rules with a RuleIDSequence
+    HOSTIPS_7000_IPS    IPS exceptions, one Setting per line
+
+The size is the number of rules (exceptions for the IPS products).  Output is
+written as it is generated, so 1M rule exports do not need 1M rules in memory,
+and the same seed always produces the same export.
+
+usage: python3 HBSS_Synthetic_Export.py <featureid> <size> <output XML>
+                                        [--seed N] [--group-size N]
+                                        [--group-depth N] [--aggregates N]
+"""
+
+import argparse, datetime, random, sys, uuid, xml.sax.saxutils
+
+import HBSS_Classes
+
+
+class SyntheticExport():
+    '''Generates exports of rule_count rules (or exceptions).  group_size is
+the average number of members of a rule group, group_depth how deeply HIPS 8 FW
+groups may nest, and aggregate_count the size of the shared HIPS 8 FW aggregate
+pool (default: one aggregate per 20 rules).  All randomness comes from seed.
+'''
+    policy_name = 'Synthetic Policy'
+    group_ratio = 0.1
+    nested_ratio = 0.03
+    escape_entities = {'"': '&quot;', "'": '&apos;', '\n': '&#xA;'}
+    first_date = datetime.date(2012, 1, 1)
+    date_span = 2555
+    users = ['admin', 'adm.jane.doe', 'adm.john.smith', 'svc.epo', 'adm.ops']
+    executables = ['C:\\WINDOWS\\SYSTEM32\\SVCHOST.EXE',
+                   'C:\\WINDOWS\\SYSTEM32\\LSASS.EXE',
+                   'C:\\PROGRAM FILES\\INTERNET EXPLORER\\IEXPLORE.EXE',
+                   'C:\\PROGRAM FILES\\MICROSOFT OFFICE\\OFFICE16\\OUTLOOK.EXE',
+                   'C:\\PROGRAM FILES\\MCAFEE\\AGENT\\MASVC.EXE',
+                   'C:\\WINDOWS\\SYSTEM32\\WINDOWSPOWERSHELL\\V1.0\\POWERSHELL.EXE',
+                   'C:\\PROGRAM FILES (X86)\\JAVA\\JRE8\\BIN\\JAVAW.EXE',
+                   'C:\\WINDOWS\\SYSTEM32\\SPOOLSV.EXE']
+    services = [(6, '80'), (6, '443'), (6, '445'), (6, '3389'), (17, '53'),
+                (17, '123'), (17, '137-138'), (6, '8080, 8443'), (6, '1024-65535'),
+                (17, '161-162'), (6, '389, 636, 3268')]
+
+    def __init__(self, rule_count, seed = 0, group_size = 25, group_depth = 3,
+                 aggregate_count = None):
+        self.rule_count = rule_count
+        self.seed = seed
+        self.group_size = group_size
+        self.group_depth = group_depth
+        self.aggregate_count = aggregate_count or max(16, rule_count // 20)
+        self.product_dict = {
+            HBSS_Classes.HIPS_8000_FW.featureid:self.writeFW8000,
+            HBSS_Classes.HIPS_8000.featureid:self.writeIPS8000,
+            HBSS_Classes.IPS_FW_7000.featureid:self.writeFW7000,
+            HBSS_Classes.IPS_AB_7000.featureid:self.writeAB7000,
+            HBSS_Classes.HIPS_7000.featureid:self.writeIPS7000
+            }
+
+    def writeExport(self, featureid, xml_file):
+        '''Writes an export of the product featureid to xml_file.'''
+        self.rng = random.Random('%s:%s:%d' % (featureid, self.seed,
+                                               self.rule_count))
+        with open(xml_file, 'w', encoding = 'utf-8', newline = '\n',
+                  buffering = 1 << 20) as out:
+            out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      '<epo:EPOPolicySchema xmlns:epo="mcafee-epo-policy" '
+                      'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+                      '<EPOPolicyVerInfo vermjr="5" vermin="9" verrel="1" '
+                      'verbld="0"/>\n')
+            self.product_dict[featureid](out)
+            out.write('</epo:EPOPolicySchema>\n')
+
+    #---helpers shared by every product---
+    def writeSection(self, out, name, featureid, category, param_int,
+                     param_str, section, settings):
+        '''Writes one EPOPolicySettings element, its settings sorted by name
+the way ePO writes them.
+'''
+        out.write('<EPOPolicySettings name="%s" featureid="%s" categoryid="%s" '
+                  'typeid="%s" param_int="%s" param_str="%s">\n<Section '
+                  'name="%s">\n' % (self.escape(name), featureid, category,
+                                    category, param_int, param_str, section))
+        out.write(''.join('<Setting name="%s" value="%s"/>\n' %
+                          (setting_name, self.escape(str(value)))
+                          for setting_name, value in sorted(settings)))
+        out.write('</Section>\n</EPOPolicySettings>\n')
+
+    def escape(self, value):
+        return xml.sax.saxutils.escape(value, self.escape_entities)
+
+    def listSettings(self, setting_name, values):
+        '''Returns the +Name#i settings of a list and its _Name count.'''
+        settings = [('+%s#%d' % (setting_name, index), value)
+                    for index, value in enumerate(values)]
+        if values:
+            settings.append(('_' + setting_name, len(values)))
+        return settings
+
+    def newGUID(self):
+        return str(uuid.UUID(int = self.rng.getrandbits(128), version = 4))
+
+    def newDate(self):
+        return self.first_date + datetime.timedelta(
+            days = self.rng.randrange(self.date_span))
+
+    def newTimestamp(self):
+        return '%sT%02d:%02d:%02d.%03dZ' % (
+            self.newDate().isoformat(), self.rng.randrange(24),
+            self.rng.randrange(60), self.rng.randrange(60),
+            self.rng.randrange(1000))
+
+    def newIPv4(self):
+        return (self.rng.choice((10, 172, 192, 164, 214)) << 24 |
+                self.rng.getrandbits(24))
+
+    def mappedHex(self, address):
+        '''Returns an IPv4 address as the IPv4-mapped hex string of exports.'''
+        return '0000:0000:0000:0000:0000:ffff:%04x:%04x' % (address >> 16,
+                                                            address & 0xffff)
+
+    def newAddressField(self):
+        '''Returns a single address, a CIDR network, a range or an IPv6
+address in export form.
+'''
+        kind = self.rng.random()
+        address = self.newIPv4()
+        if (kind < 0.45):
+            return self.mappedHex(address)
+        if (kind < 0.8):
+            prefix = self.rng.choice((8, 16, 22, 24, 24, 28))
+            network = address & ~((1 << (32 - prefix)) - 1)
+            return self.mappedHex(network) + '/' + str(prefix + 96)
+        if (kind < 0.95):
+            return (self.mappedHex(address) + '-' +
+                    self.mappedHex(address + self.rng.randrange(1, 256)))
+        return ':'.join('%04x' % self.rng.getrandbits(16) for x in range(8))
+
+    def newHash(self):
+        if (self.rng.random() < 0.3):
+            return '0' * 32
+        return '%032x' % self.rng.getrandbits(128)
+
+    def sharedIndex(self, count):
+        '''Returns an index below count, skewed towards the first entries so
+a few aggregates or signatures are shared by many rules.
+'''
+        return int(count * self.rng.random() ** 2)
+
+    #---HIPS 8 FW---
+    def writeFW8000(self, out):
+        featureid = HBSS_Classes.HIPS_8000_FW.featureid
+        aggregates = self.writeFW8000Aggregates(out, featureid)
+        top_level = []
+        written = 0
+        while (written < self.rule_count):
+            if ((self.rule_count - written > 1) and
+                (self.rng.random() < self.group_ratio)):
+                written += self.writeFW8000Group(out, featureid, aggregates,
+                                                 top_level, 1,
+                                                 self.rule_count - written)
+            else:
+                top_level.append(self.writeFW8000Rule(out, featureid,
+                                                      aggregates))
+                written += 1
+        self.writeFW8000Sequence(out, featureid, 'null', top_level)
+
+    def writeFW8000Aggregates(self, out, featureid):
+        '''Writes the shared aggregate pool and returns its GUIDs.'''
+        guids = []
+        for index in range(self.aggregate_count):
+            GUID = self.newGUID()
+            kind = self.rng.random()
+            settings = [('GUID', GUID), ('LastModified', self.newTimestamp()),
+                        ('LastModifyingUsername', self.rng.choice(self.users)),
+                        ('Note', '')]
+            if (index == 0):
+                settings += [('Name', 'Trusted'), ('Type', 65546),
+                             ('RemoteNetID', self.newGUID())]
+                settings += self.listSettings('RemoteAddress', ['[trusted]'])
+            elif (kind < 0.45):
+                addresses = [self.newAddressField()
+                             for x in range(self.rng.randint(1, 3))]
+                settings += [('Name', 'Remote Network %d' % index),
+                             ('Type', 65546), ('RemoteNetID', self.newGUID())]
+                settings += self.listSettings('RemoteAddress', addresses)
+            elif (kind < 0.6):
+                settings += [('Name', 'Local Network %d' % index),
+                             ('Type', 65541)]
+                settings += self.listSettings('LocalAddress',
+                                              [self.newAddressField()])
+            elif (kind < 0.65):
+                settings += [('Name', 'Connection Aware Group %d' % index),
+                             ('Type', 65543), ('Isolated', 0)]
+                settings += self.listSettings(
+                    'DnsSuffix', ['*.site%d.example.mil' % index])
+            else:
+                path = self.rng.choice(self.executables)
+                if (self.rng.random() < 0.6):
+                    path = path.replace('.EXE', '%d.EXE' % index)
+                appname = path.rsplit('\\', 1)[-1][:-4]
+                settings += [('Name', appname), ('Type', 65547)]
+                settings += self.listSettings('AppDescription', [appname])
+                settings += self.listSettings('AppHash', [self.newHash()])
+                settings += self.listSettings('AppName', [appname])
+                settings += self.listSettings('AppPath', [path])
+                settings += self.listSettings(
+                    'AppSigner', [self.rng.choice(('', 'CN=MICROSOFT WINDOWS, '
+                                                   'O=MICROSOFT CORPORATION'))])
+            self.writeSection(out, '%s:Aggregate:%s' % (self.policy_name, GUID),
+                              featureid, 'FireCore_FW_Rules', 104,
+                              'AggregateCriterion', 'AggregateCriterion',
+                              settings)
+            guids.append(GUID)
+        return guids
+
+    def fw8000RuleSettings(self, GUID, name, action, direction):
+        return [('Action', action), ('ClickTimeout', 0),
+                ('Direction', direction),
+                ('Enabled', 0 if (self.rng.random() < 0.05) else 1),
+                ('EndTime', '0:00'), ('GUID', GUID), ('Intrusion', 0),
+                ('Invert', 0), ('LastModified', self.newTimestamp()),
+                ('LastModifyingUsername', self.rng.choice(self.users)),
+                ('Logged', self.rng.randrange(2)), ('Name', name),
+                ('Note', ''), ('OffHours', 'NONE'), ('StartTime', '0:00'),
+                ('WeekMask', 0)] + self.listSettings('TcpFlags', [0])
+
+    def writeFW8000Rule(self, out, featureid, aggregates):
+        '''Writes one ALLOW or BLOCK rule and returns its GUID.'''
+        GUID = self.newGUID()
+        action = 'BLOCK' if (self.rng.random() < 0.3) else 'ALLOW'
+        direction = self.rng.choice(('IN', 'OUT', 'OUT', 'EITHER'))
+        settings = self.fw8000RuleSettings(
+            GUID, '%s %s rule %s' % (action.title(), direction.lower(),
+                                     GUID[:8]), action, direction)
+        kind = self.rng.random()
+        if (kind < 0.08):
+            settings += self.listSettings('TransportProtocol', [1])
+            settings += self.listSettings(
+                'MessageType', [self.rng.choice((0, 3, 8, 11))])
+        elif (kind < 0.9):
+            protocol, ports = self.rng.choice(self.services)
+            settings += self.listSettings('TransportProtocol', [protocol])
+            settings += self.listSettings('RemotePort', [ports])
+            if (self.rng.random() < 0.3):
+                settings += self.listSettings('LocalPort', ['1024-65535'])
+        settings += self.listSettings(
+            'NetworkProtocol', [2048, 34525][:self.rng.randint(1, 2)])
+        references = set(aggregates[self.sharedIndex(len(aggregates))]
+                         for x in range(self.rng.randrange(4)))
+        settings += self.listSettings('AggRef', sorted(references))
+        self.writeSection(out, '%s:Rule:%s' % (self.policy_name, GUID),
+                          featureid, 'FireCore_FW_Rules', 101, 101, 101,
+                          settings)
+        return GUID
+
+    def writeFW8000Group(self, out, featureid, aggregates, parent, depth,
+                         budget):
+        '''Writes a group rule, its members (possibly groups themselves) and
+its sequence, appends the group to the parent sequence and returns the number
+of rules written, never more than budget.
+'''
+        GUID = self.newGUID()
+        self.writeSection(out, '%s:Rule:%s' % (self.policy_name, GUID),
+                          featureid, 'FireCore_FW_Rules', 101, 101, 101,
+                          self.fw8000RuleSettings(GUID, 'Group ' + GUID[:8],
+                                                  'JUMP', 'EITHER'))
+        parent.append(GUID)
+        written = 1
+        members = []
+        for x in range(self.rng.randint(1, 2 * self.group_size)):
+            if (written >= budget):
+                break
+            if ((depth < self.group_depth) and (budget - written > 1) and
+                (self.rng.random() < self.nested_ratio)):
+                written += self.writeFW8000Group(out, featureid, aggregates,
+                                                 members, depth + 1,
+                                                 budget - written)
+            else:
+                members.append(self.writeFW8000Rule(out, featureid,
+                                                    aggregates))
+                written += 1
+        self.writeFW8000Sequence(out, featureid, GUID, members)
+        return written
+
+    def writeFW8000Sequence(self, out, featureid, GUID, members):
+        settings = self.listSettings('RuleIDSequence', members)
+        if (GUID != 'null'):
+            settings.append(('RuleListID', GUID))
+        self.writeSection(out, '%s:Sequence:%s' % (self.policy_name, GUID),
+                          featureid, 'FireCore_FW_Rules', 100, 100, 100,
+                          settings)
+
+    #---HIPS 7 and HIPS 8 IPS---
+    def ipsExceptionSettings(self, index, process_setting):
+        settings = [('Name', 'Exception %d for %s' % (
+                         index, self.rng.choice(('SCCM', 'backup', 'AV scan',
+                                                 "admin's tools")))),
+                    ('Note', 'ticket %d' % self.rng.randrange(100000)
+                     if (self.rng.random() < 0.5) else ''),
+                    ('LastModifyDate', self.newDate().isoformat() + 'T00:00:00')]
+        if (self.rng.random() < 0.1):
+            settings.append(('IncludeAllSignatures', 1))
+        else:
+            signatures = set(1000 + self.sharedIndex(8000)
+                             for x in range(self.rng.randint(1, 4)))
+            settings += [('2$SignatureID#%d' % position, signature)
+                         for position, signature in
+                         enumerate(sorted(signatures))]
+        if (self.rng.random() < 0.3):
+            settings += self.listSettings(
+                'OSUserName', ['DOMAIN\\user%d' % self.rng.randrange(500)])
+        settings += self.listSettings(
+            process_setting, self.rng.sample(self.executables,
+                                             self.rng.randint(0, 2)))
+        if (self.rng.random() < 0.4):
+            settings += self.listSettings(
+                '$files', ['C:\\DATA\\SHARE%d\\*.*' % self.rng.randrange(50)])
+        if (self.rng.random() < 0.2):
+            settings += self.listSettings(
+                '$keys', ['\\REGISTRY\\MACHINE\\SOFTWARE\\VENDOR%d' %
+                          self.rng.randrange(50)])
+        return settings
+
+    def writeIPSExceptions(self, out, featureid, process_setting,
+                           extra_settings):
+        for index in range(self.rule_count):
+            settings = self.ipsExceptionSettings(index, process_setting)
+            if extra_settings:
+                settings += extra_settings(index)
+            self.writeSection(out, '%s:IPSException:%d' % (self.policy_name,
+                                                           index),
+                              featureid, 'IPS', 1, 'IPSException', 1, settings)
+            if (index % 8 == 7):
+                #signature reaction settings, which are not exceptions
+                signature = 1000 + self.sharedIndex(8000)
+                self.writeSection(out, '%s:IPSRule:%d' % (self.policy_name,
+                                                          signature),
+                                  featureid, 'IPS', 0, 'IPSRule', 0,
+                                  [('SignatureID', signature),
+                                   ('Reaction', self.rng.randrange(4)),
+                                   ('Log', 1)])
+
+    def writeIPS8000(self, out):
+        def targets(index):
+            if (self.rng.random() < 0.3):
+                return self.listSettings('TargetAppPath',
+                                         [self.rng.choice(self.executables)])
+            return []
+        self.writeIPSExceptions(out, HBSS_Classes.HIPS_8000.featureid,
+                                'AppPath', targets)
+
+    def writeIPS7000(self, out):
+        def parameters(index):
+            if (self.rng.random() < 0.2):
+                return self.listSettings(
+                    '$url', ['http://intranet%d.example.mil/*' %
+                             self.rng.randrange(20)])
+            return []
+        self.writeIPSExceptions(out, HBSS_Classes.HIPS_7000.featureid,
+                                'FullProcessName', parameters)
+
+    #---HIPS 7 FW and Application Blocking---
+    def ruleOrder(self):
+        '''Returns the sequence position of each rule ID (1 to rule_count),
+so rules are written in a different order than they are applied.
+'''
+        positions = list(range(self.rule_count))
+        self.rng.shuffle(positions)
+        return positions
+
+    def writeRuleSequence(self, out, featureid, category, param_int,
+                          positions):
+        by_position = [0] * len(positions)
+        for index, position in enumerate(positions):
+            by_position[position] = index + 1
+        self.writeSection(out, '%s:RuleSequence' % self.policy_name, featureid,
+                          category, param_int, 'RuleSequence', param_int,
+                          self.listSettings('RuleIDSequence', by_position))
+
+    def fw7000Port(self):
+        '''Returns the six port fields of a HIPS 7 FW rule: kind (0 single,
+1 range, 2 list, 3 any), count and up to four ports.
+'''
+        kind = self.rng.random()
+        if (kind < 0.3):
+            return ['3', '0', '0', '0', '0', '0']
+        if (kind < 0.7):
+            return ['0', '1', str(self.rng.choice((53, 80, 123, 443, 445,
+                                                   3389))), '0', '0', '0']
+        if (kind < 0.85):
+            low = self.rng.randrange(1024, 60000)
+            return ['1', '2', str(low), str(low + self.rng.randrange(1, 5000)),
+                    '0', '0']
+        count = self.rng.randint(2, 4)
+        ports = [str(self.rng.randrange(1, 65536)) for x in range(count)]
+        return ['2', str(count)] + ports + ['0'] * (4 - count)
+
+    def writeFW7000(self, out):
+        featureid = HBSS_Classes.IPS_FW_7000.featureid
+        #group flags by sequence position: 1 starts a group, 2 is a member
+        #the last rule is kept out of any group, as
+        #IPS_FW_7000.groupRuleDivisionStream compares the first rule with it
+        flags = bytearray(b'0' * self.rule_count)
+        position = 0
+        while (position < self.rule_count - 2):
+            if (self.rng.random() < self.group_ratio):
+                size = self.rng.randint(1, 2 * self.group_size)
+                flags[position] = ord('1')
+                end = min(self.rule_count - 1, position + 1 + size)
+                flags[position + 1:end] = b'2' * (end - position - 1)
+                position = end
+            else:
+                position += 1
+        positions = self.ruleOrder()
+        for index, position in enumerate(positions):
+            flag = chr(flags[position])
+            if (flag == '1'):
+                name = '"Group %d"' % index
+            elif (self.rng.random() < 0.1):
+                name = '"Allow %d, %d"' % (index, self.rng.randrange(100))
+            else:
+                name = '"Rule %d"' % index
+            if (self.rng.random() < 0.8):
+                address = self.newAddressField()
+            else:
+                address = '0000:0000:0000:0000:0000:0000:0000:0000'
+            data = (['FALSE' if (self.rng.random() < 0.05) else 'TRUE',
+                     'FALSE' if (self.rng.random() < 0.3) else 'TRUE', '0',
+                     self.rng.choice('012'),
+                     self.rng.choice(('6', '17', '1', '1024')), '0', address,
+                     '0'] + self.fw7000Port() + self.fw7000Port() +
+                    [name, '"%s"' % self.rng.choice(self.executables),
+                     '0x' + self.newHash().upper(), '0', flag] + ['0'] * 10 +
+                    [self.rng.choice(('0', '0', '0', '33169', '32823')), '0'])
+            self.writeSection(out, '%s:FWRule:%d' % (self.policy_name,
+                                                     index + 1),
+                              featureid, 'FW', 1, 'FWRule', 'FWRule',
+                              [('Data', ','.join(data)),
+                               ('LastModifyDate',
+                                self.newDate().isoformat() + 'T00:00:00'),
+                               ('RuleID', index + 1)])
+        self.writeRuleSequence(out, featureid, 'FW', 2, positions)
+
+    def writeAB7000(self, out):
+        featureid = HBSS_Classes.IPS_AB_7000.featureid
+        positions = self.ruleOrder()
+        for index in range(self.rule_count):
+            path = self.rng.choice(self.executables).replace(
+                '.EXE', '%d.EXE' % index)
+            appname = path.rsplit('\\', 1)[-1]
+            self.writeSection(out, '%s:AppRule:%d' % (self.policy_name,
+                                                      index + 1),
+                              featureid, 'AppBlocking', 1, 'AppRule', 'AppRule',
+                              [('Data', '1,0,0,%s,2' % path),
+                               ('LastModifyDate',
+                                self.newDate().isoformat() + 'T00:00:00'),
+                               ('Name', "Block '%s'" % appname),
+                               ('Note', '' if (self.rng.random() < 0.5) else
+                                'requested by ' + self.rng.choice(self.users)),
+                               ('RuleID', index + 1)])
+        self.writeRuleSequence(out, featureid, 'AppBlocking', 2, positions)
+
+
+def main(argv = None):
+    product_list = SyntheticExport(0).product_dict
+    arg_parser = argparse.ArgumentParser(
+        description = 'Write a synthetic ePO export for scaling tests.')
+    arg_parser.add_argument('featureid', choices = sorted(product_list))
+    arg_parser.add_argument('size', type = int,
+                            help = 'number of rules (or IPS exceptions)')
+    arg_parser.add_argument('output')
+    arg_parser.add_argument('--seed', type = int, default = 0)
+    arg_parser.add_argument('--group-size', type = int, default = 25)
+    arg_parser.add_argument('--group-depth', type = int, default = 3,
+                            help = 'HIPS 8 FW group nesting depth')
+    arg_parser.add_argument('--aggregates', type = int, default = None,
+                            help = 'HIPS 8 FW shared aggregates '
+                            '(default: size / 20)')
+    args = arg_parser.parse_args(argv)
+    generator = SyntheticExport(args.size, args.seed, args.group_size,
+                                args.group_depth, args.aggregates)
+    generator.writeExport(args.featureid, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
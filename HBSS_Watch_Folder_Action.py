@@ -0,0 +1,277 @@
+"""HBSS XML Parser - Watch Folder
+
+Non-interactive daemon that watches the directory ePO drops its exports into
+and converts every new or changed export as soon as it has been completely
+written, so the CSV files appear seconds after an export lands without anyone
+running the driver.
+
+The directory is polled every --interval seconds with os.scandir, which only
+reads directory entries, so short intervals are cheap even on a network share
+(inotify is not available on Windows shares or in the standard library).  An
+export is converted once:
+
+    - its size and modification time have not changed for --settle seconds,
+      so a file that is still being copied is left alone, and
+    - it ends with the closing EPOPolicySchema tag, so an export that stopped
+      half way is not converted until it is complete.  A .zip export must have
+      its central directory, which is written last; a .xml.gz export cannot
+      be checked without decompressing all of it, so it is converted once it
+      has settled and, if it was cut short, fails until it changes.
+
+Conversions run in a process pool of --workers processes that is kept alive
+for the life of the daemon, and no more files are handed to it than it has
+workers; the remaining files wait in a queue.  HIPS 8 FW rule sets are kept in
+the HBSS_Parse_Cache as in HBSS_Batch_Action, and the size and modification
+time of every converted export is saved in a state file in the cache directory,
+so after a restart only exports that changed while the daemon was down are
+converted again.  A failed or unsupported export is not retried until it
+changes.
+
+usage: python3 HBSS_Watch_Folder_Action.py [directory] [--interval S] [--settle S]
+                                           [--workers N] [--since MM-DD-YYYY ...]
+                                           [--cache-dir DIR | --no-cache] [--once]
+"""
+
+import argparse, json, os, signal, sys, time, zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import HBSS_Batch_Action, HBSS_Input_Stream
+
+
+def ignoreSignals():
+    '''Worker process initializer.  Ctrl-C and SIGTERM are meant for the
+daemon, which stops handing out exports and waits for the running conversions,
+so the workers ignore them instead of dying half way through an export.
+'''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+class FolderWatcher():
+    '''Watches directory for exports to convert.  The seen dictionary maps
+the name of each export not yet converted to its (size, modification time) and
+the time that stat was first seen, and converted maps the name of every export
+that has been converted to the stat it had when it was converted.
+'''
+    closing_tag = b'EPOPolicySchema>'
+    tail_size = 256
+    state_name = 'watch_state.json'
+
+    def __init__(self, directory = '.', workers = None, since_dates = (),
+                 cache_dir = None, settle = 5.0, out = None):
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.since_dates = list(since_dates)
+        self.cache_dir = cache_dir
+        self.settle = settle
+        self.out = out or sys.stdout
+        self.seen = {}
+        self.queue = []
+        self.running = {}
+        self.incomplete = set()
+        self.stopping = False
+        self.pool_broken = False
+        if cache_dir:
+            self.state_file = os.path.join(cache_dir, self.state_name)
+        else:
+            self.state_file = os.path.join(directory, '.hbss_' +
+                                           self.state_name)
+        self.converted = self.loadState()
+
+    def loadState(self):
+        '''Returns the converted dictionary saved by an earlier run.'''
+        try:
+            with open(self.state_file, 'r') as state_input:
+                return {name: tuple(stat_key) for name, stat_key
+                        in json.load(state_input).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            return {}
+
+    def saveState(self):
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok = True)
+        temp_file = '%s.%d.tmp' % (self.state_file, os.getpid())
+        with open(temp_file, 'w') as state_output:
+            json.dump(self.converted, state_output)
+        os.replace(temp_file, self.state_file)
+
+    def exportComplete(self, xml_file):
+        '''Returns True if xml_file ends with the closing tag of an export,
+or for a compressed export, if it looks complete.
+'''
+        if xml_file.endswith(HBSS_Input_Stream.zip_suffix):
+            return zipfile.is_zipfile(xml_file)
+        if xml_file.endswith(HBSS_Input_Stream.gzip_suffix):
+            return True
+        try:
+            with open(xml_file, 'rb') as export_file:
+                export_file.seek(0, os.SEEK_END)
+                export_file.seek(max(0, export_file.tell() - self.tail_size))
+                return export_file.read().rstrip().endswith(self.closing_tag)
+        except OSError:
+            return False
+
+    def scan(self, now = None):
+        '''Reads the directory once and queues every export that has settled
+and is complete.  Returns the number of exports that are still settling.
+'''
+        now = time.monotonic() if now is None else now
+        listed, settling = set(), 0
+        busy = set(self.queue).union(name for name, stat_key
+                                     in self.running.values())
+        for entry in os.scandir(self.directory):
+            if not (HBSS_Input_Stream.isExport(entry.name) and
+                    entry.is_file()):
+                continue
+            listed.add(entry.name)
+            entry_stat = entry.stat()
+            stat_key = (entry_stat.st_size, entry_stat.st_mtime_ns)
+            if (self.converted.get(entry.name) == stat_key or
+                entry.name in busy):
+                continue
+            first_seen = self.seen.get(entry.name)
+            if (first_seen is None or first_seen[0] != stat_key):
+                self.seen[entry.name] = (stat_key, now)
+                self.incomplete.discard(entry.name)
+                settling += 1
+            elif (now - first_seen[1] < self.settle):
+                settling += 1
+            elif self.exportComplete(os.path.join(self.directory,
+                                                  entry.name)):
+                del self.seen[entry.name]
+                self.queue.append(entry.name)
+            elif entry.name not in self.incomplete:
+                self.incomplete.add(entry.name)
+                self.log('waiting for the rest of %s' % entry.name)
+        for name in set(self.seen).difference(listed):
+            del self.seen[name]
+            self.incomplete.discard(name)
+        return settling
+
+    def submit(self, pool):
+        '''Hands queued exports to the pool while it has an idle worker.'''
+        while (self.queue and len(self.running) < self.workers):
+            name = self.queue.pop(0)
+            xml_file = os.path.join(self.directory, name)
+            try:
+                file_stat = os.stat(xml_file)
+            except OSError:
+                continue
+            future = pool.submit(HBSS_Batch_Action.convertXML, xml_file,
+                                 self.since_dates, self.cache_dir)
+            self.running[future] = (name, (file_stat.st_size,
+                                           file_stat.st_mtime_ns))
+
+    def collect(self, futures):
+        '''Records the outcome of every finished future in futures.  An export
+whose worker process died is not marked as converted, so it is converted again
+by a later scan; convertXML itself never raises.
+'''
+        for future in futures:
+            name, stat_key = self.running.pop(future)
+            try:
+                result = future.result()
+            except BaseException as err:
+                if isinstance(err, BrokenProcessPool):
+                    self.pool_broken = True
+                self.log('worker lost converting %s: %r' % (name, err))
+                continue
+            self.converted[name] = stat_key
+            self.log('%-24s %-18s %7.2fs  %s' % (result.status(),
+                                                 result.product or '',
+                                                 result.seconds, name))
+            if not result.ok():
+                self.log(result.error.rstrip())
+        if futures:
+            self.saveState()
+
+    def log(self, message):
+        print('%s  %s' % (time.strftime('%Y-%m-%d %H:%M:%S'), message),
+              file = self.out, flush = True)
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def newPool(self):
+        return ProcessPoolExecutor(max_workers = self.workers,
+                                   initializer = ignoreSignals)
+
+    def run(self, interval = 2.0, once = False):
+        '''Watches the directory until stop() is called or, with once, until
+every export present has been converted.
+'''
+        self.log('watching %s with %d workers' % (
+            os.path.abspath(self.directory), self.workers))
+        pool = self.newPool()
+        try:
+            try:
+                while not self.stopping:
+                    if self.pool_broken:
+                        #a worker was killed, the pool takes no more work
+                        pool.shutdown(wait = False)
+                        pool = self.newPool()
+                        self.pool_broken = False
+                    settling = self.scan()
+                    self.submit(pool)
+                    if (once and not (settling or self.queue or
+                                      self.running)):
+                        break
+                    if self.running:
+                        done, not_done = wait(list(self.running),
+                                              timeout = interval,
+                                              return_when = FIRST_COMPLETED)
+                        self.collect(done)
+                    else:
+                        time.sleep(interval)
+            except KeyboardInterrupt:
+                self.stopping = True
+            if self.running:
+                self.log('waiting for %d conversions to finish' %
+                         len(self.running))
+                self.collect(wait(list(self.running))[0])
+        finally:
+            pool.shutdown()
+        self.log('stopped')
+
+
+def main(argv = None):
+    arg_parser = argparse.ArgumentParser(
+        description = 'Convert ePO XML exports as they arrive in a directory.')
+    arg_parser.add_argument('directory', nargs = '?', default = '.')
+    arg_parser.add_argument('--interval', type = float, default = 2.0,
+                            help = 'seconds between directory scans '
+                            '(default: 2)')
+    arg_parser.add_argument('--settle', type = float, default = 5.0,
+                            help = 'seconds an export must be unchanged '
+                            'before it is converted (default: 5)')
+    arg_parser.add_argument('--workers',
+                            type = HBSS_Batch_Action.positiveInt,
+                            default = None,
+                            help = 'worker processes (default: CPU count)')
+    arg_parser.add_argument('--since', action = 'append', default = [],
+                            type = HBSS_Batch_Action.sinceDate, metavar = 'MM-DD-YYYY',
+                            help = 'also write HIPS 8 FW rules changed since '
+                            'this date (may be repeated)')
+    arg_parser.add_argument('--cache-dir', default = None,
+                            help = 'parse cache directory '
+                            '(default: DIRECTORY/.hbss_cache)')
+    arg_parser.add_argument('--no-cache', action = 'store_true',
+                            help = 'always parse every export')
+    arg_parser.add_argument('--once', action = 'store_true',
+                            help = 'exit once every export present has been '
+                            'converted')
+    args = arg_parser.parse_args(argv)
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(args.directory,
+                                                   '.hbss_cache')
+    watcher = FolderWatcher(args.directory, args.workers, args.since,
+                            cache_dir, args.settle)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run(args.interval, args.once)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+HIPS 8 FW Policy Diff
+
+Compares two exports of the same HIPS 8 FW policy (e.g. yesterday's and
+today's) and reports the rules that were added, removed, modified or moved.
+
+Rules are matched by GUID, so a rule keeps its identity when it is renamed or
+reordered.  The values of every FWRule slot of a rule are compared as one
+tuple, and only rules whose tuples differ are compared field by field, over the
+same columns as the CSV conversion plus the message types, physical media, TCP
+flags and schedule the CSV leaves out.  A rule counts as moved when its position relative to the
+other rules present in both exports changed: the longest run of common rules
+that kept their relative order is found in O(n log n), and every common rule
+outside it is reported as moved.  Inserting or deleting a rule therefore does
+not mark everything after it as moved.  A rule placed more than once (by a
+group referenced from two places) is matched occurrence by occurrence.
+
+usage: python3 HIPS_8_FW_Diff_Action.py <old XML> <new XML> [--csv report.csv] [--cache-dir DIR]
+"""
+import argparse, bisect, csv, operator, sys
+import HBSS_Parse_Cache, HIPS_8_FW_XML_Parser_Action
+
+class RuleChange():
+    #class to contain one change to a rule, kind is added, removed, modified or moved
+    #oldindex/newindex are the rule's positions in each export's ordered rule set, None if it is not in that export
+    #fields holds (column, old value, new value) for every column of a modified rule that changed
+    def __init__(self, kind, GUID, name, oldindex=None, newindex=None, fields=None):
+        self.kind = kind
+        self.GUID = GUID
+        self.name = name
+        self.oldindex = oldindex
+        self.newindex = newindex
+        self.fields = fields or []
+
+class PolicyDiff():
+    #class to contain the changes between two exports of the same policy
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.modified = []
+        self.moved = []
+        self.unchanged = 0
+
+    def changes(self):
+        #returns every change, ordered by position in the new export and then in the old export
+        return sorted(self.added + self.removed + self.modified + self.moved,
+                      key=lambda change: (change.newindex if change.newindex is not None else -1,
+                                          change.oldindex if change.oldindex is not None else -1))
+
+    def summary(self):
+        return "%d added, %d removed, %d modified, %d moved, %d unchanged" % (
+            len(self.added), len(self.removed), len(self.modified), len(self.moved), self.unchanged)
+
+    def writereport(self, out=None):
+        #prints a human readable report
+        out = out or sys.stdout
+        for change in self.changes():
+            position = "%s -> %s" % ("" if change.oldindex is None else change.oldindex + 1,
+                                     "" if change.newindex is None else change.newindex + 1)
+            print ("%-8s %-12s %s  [%s]" % (change.kind.upper(), position, change.name, change.GUID), file=out)
+            for column, oldvalue, newvalue in change.fields:
+                print ("             %s: %r -> %r" % (column, oldvalue, newvalue), file=out)
+        print (self.summary(), file=out)
+
+    def writecsv(self, filename):
+        #writes one row per change, with one extra row per changed field of a modified rule
+        with open(filename, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Change", "GUID", "Name", "Old Position", "New Position", "Field", "Old Value", "New Value"])
+            for change in self.changes():
+                oldposition = "" if change.oldindex is None else change.oldindex + 1
+                newposition = "" if change.newindex is None else change.newindex + 1
+                if change.fields:
+                    for column, oldvalue, newvalue in change.fields:
+                        writer.writerow([change.kind, change.GUID, change.name, oldposition, newposition,
+                                         column, oldvalue, newvalue])
+                else:
+                    writer.writerow([change.kind, change.GUID, change.name, oldposition, newposition, "", "", ""])
+
+#compared columns of a rule, the CSV columns followed by the settings the CSV leaves out
+diffcolumns = HIPS_8_FW_XML_Parser_Action.header_list + ["Message Type", "Physical Medium", "TCP Flags", "Week Mask",
+                                                         "Start Time", "End Time", "Off Hours"]
+
+#returns the slot values of a rule, except the GUID it is matched by and the aggregate GUIDs it references, whose
+#resolved aggregates are compared instead
+slotvalues = operator.attrgetter(*[slot for slot in HIPS_8_FW_XML_Parser_Action.FWRule.__slots__
+                                   if slot not in ('GUID', 'aggref')])
+
+def rulefields(rule):
+    #returns the values of a rule in diffcolumns order
+    return rule.row() + (", ".join(rule.messagetype), ", ".join(rule.physicalmedium), ", ".join(rule.tcpflags),
+                         rule.weekmask, rule.starttime, rule.endtime, rule.offhours)
+
+def occurrencekeys(order):
+    #returns (ID, occurrence) for every position of an ordered rule set, so a rule that appears more than once
+    #keeps a distinct key for each of its positions
+    seen = {}
+    keys = []
+    for ID in order:
+        occurrence = seen.get(ID, 0)
+        seen[ID] = occurrence + 1
+        keys.append((ID, occurrence))
+    return keys
+
+def stablepositions(sequence):
+    #returns the set of indexes of a longest strictly increasing subsequence of sequence, in O(n log n)
+    tails = []
+    tailindexes = []
+    previous = [None] * len(sequence)
+    for index, value in enumerate(sequence):
+        position = bisect.bisect_left(tails, value)
+        if (position == len(tails)):
+            tails.append(value)
+            tailindexes.append(index)
+        else:
+            tails[position] = value
+            tailindexes[position] = index
+        previous[index] = tailindexes[position - 1] if position else None
+    stable = set()
+    index = tailindexes[-1] if tailindexes else None
+    while (index is not None):
+        stable.add(index)
+        index = previous[index]
+    return stable
+
+def diffpolicies(oldrules, oldorder, newrules, neworder):
+    #compares two (rules, orderedruleset) pairs as returned by HIPS_8_FW_XML_Parser_Action.loadpolicy
+    #rules are matched by (ID, occurrence), a modified rule is reported once, at its first common occurrence
+    diff = PolicyDiff()
+    oldkeys = occurrencekeys(oldorder)
+    newkeys = occurrencekeys(neworder)
+    oldposition = {key: index for index, key in enumerate(oldkeys)}
+    newposition = {key: index for index, key in enumerate(newkeys)}
+    for key in oldkeys:
+        if key not in newposition:
+            diff.removed.append(RuleChange("removed", key[0], oldrules[key[0]].name, oldindex=oldposition[key]))
+    common = []
+    modifiedIDs = set()
+    for key in newkeys:
+        ID = key[0]
+        rule = newrules[ID]
+        if key not in oldposition:
+            diff.added.append(RuleChange("added", ID, rule.name, newindex=newposition[key]))
+            continue
+        common.append(key)
+        if key[1]:
+            continue
+        oldrule = oldrules[ID]
+        if (slotvalues(oldrule) == slotvalues(rule)):
+            continue
+        fields = [(column, oldvalue, newvalue) for column, oldvalue, newvalue in
+                  zip(diffcolumns, rulefields(oldrule), rulefields(rule)) if oldvalue != newvalue]
+        if fields:
+            diff.modified.append(RuleChange("modified", ID, rule.name, oldposition[key], newposition[key], fields))
+            modifiedIDs.add(ID)
+    stable = stablepositions([oldposition[key] for key in common])
+    for index, key in enumerate(common):
+        if index not in stable:
+            diff.moved.append(RuleChange("moved", key[0], newrules[key[0]].name, oldposition[key], newposition[key]))
+        elif key[0] not in modifiedIDs:
+            diff.unchanged += 1
+    return diff
+
+def difffiles(oldfilename, newfilename, cache=None):
+    #parses (or loads from the cache) both exports and compares them
+    oldrules, oldorder = HIPS_8_FW_XML_Parser_Action.loadpolicy(oldfilename, cache)
+    newrules, neworder = HIPS_8_FW_XML_Parser_Action.loadpolicy(newfilename, cache)
+    return diffpolicies(oldrules, oldorder, newrules, neworder)
+
+def main(argv):
+    argparser = argparse.ArgumentParser(description="Report the changes between two exports of a HIPS 8 FW policy.")
+    argparser.add_argument('oldxml')
+    argparser.add_argument('newxml')
+    argparser.add_argument('--csv', metavar='FILE', help="also write the changes to a CSV file")
+    argparser.add_argument('--cache-dir', metavar='DIR', help="HBSS_Parse_Cache directory to load and store parsed exports")
+    args = argparser.parse_args(argv[1:])
+    cache = None
+    if args.cache_dir:
+        cache = HBSS_Parse_Cache.ParseCache(args.cache_dir)
+    diff = difffiles(args.oldxml, args.newxml, cache)
+    diff.writereport()
+    if args.csv:
+        diff.writecsv(args.csv)
+
+if __name__=="__main__":
+    main(sys.argv)
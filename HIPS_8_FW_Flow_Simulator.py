@@ -0,0 +1,366 @@
+"""
+HIPS 8 FW Flow Simulator
+
+Replays observed connections against a HIPS 8 FW policy and reports the rule that would match each one first,
+so a policy change can be checked against real traffic before it is pushed through ePO.
+
+The ordered ALLOW and BLOCK rules are compiled once into a CompiledPolicy.  Every rule is one bit of a Python
+integer, numbered in first match order, and each dimension of the rules' match spaces (see
+HIPS_8_FW_Rule_Analyzer) becomes a lookup table that gives the mask of rules accepting a value:
+
+    ports, addresses   sorted elementary intervals of the port or integer address space, each with the mask
+                       of the rules covering it, found with one bisect
+    direction, protocol, network protocol, applications, ICMP message type, physical medium
+                       dictionaries of value to mask
+
+A flow is evaluated by AND-ing one mask per dimension; the first matching rule is the lowest set bit.  Flows
+are read and evaluated in batches one column at a time, so each distinct field value is only looked up once and
+the per flow work runs inside map() rather than in Python loops.
+
+The flow CSV has a header row with the columns direction (IN or OUT), protocol (name or number),
+local_address, local_port, remote_address, remote_port and process (application path), and optionally
+icmp_type and medium.  An empty port, address or process only matches rules that do not restrict it; an empty
+icmp_type or medium is not checked.  As in HIPS_8_FW_Rule_Index, Trusted and DNS suffix addresses match any
+address unless trusted networks are given.
+
+usage: python3 HIPS_8_FW_Flow_Simulator.py <HIPS 8 FW XML> <flows CSV> [-o results.csv] [--trusted NETWORK ...]
+"""
+import argparse, bisect, collections, csv, ipaddress, itertools, ntpath, operator, sys
+import HBSS_Parse_Cache, HIPS_8_FW_XML_Parser_Action, HIPS_8_FW_Rule_Index, HIPS_8_FW_Rule_Analyzer
+
+flowcolumns = ["direction", "protocol", "local_address", "local_port", "remote_address", "remote_port", "process",
+               "icmp_type", "medium"]
+resultcolumns = ["Rule Position", "Rule GUID", "Rule Name", "Action"]
+nomatch = "NO MATCH"
+unreadable = "UNREADABLE FLOW"
+
+class IntervalMaskTable():
+    #elementary interval table over [0, maxvalue]: entries are (low, high, mask) and lookup(value) returns the
+    #OR of the masks of every entry covering value, plus anymask
+    def __init__(self, entries, anymask, maxvalue):
+        events = {}
+        for low, high, mask in entries:
+            events.setdefault(low, [0, 0])[0] |= mask
+            if (high < maxvalue):
+                events.setdefault(high + 1, [0, 0])[1] |= mask
+        self.starts = [0]
+        self.masks = [anymask]
+        running = 0
+        for point in sorted(events):
+            added, removed = events[point]
+            #a rule's intervals in one dimension are disjoint, so a bit removed here can only be added back by
+            #an interval of the same rule that starts right after the previous one ends
+            running = (running & ~removed) | added
+            if (point == 0):
+                self.masks[0] = anymask | running
+            else:
+                self.starts.append(point)
+                self.masks.append(anymask | running)
+
+    def lookup(self, value):
+        return self.masks[bisect.bisect_right(self.starts, value) - 1]
+
+class CompiledPolicy():
+    """First match decision structure for one ordered HIPS 8 FW policy, see the module docstring.  rules and
+    orderedruleset are as returned by HIPS_8_FW_XML_Parser_Action.loadpolicy; trusted is an optional list of
+    ipaddress networks the Trusted aggregate stands for.  evaluate() returns the position in orderedruleset of
+    the rule a flow matches first, or None; evaluatebatch() does the same for a list of flows.
+    """
+    valuecachesize = 1 << 18
+
+    def __init__(self, rules, orderedruleset, trusted=None, includedisabled=False):
+        self.rules = rules
+        self.orderedruleset = orderedruleset
+        index = HIPS_8_FW_Rule_Index.RuleIndex(rules, orderedruleset, trusted, includedisabled)
+        spaces = HIPS_8_FW_Rule_Analyzer.effectivespaces(index, trusted)
+        #bit i of every mask stands for leaves[i], the i-th ALLOW or BLOCK rule in policy order
+        self.leaves = sorted(position for position in spaces
+                             if rules[orderedruleset[position]].action.upper() in ("ALLOW", "BLOCK"))
+        self.allmask = (1 << len(self.leaves)) - 1
+        self.directions = self.setmasks(spaces, "directions")
+        self.protocols = self.setmasks(spaces, "protocols")
+        self.families = self.setmasks(spaces, "families")
+        self.messagetypes = self.setmasks(spaces, "messagetypes")
+        self.media = self.setmasks(spaces, "media")
+        self.ports = {side: self.porttable(spaces, side + "ports") for side in ("local", "remote")}
+        self.addresses = {side: self.addresstables(spaces, side + "addresses") for side in ("local", "remote")}
+        self.applications, self.applicationpatterns, self.anyapplication = self.applicationmasks(spaces)
+        #results[n] is the position matched by a mask whose lowest set bit is bit n - 1, results[0] no match
+        self.results = [None] + self.leaves
+        self.fieldmask = self.fieldmasks()
+        self.valuecaches = [{} for column in flowcolumns]
+        #direction, protocol, icmp_type and medium only take a few values, so they are looked up together
+        self.fusedcolumns = (0, 1, 7, 8)
+        self.fusedcache = {}
+        self.badvalues = [set() for column in flowcolumns]
+
+    def setmasks(self, spaces, dimension):
+        #returns (mask of rules accepting any value, dictionary of value to mask of rules accepting it)
+        anymask = 0
+        masks = {}
+        for bit, position in enumerate(self.leaves):
+            values = getattr(spaces[position], dimension)
+            if (values is None):
+                anymask |= 1 << bit
+            else:
+                for value in values:
+                    masks[value] = masks.get(value, 0) | (1 << bit)
+        return anymask, masks
+
+    def porttable(self, spaces, dimension):
+        anymask = 0
+        entries = []
+        for bit, position in enumerate(self.leaves):
+            ranges = getattr(spaces[position], dimension)
+            if (ranges is None):
+                anymask |= 1 << bit
+            else:
+                entries.extend((low, high, 1 << bit) for low, high in ranges)
+        return (IntervalMaskTable(entries, anymask, 65535), anymask)
+
+    def addresstables(self, spaces, dimension):
+        #returns one interval table of integer addresses per IP version and the mask of rules with no address
+        anymask = 0
+        entries = {4: [], 6: []}
+        for bit, position in enumerate(self.leaves):
+            addresses = getattr(spaces[position], dimension)
+            if (addresses is None) or addresses[1]:
+                #any address, or an address only known by name (Trusted, DNS suffix)
+                anymask |= 1 << bit
+                continue
+            for network in addresses[0]:
+                entries[network.version].append((int(network.network_address), int(network.broadcast_address),
+                                                 1 << bit))
+        return ({4: IntervalMaskTable(entries[4], anymask, (1 << 32) - 1),
+                 6: IntervalMaskTable(entries[6], anymask, (1 << 128) - 1)}, anymask)
+
+    def applicationmasks(self, spaces):
+        anymask = 0
+        masks = {}
+        patterns = []
+        for bit, position in enumerate(self.leaves):
+            keys = spaces[position].applications
+            if (keys is None):
+                anymask |= 1 << bit
+                continue
+            #a flow's process has no fingerprint, so only the paths are compared, "" for an application without one
+            for path, fingerprint in keys:
+                if HIPS_8_FW_Rule_Index.iswildcard(path):
+                    patterns.append((path, 1 << bit))
+                else:
+                    masks[path] = masks.get(path, 0) | (1 << bit)
+        return masks, patterns, anymask
+
+    #---per dimension lookups, each returns the mask of rules accepting the flow's value---
+    def setmask(self, table, value):
+        #an empty value is not checked
+        anymask, masks = table
+        if (value == ""):
+            return self.allmask
+        return anymask | masks.get(value, 0)
+
+    def portmask(self, side, value):
+        table, anymask = self.ports[side]
+        if (value == ""):
+            return anymask
+        port = int(value)
+        if not (0 <= port <= 65535):
+            raise ValueError("port out of range: " + value)
+        return table.lookup(port)
+
+    def addressmask(self, side, value):
+        #returns (address mask, network protocol mask) of an address
+        tables, anymask = self.addresses[side]
+        if (value == ""):
+            return anymask, self.allmask
+        address = ipaddress.ip_address(value)
+        return (tables[address.version].lookup(int(address)),
+                self.setmask(self.families, "IPv%d" % address.version))
+
+    def applicationmask(self, value):
+        if (value == ""):
+            return self.anyapplication
+        value = value.lower()
+        mask = self.anyapplication
+        for key in (value, ntpath.basename(value), ""):
+            mask |= self.applications.get(key, 0)
+        for pattern, bit in self.applicationpatterns:
+            if HIPS_8_FW_Rule_Analyzer.pathcontains(pattern, value):
+                mask |= bit
+        return mask
+
+    def protocolmask(self, value):
+        #an empty protocol is not checked
+        if (value == ""):
+            return self.allmask
+        return self.setmask(self.protocols, HIPS_8_FW_Rule_Index.parseprotocol(value))
+
+    def fieldmasks(self):
+        #one function per flowcolumns field giving the mask of rules accepting a value of it
+        def addressmask(side):
+            def lookup(value):
+                addressmask, familymask = self.addressmask(side, value)
+                return addressmask & familymask
+            return lookup
+        return [lambda value: self.setmask(self.directions, value.upper()),
+                self.protocolmask,
+                addressmask("local"),
+                lambda value: self.portmask("local", value),
+                addressmask("remote"),
+                lambda value: self.portmask("remote", value),
+                self.applicationmask,
+                lambda value: self.setmask(self.messagetypes, value),
+                lambda value: self.setmask(self.media, value.upper())]
+
+    def evaluatebatch(self, flows):
+        #flows is a list of tuples in flowcolumns order, returns for each the matched position in orderedruleset,
+        #None if no rule matches or unreadable if a field could not be read
+        #the batch is evaluated one column at a time: field values repeat across flows, so each distinct value is
+        #looked up once per column, and the per flow AND and lowest set bit steps run as map() over whole columns
+        if not flows:
+            return []
+        combined = [self.allmask] * len(flows)
+        badvalues = []
+        columns = list(zip(*flows))
+        for column, values in enumerate(columns):
+            cache = self.valuecaches[column]
+            distinct = set(values)
+            missing = distinct.difference(cache)
+            if (len(cache) + len(missing) > self.valuecachesize):
+                cache.clear()
+                missing = distinct
+            for value in missing:
+                try:
+                    cache[value] = self.fieldmask[column](value.strip())
+                except ValueError:
+                    cache[value] = 0
+                    self.badvalues[column].add(value)
+            if self.badvalues[column] and not self.badvalues[column].isdisjoint(distinct):
+                badvalues.append((column, self.badvalues[column]))
+            if (column in self.fusedcolumns) or all(cache[value] == self.allmask for value in distinct):
+                #a column no rule restricts (e.g. an empty process column) leaves the masks unchanged
+                continue
+            combined = list(map(operator.and_, combined, map(cache.__getitem__, values)))
+        #the few distinct combinations of the fused columns are AND-ed once each, saving a pass over the batch
+        keys = list(zip(*[columns[column] for column in self.fusedcolumns]))
+        cache = self.fusedcache
+        if (len(cache) > self.valuecachesize):
+            cache.clear()
+        for key in set(keys).difference(cache):
+            mask = self.allmask
+            for column, value in zip(self.fusedcolumns, key):
+                mask &= self.valuecaches[column][value]
+            cache[key] = mask
+        combined = list(map(operator.and_, combined, map(cache.__getitem__, keys)))
+        #(mask & -mask).bit_length() is 0 for no match, else one more than the first matching leaf
+        results = list(map(self.results.__getitem__,
+                           map(int.bit_length, map(operator.and_, combined, map(operator.neg, combined)))))
+        for column, bad in badvalues:
+            for index, flow in enumerate(flows):
+                if flow[column] in bad:
+                    results[index] = unreadable
+        return results
+
+    def evaluate(self, flow):
+        #flow is a tuple in flowcolumns order, returns the matched position in orderedruleset or None
+        result = self.evaluatebatch([flow])[0]
+        if (result is unreadable):
+            raise ValueError("unreadable flow %r" % (flow,))
+        return result
+
+def readflows(reader, header, batchsize):
+    #yields batches of (rows, flow tuples in flowcolumns order) read from a csv reader, header is the flow CSV's
+    #header row
+    header = [column.strip().lower() for column in header]
+    #the columns present are read with one itemgetter (after an unused first field, so its result is always a
+    #tuple), empty fields are added for the missing ones, and a second itemgetter puts them in flowcolumns order
+    present = [column for column in flowcolumns if column in header]
+    indexes = [header.index(column) for column in present]
+    getter = operator.itemgetter(0, *indexes)
+    order = present + [column for column in flowcolumns if column not in header]
+    reorder = operator.itemgetter(*[order.index(column) + 1 for column in flowcolumns])
+    missing = ("",) * (len(flowcolumns) - len(present))
+    width = max(len(header), 1)
+    while True:
+        rows = list(itertools.islice(reader, batchsize))
+        if not rows:
+            return
+        if (min(map(len, rows)) < width):
+            #short rows are padded to the header so their results line up
+            rows = [row + [""] * (width - len(row)) if (len(row) < width) else row for row in rows]
+        yield rows, list(map(reorder, map(operator.add, map(getter, rows), itertools.repeat(missing))))
+
+class SimulationSummary():
+    #class to count the flows matched by each rule
+    def __init__(self):
+        self.flows = 0
+        self.errors = 0
+        self.matches = collections.Counter()
+
+    def add(self, positions):
+        #positions are evaluatebatch() results
+        self.matches.update(positions)
+        errors = self.matches.pop(unreadable, 0)
+        self.flows += len(positions) - errors
+        self.errors += errors
+
+    def writereport(self, policy, out=None):
+        out = out or sys.stdout
+        for position in sorted(self.matches, key=lambda position: (position is None, position or 0)):
+            if (position is None):
+                print ("%10d  %s" % (self.matches[position], nomatch), file=out)
+            else:
+                rule = policy.rules[policy.orderedruleset[position]]
+                print ("%10d  %5d %-6s %s" % (self.matches[position], position + 1, rule.action, rule.name), file=out)
+        print ("%d flows, %d rules matched, %d unreadable" % (self.flows, len(self.matches) - (None in self.matches),
+                                                             self.errors), file=out)
+
+def simulatefile(policy, flowfilename, resultfilename=None, batchsize=65536):
+    #evaluates every flow in the flow CSV, writing each input row with the matched rule appended to the result
+    #CSV if one is given, and returns a SimulationSummary
+    summary = SimulationSummary()
+    resultfile = None
+    #the result columns appended to a row, by evaluatebatch() result
+    suffixes = {None: ["", "", "", nomatch], unreadable: ["", "", "", unreadable]}
+    for position in policy.leaves:
+        rule = policy.rules[policy.orderedruleset[position]]
+        suffixes[position] = [position + 1, rule.GUID, rule.name, rule.action]
+    with open(flowfilename, newline='') as flowfile:
+        reader = csv.reader(flowfile)
+        header = next(reader, [])
+        if resultfilename:
+            resultfile = open(resultfilename, 'w', newline='', buffering=HIPS_8_FW_XML_Parser_Action.OutputSpec.buffersize)
+            writer = csv.writer(resultfile)
+            writer.writerow(header + resultcolumns)
+        try:
+            for rows, flows in readflows(reader, header, batchsize):
+                positions = policy.evaluatebatch(flows)
+                summary.add(positions)
+                if resultfile:
+                    writer.writerows(map(operator.add, rows, map(suffixes.__getitem__, positions)))
+        finally:
+            if resultfile:
+                resultfile.close()
+    return summary
+
+def main(argv):
+    argparser = argparse.ArgumentParser(description="Evaluate a CSV of connections against a HIPS 8 FW policy.")
+    argparser.add_argument('xml')
+    argparser.add_argument('flows', help="CSV of flows, see the module docstring for its columns")
+    argparser.add_argument('-o', '--output', metavar='FILE', help="write every flow with its matched rule")
+    argparser.add_argument('--trusted', action='append', default=[], type=HIPS_8_FW_Rule_Index.parsenetwork,
+                           metavar='NETWORK',
+                           help="network the Trusted aggregate stands for (may be repeated)")
+    argparser.add_argument('--include-disabled', action='store_true')
+    argparser.add_argument('--cache-dir', metavar='DIR', help="HBSS_Parse_Cache directory")
+    args = argparser.parse_args(argv[1:])
+    cache = None
+    if args.cache_dir:
+        cache = HBSS_Parse_Cache.ParseCache(args.cache_dir)
+    rules, orderedruleset = HIPS_8_FW_XML_Parser_Action.loadpolicy(args.xml, cache)
+    policy = CompiledPolicy(rules, orderedruleset, args.trusted, args.include_disabled)
+    summary = simulatefile(policy, args.flows, args.output)
+    summary.writereport(policy)
+
+if __name__=="__main__":
+    main(sys.argv)
@@ -0,0 +1,443 @@
+"""
+HIPS 8 FW Rule Analyzer
+
+Reports the rules of an ordered HIPS 8 FW policy that can never match or that disagree with an earlier rule.
+Rules are evaluated first match in policy order, so for every ALLOW or BLOCK rule the earlier rules whose
+match space overlaps its own are examined:
+
+    shadowed     an earlier rule with a different action matches everything this rule matches, so it never
+                 takes effect
+    redundant    an earlier rule with the same action matches everything this rule matches, so it can be
+                 removed without changing the policy
+    conflict     an earlier rule with a different action matches part, but not all, of what this rule matches
+    unmatchable  the rule's own conditions, intersected with those of its groups, match nothing, so no earlier
+                 rule is named
+
+A rule's match space is the product of its direction, transport protocol, network protocol, local and remote
+ports, local and remote addresses, applications, ICMP message types and physical media, intersected with the conditions of every group that
+encloses it.  Candidate earlier rules are taken from the most selective dimension of a HIPS_8_FW_Rule_Index
+(interval tree for ports, prefix trie for addresses), so each rule is only compared exactly against the few
+rules it can overlap and typical policies are analyzed in near-linear time instead of comparing every pair.
+
+Applications are (path, fingerprint) pairs and both parts must match; a missing path or fingerprint matches any.
+An application given by bare file name (or file name pattern) contains that file in every directory and a path
+pattern contains the paths it matches, but the same file name in two different directories is two different
+applications, as is the same path with two different fingerprints.
+
+Trusted and DNS suffix addresses cannot be resolved from the export; unless trusted networks are given they
+are compared by name, so they may overlap anything but are only contained in the same name or in any address.
+
+usage: python3 HIPS_8_FW_Rule_Analyzer.py <HIPS 8 FW XML> [--csv report.csv] [--trusted NETWORK ...]
+"""
+import argparse, bisect, csv, fnmatch, ipaddress, ntpath, sys
+import HBSS_Parse_Cache, HIPS_8_FW_XML_Parser_Action, HIPS_8_FW_Rule_Index
+
+#---port interval lists, kept sorted with overlapping and adjacent intervals merged---
+def mergeintervals(ranges):
+    merged = []
+    for low, high in sorted(ranges):
+        if merged and (low <= merged[-1][1] + 1):
+            if (high > merged[-1][1]):
+                merged[-1] = (merged[-1][0], high)
+        else:
+            merged.append((low, high))
+    return tuple(merged)
+
+def intervalsoverlap(first, second):
+    i = j = 0
+    while (i < len(first)) and (j < len(second)):
+        if (first[i][1] < second[j][0]):
+            i += 1
+        elif (second[j][1] < first[i][0]):
+            j += 1
+        else:
+            return True
+    return False
+
+def intervalscontain(outer, inner):
+    #every interval of inner lies inside one interval of the merged list outer
+    starts = [low for low, high in outer]
+    for low, high in inner:
+        i = bisect.bisect_right(starts, low) - 1
+        if (i < 0) or (outer[i][1] < high):
+            return False
+    return True
+
+def intersectintervals(first, second):
+    result = []
+    i = j = 0
+    while (i < len(first)) and (j < len(second)):
+        low = max(first[i][0], second[j][0])
+        high = min(first[i][1], second[j][1])
+        if (low <= high):
+            result.append((low, high))
+        if (first[i][1] < second[j][1]):
+            i += 1
+        else:
+            j += 1
+    return tuple(result)
+
+#---address sets: (collapsed ipaddress networks, names of addresses that cannot be resolved)---
+def collapsenetworks(networks):
+    collapsed = []
+    for version in (4, 6):
+        collapsed.extend(ipaddress.collapse_addresses(network for network in networks if network.version == version))
+    return tuple(collapsed)
+
+def addressesoverlap(first, second):
+    if first[1] or second[1]:
+        return True
+    return any(a.version == b.version and a.overlaps(b) for a in first[0] for b in second[0])
+
+def addressescontain(outer, inner):
+    if not inner[1] <= outer[1]:
+        return False
+    return all(any(a.version == b.version and b.subnet_of(a) for a in outer[0]) for b in inner[0])
+
+def intersectaddresses(first, second):
+    networks = []
+    for a in first[0]:
+        for b in second[0]:
+            if (a.version == b.version):
+                if a.subnet_of(b):
+                    networks.append(a)
+                elif b.subnet_of(a):
+                    networks.append(b)
+    #an unresolved address intersected with anything is still only known by its name
+    return (collapsenetworks(networks), first[1] | second[1])
+
+#---application sets: (path, fingerprint) pairs of lower case paths or bare file names, possibly with wildcards,
+#and fingerprints, "" standing for any path or fingerprint---
+def pathcontains(outer, inner):
+    #a bare file name contains that file in any directory, a path only itself or, as a pattern, the paths it matches
+    if (outer == inner) or (outer == ""):
+        return True
+    if (inner == ""):
+        return False
+    if ("\\" not in outer):
+        return fnmatch.fnmatchcase(ntpath.basename(inner), outer)
+    return HIPS_8_FW_Rule_Index.iswildcard(outer) and fnmatch.fnmatchcase(inner, outer)
+
+def pathoverlaps(first, second):
+    #two path patterns neither containing the other overlap if their file names can match
+    if pathcontains(first, second) or pathcontains(second, first):
+        return True
+    if HIPS_8_FW_Rule_Index.iswildcard(first) and HIPS_8_FW_Rule_Index.iswildcard(second):
+        firstname, secondname = ntpath.basename(first), ntpath.basename(second)
+        return pathcontains(firstname, secondname) or pathcontains(secondname, firstname)
+    return False
+
+def appcontains(outer, inner):
+    return pathcontains(outer[0], inner[0]) and (outer[1] in ("", inner[1]))
+
+def appoverlaps(first, second):
+    return ((first[1] == "") or (second[1] == "") or (first[1] == second[1])) and pathoverlaps(first[0], second[0])
+
+def applicationsoverlap(first, second):
+    return any(appoverlaps(a, b) for a in first for b in second)
+
+def applicationscontain(outer, inner):
+    return all(any(appcontains(a, b) for a in outer) for b in inner)
+
+def intersectapplications(first, second):
+    #every overlapping pair gives the narrower path with the fingerprint of either, or both paths of two patterns
+    #that only overlap, as neither can express the intersection
+    result = set()
+    for a in first:
+        for b in second:
+            if not appoverlaps(a, b):
+                continue
+            fingerprint = a[1] or b[1]
+            if pathcontains(b[0], a[0]):
+                result.add((a[0], fingerprint))
+            elif pathcontains(a[0], b[0]):
+                result.add((b[0], fingerprint))
+            else:
+                result.update(((a[0], fingerprint), (b[0], fingerprint)))
+    return frozenset(result)
+
+def setsoverlap(first, second):
+    return not first.isdisjoint(second)
+
+def setscontain(outer, inner):
+    return inner <= outer
+
+def intersectsets(first, second):
+    return first & second
+
+def isemptyset(value):
+    return not value
+
+def addressesempty(value):
+    return not (value[0] or value[1])
+
+#dimension name: (overlap, contain, intersect, isempty), a value of None means any
+dimensions = {'directions': (setsoverlap, setscontain, intersectsets, isemptyset),
+              'protocols': (setsoverlap, setscontain, intersectsets, isemptyset),
+              'families': (setsoverlap, setscontain, intersectsets, isemptyset),
+              'localports': (intervalsoverlap, intervalscontain, intersectintervals, isemptyset),
+              'remoteports': (intervalsoverlap, intervalscontain, intersectintervals, isemptyset),
+              'localaddresses': (addressesoverlap, addressescontain, intersectaddresses, addressesempty),
+              'remoteaddresses': (addressesoverlap, addressescontain, intersectaddresses, addressesempty),
+              'applications': (applicationsoverlap, applicationscontain, intersectapplications, isemptyset),
+              'messagetypes': (setsoverlap, setscontain, intersectsets, isemptyset),
+              'media': (setsoverlap, setscontain, intersectsets, isemptyset)}
+
+class MatchSpace():
+    #the traffic a rule can match, one value per dimension of the dimensions table, None meaning any value
+    __slots__ = tuple(dimensions)
+
+    def __init__(self, **values):
+        for dimension in dimensions:
+            setattr(self, dimension, values.get(dimension))
+
+    @classmethod
+    def fromrule(cls, rule, trusted=None, networkcache=None):
+        #returns the match space of the rule's own conditions
+        space = cls()
+        if rule.direction.upper() not in ("", "EITHER"):
+            space.directions = frozenset([rule.direction.upper()])
+        if rule.transportprotocol.upper() not in HIPS_8_FW_Rule_Index.anyprotocols:
+            space.protocols = frozenset([rule.transportprotocol.upper()])
+        if (rule.networkprotocol != ""):
+            space.families = frozenset(rule.networkprotocol.split("/"))
+        for dimension, ports in (('localports', rule.localport), ('remoteports', rule.remoteport)):
+            ranges = mergeintervals(HIPS_8_FW_XML_Parser_Action.portranges(ports))
+            if ranges and (ranges != (HIPS_8_FW_Rule_Index.anyport,)):
+                setattr(space, dimension, ranges)
+        for dimension, aggregates in (('localaddresses', rule.localaggregates),
+                                      ('remoteaddresses', rule.remoteaggregates)):
+            networks, names = [], set()
+            for agg in aggregates:
+                if (networkcache is not None) and (agg.address in networkcache):
+                    aggnetworks = networkcache[agg.address]
+                else:
+                    aggnetworks = HIPS_8_FW_Rule_Index.parsenetworks(agg.address, trusted)
+                    if (networkcache is not None):
+                        networkcache[agg.address] = aggnetworks
+                if (aggnetworks is not None):
+                    networks.extend(aggnetworks)
+                elif agg.address in ("", "Any"):
+                    networks, names = None, None
+                    break
+                else:
+                    names.add(agg.address or agg.name)
+            if networks is None or not (networks or names):
+                continue
+            setattr(space, dimension, (collapsenetworks(networks), frozenset(names)))
+            if not names:
+                #addresses of only one family restrict the network protocols the rule can match
+                versions = frozenset("IPv%d" % network.version for network in networks)
+                space.families = versions if space.families is None else space.families & versions
+        for dimension, values in (('messagetypes', rule.messagetype), ('media', rule.physicalmedium)):
+            values = frozenset(value.upper() for value in values if value)
+            if values:
+                setattr(space, dimension, values)
+        keys = HIPS_8_FW_Rule_Index.ruleapplicationkeys(rule)
+        if keys:
+            space.applications = frozenset(keys)
+        return space
+
+    def intersect(self, other):
+        result = MatchSpace()
+        for dimension, (overlap, contain, intersect, empty) in dimensions.items():
+            mine, theirs = getattr(self, dimension), getattr(other, dimension)
+            if (mine is None):
+                setattr(result, dimension, theirs)
+            elif (theirs is None):
+                setattr(result, dimension, mine)
+            else:
+                setattr(result, dimension, intersect(mine, theirs))
+        return result
+
+    def isempty(self):
+        for dimension, (overlap, contain, intersect, empty) in dimensions.items():
+            value = getattr(self, dimension)
+            if (value is not None) and empty(value):
+                return True
+        return False
+
+    def overlaps(self, other):
+        for dimension, (overlap, contain, intersect, empty) in dimensions.items():
+            mine, theirs = getattr(self, dimension), getattr(other, dimension)
+            if (mine is not None) and (theirs is not None) and not overlap(mine, theirs):
+                return False
+        return True
+
+    def contains(self, other):
+        for dimension, (overlap, contain, intersect, empty) in dimensions.items():
+            mine, theirs = getattr(self, dimension), getattr(other, dimension)
+            if (mine is None):
+                continue
+            if (theirs is None) or not contain(mine, theirs):
+                return False
+        return True
+
+class Finding():
+    #class to contain one analyzer result: the rule at position is shadowed by, redundant to or in conflict
+    #with the earlier rule at otherposition, or is unmatchable and otherposition is None
+    def __init__(self, kind, rules, orderedruleset, position, otherposition=None):
+        self.kind = kind
+        self.position = position
+        self.otherposition = otherposition
+        self.GUID = orderedruleset[position]
+        self.name = rules[self.GUID].name
+        self.action = rules[self.GUID].action
+        self.otherGUID = self.othername = self.otheraction = None
+        if (otherposition is not None):
+            self.otherGUID = orderedruleset[otherposition]
+            self.othername = rules[self.otherGUID].name
+            self.otheraction = rules[self.otherGUID].action
+
+    def othercolumns(self):
+        #returns the earlier position (counted from 1), GUID, name and action, all "" for an unmatchable rule
+        if (self.otherposition is None):
+            return ["", "", "", ""]
+        return [self.otherposition + 1, self.otherGUID, self.othername, self.otheraction]
+
+class PolicyAnalysis():
+    #class to contain the findings for one policy
+    def __init__(self):
+        self.shadowed = []
+        self.redundant = []
+        self.conflicts = []
+        self.unmatchable = []
+        self.analyzed = 0
+
+    def findings(self):
+        return sorted(self.shadowed + self.redundant + self.conflicts + self.unmatchable,
+                      key=lambda f: (f.position, -1 if (f.otherposition is None) else f.otherposition))
+
+    def summary(self):
+        return "%d rules analyzed: %d shadowed, %d redundant, %d conflicts, %d unmatchable" % (
+            self.analyzed, len(self.shadowed), len(self.redundant), len(self.conflicts), len(self.unmatchable))
+
+    def writereport(self, out=None):
+        out = out or sys.stdout
+        for finding in self.findings():
+            line = "%-11s %5d %-6s %s" % (finding.kind.upper(), finding.position + 1, finding.action, finding.name)
+            if (finding.otherposition is not None):
+                line += "  <- %5d %-6s %s" % (finding.otherposition + 1, finding.otheraction, finding.othername)
+            print (line, file=out)
+        print (self.summary(), file=out)
+
+    def writecsv(self, filename):
+        with open(filename, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Finding", "Position", "GUID", "Name", "Action", "Earlier Position", "Earlier GUID",
+                             "Earlier Name", "Earlier Action"])
+            for finding in self.findings():
+                writer.writerow([finding.kind, finding.position + 1, finding.GUID, finding.name, finding.action] +
+                                finding.othercolumns())
+
+def effectivespaces(index, trusted=None):
+    #returns the match space of every indexed position, each intersected with the space of its enclosing group
+    spaces = {}
+    networkcache = {}
+    for position in sorted(index.positions):
+        space = MatchSpace.fromrule(index.rules[index.orderedruleset[position]], trusted, networkcache)
+        parent = index.parents[position]
+        if (parent is not None):
+            if parent not in spaces:
+                #the enclosing group is disabled, so this rule never matches
+                continue
+            space = space.intersect(spaces[parent])
+        spaces[position] = space
+    return spaces
+
+def candidatepositions(index, space):
+    #returns the indexed positions whose own conditions may overlap space, taken from the dimension of the
+    #index that gives the fewest candidates, or None if space is unrestricted in every indexed dimension
+    choices = []
+    if (space.directions is not None):
+        choices.append([index.anydirection] + [index.directions.get(value, set()) for value in space.directions])
+    if (space.protocols is not None):
+        choices.append([index.anyprotocol] + [index.protocols.get(value, set()) for value in space.protocols])
+    if (space.families is not None):
+        choices.append([index.anyfamily] + [index.families.get(value, set()) for value in space.families])
+    for side in ("local", "remote"):
+        ranges = getattr(space, side + "ports")
+        if (ranges is not None):
+            hits = set()
+            for low, high in ranges:
+                hits.update(index.ports[side].overlap(low, high))
+            choices.append([index.anyport[side], hits])
+        addresses = getattr(space, side + "addresses")
+        if (addresses is not None) and not addresses[1]:
+            hits = set()
+            for network in addresses[0]:
+                hits.update(index.addresses[side].overlap(network))
+            choices.append([index.anyaddress[side], hits])
+    if (space.applications is not None) and all(path and not HIPS_8_FW_Rule_Index.iswildcard(path)
+                                                for path, fingerprint in space.applications):
+        #the same path, the bare file name of a path, the paths with a bare file name as file name, and the
+        #applications without a path, whatever their fingerprints
+        sets = [index.anyapplication, index.anypathapplication,
+                set(position for pattern, position in index.applicationpatterns)]
+        for path, fingerprint in space.applications:
+            sets += [index.applications.get(path, set()), index.applications.get(ntpath.basename(path), set()),
+                     index.applicationnames.get(path, set())]
+        choices.append(sets)
+    if not choices:
+        return None
+    return set().union(*min(choices, key=lambda sets: sum(len(positions) for positions in sets)))
+
+def analyzepolicy(rules, orderedruleset, trusted=None, includedisabled=False, index=None):
+    #analyzes the ALLOW and BLOCK rules of an ordered rule set, see the module docstring
+    if (index is None):
+        index = HIPS_8_FW_Rule_Index.RuleIndex(rules, orderedruleset, trusted, includedisabled)
+    spaces = effectivespaces(index, trusted)
+    leaves = sorted(position for position in spaces
+                    if rules[orderedruleset[position]].action.upper() in ("ALLOW", "BLOCK"))
+    leafset = set(leaves)
+    analysis = PolicyAnalysis()
+    for position in leaves:
+        analysis.analyzed += 1
+        space = spaces[position]
+        action = rules[orderedruleset[position]].action.upper()
+        if space.isempty():
+            analysis.unmatchable.append(Finding("unmatchable", rules, orderedruleset, position))
+            continue
+        candidates = candidatepositions(index, space)
+        if (candidates is None):
+            earlier = leaves[:bisect.bisect_left(leaves, position)]
+        else:
+            earlier = sorted(candidate for candidate in candidates if candidate < position and candidate in leafset)
+        conflicts = []
+        for other in earlier:
+            otherspace = spaces[other]
+            if not otherspace.overlaps(space):
+                continue
+            sameaction = (rules[orderedruleset[other]].action.upper() == action)
+            if otherspace.contains(space):
+                #the first earlier rule covering this one takes all of its traffic
+                kind = "redundant" if sameaction else "shadowed"
+                getattr(analysis, kind).append(Finding(kind, rules, orderedruleset, position, other))
+                conflicts = []
+                break
+            if not sameaction:
+                conflicts.append(Finding("conflict", rules, orderedruleset, position, other))
+        analysis.conflicts.extend(conflicts)
+    return analysis
+
+def main(argv):
+    argparser = argparse.ArgumentParser(description="Report shadowed, redundant and conflicting HIPS 8 FW rules.")
+    argparser.add_argument('xml')
+    argparser.add_argument('--csv', metavar='FILE', help="also write the findings to a CSV file")
+    argparser.add_argument('--trusted', action='append', default=[], type=HIPS_8_FW_Rule_Index.parsenetwork,
+                           metavar='NETWORK',
+                           help="network the Trusted aggregate stands for (may be repeated)")
+    argparser.add_argument('--include-disabled', action='store_true')
+    argparser.add_argument('--cache-dir', metavar='DIR', help="HBSS_Parse_Cache directory")
+    args = argparser.parse_args(argv[1:])
+    cache = None
+    if args.cache_dir:
+        cache = HBSS_Parse_Cache.ParseCache(args.cache_dir)
+    rules, orderedruleset = HIPS_8_FW_XML_Parser_Action.loadpolicy(args.xml, cache)
+    analysis = analyzepolicy(rules, orderedruleset, args.trusted, args.include_disabled)
+    analysis.writereport()
+    if args.csv:
+        analysis.writecsv(args.csv)
+
+if __name__=="__main__":
+    main(sys.argv)
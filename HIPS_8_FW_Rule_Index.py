@@ -0,0 +1,397 @@
+"""
+HIPS 8 FW Rule Index
+
+In-memory index over the ordered rules of a HIPS 8 FW policy for questions such as "which rules allow inbound
+TCP 445 from 10.0.0.0/8".  The index is built once from the resolved rules (after processaggs) and answers
+queries on direction, transport protocol, local/remote port, local/remote address, application and action
+without scanning every rule:
+
+    ports        integer (low, high) intervals in a centered interval tree
+    addresses    ipaddress networks in a binary prefix trie per address family
+    applications dictionaries of lower case path, file name and fingerprint of (path, fingerprint) pairs
+    others       dictionaries of value to rule positions
+
+A rule matches a query when every given condition overlaps the rule's own conditions and those of every group
+that encloses it.  Rules with no value for a dimension (no ports, no addresses, no applications, direction
+EITHER, transport protocol All) match any query value for it, except that a transport protocol or port query
+only matches rules that carry IP traffic: rules limited to another network protocol (802.1X EAPOL, 0x888e) are
+left out.  An application is the pair of its path and fingerprint, either of which may be missing and then
+stands for any.  A full path query matches the applications for that path, for a wildcard pattern that matches it,
+for its bare file name or without a path; a bare file name matches that file in any directory, and a fingerprint
+(32 hexadecimal digits) matches the applications with that fingerprint.  Addresses that cannot be resolved
+statically (Trusted, DNS suffixes) are treated as any address unless a list of trusted networks is given.
+Disabled rules, and the members of disabled groups, are left out unless includedisabled is set.
+
+usage: python3 HIPS_8_FW_Rule_Index.py query <HIPS 8 FW XML> [--direction IN] [--protocol TCP] [--local-port 445]
+                                             [--remote-address 10.0.0.0/8] [--application svchost.exe] ...
+"""
+import argparse, fnmatch, ipaddress, ntpath, string, sys
+import HBSS_Parse_Cache, HIPS_8_FW_XML_Parser_Action
+
+anyport = (0, 65535)
+anyprotocols = ("", "ALL", "ALL IP")
+#network protocols with transport protocols and ports
+ipfamilies = ("IPv4", "IPv6")
+
+class IntervalTree():
+    #static centered interval tree over (low, high, value) entries, overlap() returns the values of every
+    #interval that overlaps [low, high] in O(log n + k)
+    def __init__(self, entries):
+        self.root = self.build(list(entries))
+
+    def build(self, entries):
+        #each node holds the intervals containing its center point, sorted by low ascending and by high descending,
+        #intervals entirely left or right of the center go to the children
+        if not entries:
+            return None
+        endpoints = sorted([entry[0] for entry in entries] + [entry[1] for entry in entries])
+        center = endpoints[len(endpoints) // 2]
+        left, here, right = [], [], []
+        for entry in entries:
+            if (entry[1] < center):
+                left.append(entry)
+            elif (entry[0] > center):
+                right.append(entry)
+            else:
+                here.append(entry)
+        bylow = sorted(((entry[0], entry[2]) for entry in here), key=lambda item: item[0])
+        byhigh = sorted(((entry[1], entry[2]) for entry in here), key=lambda item: -item[0])
+        return (center, bylow, byhigh, self.build(left), self.build(right))
+
+    def overlap(self, low, high):
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if (node is None):
+                continue
+            center, bylow, byhigh, left, right = node
+            if (high < center):
+                for start, value in bylow:
+                    if (start > high):
+                        break
+                    found.append(value)
+                stack.append(left)
+            elif (low > center):
+                for end, value in byhigh:
+                    if (end < low):
+                        break
+                    found.append(value)
+                stack.append(right)
+            else:
+                found.extend(value for start, value in bylow)
+                stack.append(left)
+                stack.append(right)
+        return found
+
+class PrefixTrie():
+    #binary trie of IPv4 and IPv6 networks, overlap() returns the values of every stored network that contains
+    #or is contained in the queried network
+    def __init__(self):
+        #node: [zero child, one child, values stored at this prefix]
+        self.roots = {4: [None, None, []], 6: [None, None, []]}
+
+    def insert(self, network, value):
+        node = self.roots[network.version]
+        address = int(network.network_address)
+        width = network.max_prefixlen
+        for bit in range(network.prefixlen):
+            branch = (address >> (width - 1 - bit)) & 1
+            if (node[branch] is None):
+                node[branch] = [None, None, []]
+            node = node[branch]
+        node[2].append(value)
+
+    def overlap(self, network):
+        found = []
+        node = self.roots[network.version]
+        address = int(network.network_address)
+        width = network.max_prefixlen
+        #stored networks that contain the query lie on the path to its prefix
+        for bit in range(network.prefixlen):
+            found.extend(node[2])
+            node = node[(address >> (width - 1 - bit)) & 1]
+            if (node is None):
+                return found
+        #stored networks inside the query are the whole subtree below it
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            found.extend(node[2])
+            stack.extend(child for child in node[:2] if child is not None)
+        return found
+
+def parsenetworks(address, trusted=None):
+    #returns the ipaddress networks of a resolved aggregate address, or None if it stands for any address
+    #"first - last" ranges are summarized into networks, unparseable values (DNS suffixes) are treated as any
+    if address in ("", "Any"):
+        return None
+    if (address == "Trusted"):
+        return list(trusted) if trusted else None
+    try:
+        if (" - " in address):
+            first, last = address.split(" - ")
+            return list(ipaddress.summarize_address_range(ipaddress.ip_address(first.strip()),
+                                                          ipaddress.ip_address(last.strip())))
+        return [ipaddress.ip_network(address, strict=False)]
+    except ValueError:
+        return None
+
+def parseport(value):
+    #returns the (low, high) interval of a port query, given as an int, a (low, high) pair or a "low-high" string,
+    #raises argparse.ArgumentTypeError for anything else, so it also serves as the type of the port arguments
+    if isinstance(value, int):
+        ranges = [(value, value)]
+    elif isinstance(value, tuple):
+        ranges = [value]
+    else:
+        ranges = HIPS_8_FW_XML_Parser_Action.portranges([str(value)])
+    if (len(ranges) != 1) or not (anyport[0] <= ranges[0][0] <= ranges[0][1] <= anyport[1]):
+        raise argparse.ArgumentTypeError("invalid port: " + str(value))
+    return ranges[0]
+
+def parsenetwork(value):
+    #returns the ipaddress network of an address or CIDR network, raises argparse.ArgumentTypeError for anything
+    #else, so it also serves as the type of the address arguments
+    try:
+        return ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid address or network: " + str(value))
+
+def parseprotocol(value):
+    #returns the transport protocol name used in FWRule.transportprotocol for a name or an IP protocol number
+    #numbers are named as the parser names them, so 6 is TCP and 132 is Transport Protocol 132
+    value = str(value).strip()
+    if value.isdigit():
+        value = HIPS_8_FW_XML_Parser_Action.transportprotocolname(str(int(value)))
+    return value.upper()
+
+def iswildcard(key):
+    return ("*" in key) or ("?" in key)
+
+def isfingerprint(value):
+    return (len(value) == 32) and all(character in string.hexdigits for character in value)
+
+def ruleapplicationkeys(rule):
+    #returns the lower case (path, fingerprint) pair of every application of the rule, the name of an application
+    #without a path standing in for it, and "" for a missing path or fingerprint
+    keys = set()
+    for app in rule.applications:
+        fingerprint = app.apphash if (app.apphash != "None") else ""
+        keys.add(((app.apppath or app.appname).lower(), fingerprint.lower()))
+    return keys
+
+class RuleIndex():
+    """Index over the rules of one ordered HIPS 8 FW policy, see the module docstring.  rules and orderedruleset
+    are as returned by HIPS_8_FW_XML_Parser_Action.loadpolicy (or FW8PolicyParser.resolve()); trusted is an
+    optional list of ipaddress networks the Trusted aggregate stands for.
+
+    Rules are indexed by position in orderedruleset, so a group that is referenced more than once is indexed
+    under each of its positions with its own enclosing groups.  query() returns rule GUIDs in policy order.
+    """
+    def __init__(self, rules, orderedruleset, trusted=None, includedisabled=False):
+        self.rules = rules
+        self.orderedruleset = orderedruleset
+        self.parents = HIPS_8_FW_XML_Parser_Action.groupparents(rules, orderedruleset)
+        self.positions = set()
+        self.actions = {}
+        self.directions = {}
+        self.protocols = {}
+        self.families = {}
+        #per dimension: rule positions that match any value, and the structure holding the others
+        self.anydirection = set()
+        self.anyprotocol = set()
+        self.anyfamily = set()
+        self.anyapplication = set()
+        self.anyport = {"local": set(), "remote": set()}
+        self.anyaddress = {"local": set(), "remote": set()}
+        self.applications = {}
+        self.applicationnames = {}
+        self.applicationpatterns = []
+        self.applicationfingerprints = {}
+        self.anypathapplication = set()
+        portentries = {"local": [], "remote": []}
+        #aggregate records and port lists are shared by many rules, so each distinct value is parsed once
+        networkcache = {}
+        portcache = {}
+        self.addresses = {"local": PrefixTrie(), "remote": PrefixTrie()}
+        for position, ID in enumerate(orderedruleset):
+            rule = rules[ID]
+            if (rule.ruleenabled == "Disabled") and not includedisabled:
+                continue
+            self.positions.add(position)
+            self.actions.setdefault(rule.action.upper(), set()).add(position)
+            if rule.direction.upper() in ("", "EITHER"):
+                self.anydirection.add(position)
+            else:
+                self.directions.setdefault(rule.direction.upper(), set()).add(position)
+            if rule.transportprotocol.upper() in anyprotocols:
+                self.anyprotocol.add(position)
+            else:
+                self.protocols.setdefault(rule.transportprotocol.upper(), set()).add(position)
+            if (rule.networkprotocol == ""):
+                self.anyfamily.add(position)
+            else:
+                for family in rule.networkprotocol.split("/"):
+                    self.families.setdefault(family, set()).add(position)
+            for side, ports in (("local", rule.localport), ("remote", rule.remoteport)):
+                ranges = portcache.get(tuple(ports))
+                if (ranges is None):
+                    ranges = portcache[tuple(ports)] = HIPS_8_FW_XML_Parser_Action.portranges(ports)
+                if (not ranges) or (anyport in ranges):
+                    self.anyport[side].add(position)
+                for low, high in ranges:
+                    portentries[side].append((low, high, position))
+            for side, aggregates in (("local", rule.localaggregates), ("remote", rule.remoteaggregates)):
+                networks = []
+                for agg in aggregates:
+                    if agg.address in networkcache:
+                        aggnetworks = networkcache[agg.address]
+                    else:
+                        aggnetworks = networkcache[agg.address] = parsenetworks(agg.address, trusted)
+                    if (aggnetworks is None):
+                        networks = None
+                        break
+                    networks.extend(aggnetworks)
+                if not networks:
+                    self.anyaddress[side].add(position)
+                else:
+                    for network in networks:
+                        self.addresses[side].insert(network, position)
+            keys = ruleapplicationkeys(rule)
+            if not keys:
+                self.anyapplication.add(position)
+            for path, fingerprint in keys:
+                if fingerprint:
+                    self.applicationfingerprints.setdefault(fingerprint, set()).add(position)
+                if not path:
+                    self.anypathapplication.add(position)
+                elif iswildcard(path):
+                    self.applicationpatterns.append((path, position))
+                else:
+                    self.applications.setdefault(path, set()).add(position)
+                    if ("\\" in path):
+                        self.applicationnames.setdefault(ntpath.basename(path), set()).add(position)
+        self.ports = {side: IntervalTree(entries) for side, entries in portentries.items()}
+
+    #each match* method returns the alternative position sets of one condition: a rule satisfies the condition
+    #if its position is in any of them, so the large "matches anything" sets are never copied
+    def matchport(self, side, value):
+        low, high = parseport(value)
+        return [(self.anyport[side], set(self.ports[side].overlap(low, high)))]
+
+    def matchipfamily(self):
+        #rules without a network protocol or limited to IPv4 or IPv6
+        return [(self.anyfamily,) + tuple(self.families.get(family, set()) for family in ipfamilies)]
+
+    def matchaddress(self, side, value):
+        network = ipaddress.ip_network(value, strict=False)
+        family = "IPv%d" % network.version
+        return [(self.anyaddress[side], set(self.addresses[side].overlap(network))),
+                (self.anyfamily, self.families.get(family, set()))]
+
+    def matchapplication(self, value):
+        #a bare file name matches that file in any directory, a path matches rules for the same path, for a
+        #pattern that matches it or for its bare file name, never those for the same file elsewhere
+        value = value.lower()
+        if isfingerprint(value):
+            return [(self.anyapplication, self.applicationfingerprints.get(value, set()))]
+        name = ntpath.basename(value)
+        matched = self.applications.get(value, set()) | self.anypathapplication
+        if (name == value):
+            matched |= self.applicationnames.get(name, set())
+        else:
+            matched |= self.applications.get(name, set())
+        for pattern, position in self.applicationpatterns:
+            if fnmatch.fnmatchcase(value, pattern) or ((name == value) and
+                                                       fnmatch.fnmatchcase(name, ntpath.basename(pattern))):
+                matched.add(position)
+        return [(self.anyapplication, matched)]
+
+    def match(self, direction=None, protocol=None, localport=None, remoteport=None, localaddress=None,
+              remoteaddress=None, application=None, action=None):
+        #returns the sorted positions in orderedruleset of the rules matching every given condition
+        conditions = []
+        if (direction is not None) and (direction.upper() != "EITHER"):
+            conditions.append((self.anydirection, self.directions.get(direction.upper(), set())))
+        if (protocol is not None):
+            conditions.append((self.anyprotocol, self.protocols.get(parseprotocol(protocol), set())))
+        if (localport is not None):
+            conditions.extend(self.matchport("local", localport))
+        if (remoteport is not None):
+            conditions.extend(self.matchport("remote", remoteport))
+        if (protocol is not None) or (localport is not None) or (remoteport is not None):
+            conditions.extend(self.matchipfamily())
+        if (localaddress is not None):
+            conditions.extend(self.matchaddress("local", localaddress))
+        if (remoteaddress is not None):
+            conditions.extend(self.matchaddress("remote", remoteaddress))
+        if (application is not None):
+            conditions.extend(self.matchapplication(application))
+        #start from the most selective condition and test the candidates against the others
+        conditions.sort(key=lambda alternatives: sum(len(positions) for positions in alternatives))
+        if conditions:
+            matched = set().union(*conditions[0])
+        else:
+            matched = self.positions
+        for alternatives in conditions[1:]:
+            matched = {position for position in matched
+                       if any(position in positions for positions in alternatives)}
+        #a rule only matches if every group enclosing it matches as well, groups are checked against every
+        #condition but the action
+        actioned = matched
+        if (action is not None):
+            actioned = matched & self.actions.get(action.upper(), set())
+        result = []
+        for position in sorted(actioned):
+            parent = self.parents[position]
+            while (parent is not None) and (parent in matched):
+                parent = self.parents[parent]
+            if (parent is None):
+                result.append(position)
+        return result
+
+    def query(self, includegroups=False, **conditions):
+        #returns the GUIDs of the matching rules in policy order, group rules only if includegroups is set,
+        #conditions are the keyword arguments of match()
+        found = []
+        seen = set()
+        for position in self.match(**conditions):
+            ID = self.orderedruleset[position]
+            if (ID in seen) or (self.rules[ID].isgroup and not includegroups):
+                continue
+            seen.add(ID)
+            found.append(ID)
+        return found
+
+def main(argv):
+    argparser = argparse.ArgumentParser(description="Query the rules of a HIPS 8 FW policy.")
+    subparsers = argparser.add_subparsers(dest="command", required=True)
+    queryparser = subparsers.add_parser("query", help="print the rules matching every given condition as CSV")
+    queryparser.add_argument("xml")
+    queryparser.add_argument("--direction", help="IN, OUT or EITHER")
+    queryparser.add_argument("--protocol", help="transport protocol name or number, e.g. TCP or 6")
+    queryparser.add_argument("--local-port", type=parseport, help="port or low-high range")
+    queryparser.add_argument("--remote-port", type=parseport, help="port or low-high range")
+    queryparser.add_argument("--local-address", type=parsenetwork, help="address or CIDR network")
+    queryparser.add_argument("--remote-address", type=parsenetwork, help="address or CIDR network")
+    queryparser.add_argument("--application", help="application path, file name or fingerprint")
+    queryparser.add_argument("--action", help="ALLOW, BLOCK or JUMP")
+    queryparser.add_argument("--trusted", action="append", default=[], type=parsenetwork, metavar="NETWORK",
+                             help="network the Trusted aggregate stands for (may be repeated)")
+    queryparser.add_argument("--include-disabled", action="store_true")
+    queryparser.add_argument("--include-groups", action="store_true")
+    queryparser.add_argument("--cache-dir", metavar="DIR", help="HBSS_Parse_Cache directory")
+    args = argparser.parse_args(argv[1:])
+    cache = None
+    if args.cache_dir:
+        cache = HBSS_Parse_Cache.ParseCache(args.cache_dir)
+    rules, orderedruleset = HIPS_8_FW_XML_Parser_Action.loadpolicy(args.xml, cache)
+    index = RuleIndex(rules, orderedruleset, args.trusted, args.include_disabled)
+    found = index.query(args.include_groups, direction=args.direction, protocol=args.protocol,
+                        localport=args.local_port, remoteport=args.remote_port, localaddress=args.local_address,
+                        remoteaddress=args.remote_address, application=args.application, action=args.action)
+    HIPS_8_FW_XML_Parser_Action.writeoutputs(args.xml, rules, found, [HIPS_8_FW_XML_Parser_Action.OutputSpec()])
+
+if __name__=="__main__":
+    main(sys.argv)
@@ -1,6 +1,7 @@
 """
 HIPS 8 FW XML Parser
 
+UPDATED OCT 2026 - v419 - See Changelog at Bottom
 UPDATED NOV 2018 - v400 - See Changelog at Bottom
 UPDATED OCT 2017 - v302 - See Changelog at Bottom
 UPDATED OCT 2015 - v301
@@ -9,144 +10,111 @@ Provided as is, no guarantees this will work.
 
 Author: Nathan Hirst
 
-usage: python3 HIPS_8_FW_XML_Parser.py <HIPS 8 FW XML file to parse>
+usage: python3 HIPS_8_FW_XML_Parser.py <HIPS 8 FW XML file to parse, may be .xml.gz or .zip>
 """
 import xml.parsers.expat as expat
-import csv, os, copy, sys, time
+import argparse, collections, csv, enum, io, os, copy, sys, time
+import HBSS_Input_Stream, HBSS_IP_Decoder, HBSS_Stats
+
+#shared empty value of the list attributes, a rule only gets its own list once a value is appended
+novalues = ()
 
 class FWRule():
     #class to contain firewall rule as object
+    #slotted, as large exports hold hundreds of thousands of rules
+    __slots__ = ('name', 'GUID', 'action', 'group', 'isgroup', 'direction', 'ruleenabled', 'remoteport', 'localport',
+                 'networkprotocol', 'transportprotocol', 'messagetype', 'physicalmedium', 'applications',
+                 'remoteaggregates', 'localaggregates', 'rulenote', 'aggref', 'lastmodified', 'LastModifyingUsername',
+                 'tcpflags', 'weekmask', 'starttime', 'endtime', 'offhours')
+
     def __init__(self, GUID=None):
         self.name = ""
         self.GUID = GUID
         self.action = ""
         self.group = ""
+        self.isgroup = False
         self.direction = ""
         self.ruleenabled = ""        
-        self.remotenetwork = []
-        self.remoteport = []
-        self.localnetwork = []        
-        self.localport = []
+        self.remoteport = novalues
+        self.localport = novalues
         self.networkprotocol = ""
         self.transportprotocol = "All"
-        self.executable = []
-        self.exename = []
-        self.exehash = []
-        self.appsigner = []
-        self.exenote = []
-        self.rulenote = []
-        self.aggref = []
+        #ICMP message types and physical media the rule is limited to, not part of the CSV output
+        self.messagetype = novalues
+        self.physicalmedium = novalues
+        #resolved aggregate records shared with every other rule that references them, filled in by processaggs
+        self.applications = novalues
+        self.remoteaggregates = novalues
+        self.localaggregates = novalues
+        self.rulenote = novalues
+        self.aggref = novalues
         self.lastmodified = ""
         self.LastModifyingUsername = ""
+        #TCP flags and schedule of the rule, not part of the CSV output
+        self.tcpflags = novalues
+        self.weekmask = ""
+        self.starttime = ""
+        self.endtime = ""
+        self.offhours = ""
         
-    def __str__(self):
-        #returns rule as a comma separated string: Group, Name, Action, Direction, Status, Network Protocol, Transport Protocol, Local Address, Local Service, Remote Address,   
-        #Remote Service, Application, App Path, Fingerprint, AppSigner, ExeNote, RuleNote, Last Modified, Last Modifying Username
-        returnstring = "\"%s\",\"%s\",\"%s\",%s,%s,%s,%s," % (self.group, self.name, self.action, self.direction, self.ruleenabled, self.networkprotocol, self.transportprotocol)
-        if (self.remotenetwork == []):
-            returnstring += "Any,"
-        else:
-            returnstring += "\""
-            for net in self.remotenetwork:
-                returnstring += net
-            returnstring += "\","
-        if (self.remoteport == []):
-            returnstring += "Any,"
-        else:
-            returnstring += "\""
-            for port in self.remoteport:
-                returnstring += port
-            returnstring += "\","
-        if (self.localnetwork == []):
-            returnstring += "Any,"
-        else:
-            returnstring += "\""
-            for net in self.localnetwork:
-                returnstring += net
-            returnstring += "\","   
-        if (self.localport == []):
-            returnstring += "Any,"
-        else:
-            returnstring += "\""
-            for port in self.localport:
-                returnstring += port
-            returnstring += "\","        
-        #---Exe Name---    
-        beenthrough = False
-        returnstring += "\""
-        for exe in self.exename:
-            if (beenthrough):
-                returnstring += ", "
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---Executable---
-        beenthrough = False
-        returnstring += "\""
-        for exe in self.executable:
-            if (beenthrough):
-                returnstring += ", "
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---Exe Hash---
-        beenthrough = False
-        returnstring += "\""
-        for exe in self.exehash:
-            if (beenthrough):
-                returnstring += ", "
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---App Signer---
-        beenthrough = False
-        returnstring += "\""
-        for exe in self.appsigner:
-            if (beenthrough):
-                returnstring += ", "
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---Exe Note---
-        beenthrough = False
-        returnstring += "\""
-        for exe in self.exenote:
-            if (beenthrough):
-                returnstring += ", "
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---Rule Note---
-        beenthrough = True
-        returnstring += "\""
-        for exe in self.rulenote:
-            if (beenthrough):
-                returnstring += ""
-            returnstring += exe
-            beenthrough = True
-        returnstring += "\","
-        #---Last Modified Date---
-        if (self.lastmodified == []):
-            returnstring += "Any,"
-        else:
-            returnstring += "\""
-            for mod in self.lastmodified:
-                returnstring += mod
-            returnstring += "\","
-        #---Last Modified User Name---
-        if (self.LastModifyingUsername == []):
-            returnstring += ""
+    #per column views over the resolved aggregates
+    @property
+    def remotenetwork(self):
+        return [agg.address for agg in self.remoteaggregates]
+
+    @property
+    def localnetwork(self):
+        return [agg.address for agg in self.localaggregates]
+
+    @property
+    def executable(self):
+        return [agg.apppath for agg in self.applications]
+
+    @property
+    def exename(self):
+        return [agg.appname for agg in self.applications]
+
+    @property
+    def exehash(self):
+        return [agg.apphash for agg in self.applications]
+
+    @property
+    def appsigner(self):
+        return [agg.appsigner for agg in self.applications]
+
+    @property
+    def exenote(self):
+        return [agg.exenote for agg in self.applications]
+
+    def row(self):
+        #returns the rule as a tuple of column values in header_list order: Group, Name, Action, Direction, Status, Network Protocol,
+        #Transport Protocol, Remote Address, Remote Service, Local Address, Local Service, Application, App Path, Fingerprint, Signer,
+        #ExeNote, RuleNote, Last Modified, Last Modifying Username
+        #a group's own row shows its name in the Group column and leaves Name empty
+        if self.isgroup:
+            group, name = self.name, ""
         else:
-            returnstring += "\"" 
-            for mod in self.LastModifyingUsername:
-                returnstring += mod
-            returnstring += "\","
-        #---End of defined strings---
-        return returnstring 
+            group, name = self.group, self.name
+        return (group, name, self.action, self.direction, self.ruleenabled, self.networkprotocol, self.transportprotocol,
+                "".join(self.remotenetwork) if self.remotenetwork else "Any",
+                "".join(self.remoteport) if self.remoteport else "Any",
+                "".join(self.localnetwork) if self.localnetwork else "Any",
+                "".join(self.localport) if self.localport else "Any",
+                ", ".join(self.exename), ", ".join(self.executable), ", ".join(self.exehash), ", ".join(self.appsigner),
+                ", ".join(self.exenote), "".join(self.rulenote), self.lastmodified, self.LastModifyingUsername)
+
+    def __str__(self):
+        #returns rule as a comma separated string, quoted the same way as the CSV output
+        line = io.StringIO()
+        csv.writer(line, lineterminator="").writerow(self.row())
+        return line.getvalue()
 	
 class aggregate():
     #class to contain aggregate information for rules, these are either applications, or network information
     #note that for a particular aggregate not all member variables will have information depending on type
+    __slots__ = ('name', 'apppath', 'appname', 'apphash', 'appsigner', 'exenote', 'rulenote', 'ruleenabled',
+                 'remotenetwork', 'localnetwork', 'GUID', 'type')
+
     def __init__(self, GUID=None):
         self.name = ""
         self.apppath = ""
@@ -161,6 +129,39 @@ class aggregate():
         self.GUID = GUID
         self.type = 0
         
+class AggregateType(enum.IntEnum):
+    #aggregate Type values, OTHER covers anything this parser does not use
+    OTHER = 0
+    LOCALNETWORK = 65541
+    DNSSUFFIX = 65543
+    REMOTENETWORK = 65546
+    APPLICATION = 65547
+
+#immutable, fully decoded form of an aggregate, built once by resolveaggregate and shared by every rule that references it
+ResolvedAggregate = collections.namedtuple('ResolvedAggregate',
+                                           'GUID type name apppath appname apphash appsigner exenote address')
+
+def resolveaggregate(agg):
+    #returns the ResolvedAggregate of an aggregate, decoding its address once
+    try:
+        aggtype = AggregateType(int(agg.type))
+    except ValueError:
+        aggtype = AggregateType.OTHER
+    if (aggtype == AggregateType.REMOTENETWORK):
+        address = HBSS_IP_Decoder.ipFieldFromHex(agg.remotenetwork)
+    elif (aggtype == AggregateType.LOCALNETWORK):
+        address = HBSS_IP_Decoder.ipFieldFromHex(agg.localnetwork)
+    elif (aggtype == AggregateType.DNSSUFFIX):
+        address = agg.localnetwork
+    else:
+        address = ""
+    return ResolvedAggregate(agg.GUID, aggtype, agg.name, agg.apppath, agg.appname, agg.apphash, agg.appsigner,
+                             agg.exenote, address)
+
+def resolveaggregates(aggregates):
+    #resolves every aggregate exactly once, returns a dictionary of GUID to ResolvedAggregate
+    return {GUID: resolveaggregate(agg) for GUID, agg in aggregates.items()}
+
 class GrowingList(list):
     """This is a class to allow easier insertion of rules that may appear out of order to insert the ID sequence into the correct space although the correct space didn't exist at the time it will grow to have enough space. 
     i.e. if we currently have a list and we've inserted items into [0] and [1] then we see the next item to insert should be at [10] it will grow the list and have None place holders for items [2]-[9]"""
@@ -171,309 +172,520 @@ class GrowingList(list):
         
 class RuleIDSequence():
     #class to contain group rule order, uses growinglist to allow for rules to be added out of order from XML
+    __slots__ = ('rulelist', 'GUID')
+
     def __init__(self, GUID=None):
         self.rulelist = GrowingList()
         self.GUID = GUID
 
-def ipFieldFromHex(hex_field):
-    ip_dict = {'0000:0000:0000:0000:0000:0000:0000:0000':'Any',
-               '[trusted]':'Trusted'}
-    subnet_mask = ''
-    ip_v4 = False
-    for key in ip_dict:
-        if key in hex_field:
-            return ip_dict[key]
-    if hex_field.startswith('0000:0000:0000:0000:0000:ffff:'):
-        hex_field = hex_field.replace(
-            '0000:0000:0000:0000:0000:ffff:', '')
-        ip_v4 = True
-    if (ip_v4 != True):
-        return hex_field
-    if ('-' in hex_field):
-        hex_field = hex_field.split('-')
-        for y in range(2):
-            hex_field[y] = hex_field[y].split(':')
-            for z in range(2):
-                first_oct = int(hex_field[y][z][:2], 16)
-                second_oct = int(hex_field[y][z][2:], 16)
-                hex_field[y][z] = (str(first_oct) + '.' +
-                                   str(second_oct))
-            hex_field[y] = hex_field[y][0] + '.' + hex_field[y][1]
-        hex_field = hex_field[0] + ' - ' + hex_field[1]
-        return hex_field
-    if ('/' in hex_field):
-        hex_field = hex_field.split('/')
-        subnet_mask = int(hex_field[1]) - 96
-        subnet_mask = '/' + str(subnet_mask)
-        hex_field = hex_field[0]
-    hex_field = hex_field.split(':')
-    for z in range(2):
-        first_oct = int(hex_field[z][:2], 16)
-        second_oct = int(hex_field[z][2:], 16)
-        hex_field[z] = (str(first_oct) + '.' + str(second_oct))
-    hex_field = hex_field[0] + '.' + hex_field[1]
-    hex_field  = hex_field + subnet_mask
-    return hex_field
-        
-        
-def start(name, attr):
-    #function to parse each line in XML with a start tag
-    global Rules, currentGUID, currentsectiontype, linecount, Rulesequences, Aggregates, listIDfound
-    #print ('current line parse', name, attr)
-    linecount += 1
-    if (name == "EPOPolicySettings"):
-        #print ('line: ', name, attr)
-        if (attr['featureid'] != 'HOSTIPS_8000_FW'):
-            raise Exception("invalid file type, cannot process ", attr['featureid'])
-        nameelements = attr['name'].split(':')
-        currentsectiontypeparam = attr['param_int']
-        if currentsectiontypeparam == '101':
-            currentsectiontype = "Rule"
-        elif currentsectiontypeparam == '100':
-            currentsectiontype = "Sequence"
-        elif currentsectiontypeparam == '104':
-            currentsectiontype = "Aggregate"
-        #print (currentsectiontype)
-        currentGUID = nameelements[2]
-        if (currentsectiontype=="Rule"):
-            Rules[currentGUID] = FWRule(currentGUID)
-            #print ("created new rule for", currentGUID)
-        elif (currentsectiontype == "Aggregate"):
-            Aggregates[currentGUID] = aggregate(currentGUID)
-            #print ("create aggregate for", currentGUID)
-        elif (currentsectiontype == "Sequence"):
-            Rulesequences[currentGUID] = RuleIDSequence(currentGUID)
-            listIDfound = False
-            #print ("create sequence for", currentGUID)
-    if (currentsectiontype == "Rule"):
+transportprotocols = {'0':'HOPOPT','1':'ICMP','2':'IGMP','4':'IPv4','6':'TCP','17':'UDP','41':'IPv6','46':'RSVP','47':'GRE',
+                      '50':'IPsec ESP','58':'ICMPv6','89':'OSPFIGP','94':'IPIP','103':'PIM','1024':'All IP'}
+networkprotocols = {'2048':'IPv4','34525':'IPv6','34958':'0x888e'}
+
+def splitsettingname(settingname):
+    #splits a Setting name into ((prefix, field), index): '+LocalPort#0' -> (('+', 'LocalPort'), 0),
+    #'_LocalPort' -> (('_', 'LocalPort'), None), 'Name' -> (('', 'Name'), None)
+    prefix = ""
+    field = settingname
+    if field[:1] in ("+", "_"):
+        prefix = field[0]
+        field = field[1:]
+    field, sep, index = field.partition('#')
+    if (sep and index.isdigit()):
+        index = int(index)
+    else:
+        index = None
+    return ((prefix, field), index)
+
+def compilesetting(sectiontype, settingname):
+    #looks up the handler for a Setting name in a section's table and caches (handler, index) in sectiondispatch,
+    #so each distinct name is only split once per section type.  Every +RuleIDSequence#N is a distinct name, so
+    #once a section type has dispatchlimit names cached further names are split on every use instead
+    key, index = splitsettingname(settingname)
+    entry = (sectionsettings[sectiontype].get(key), index)
+    dispatch = sectiondispatch[sectiontype]
+    if (len(dispatch) < dispatchlimit):
+        dispatch[settingname] = entry
+    return entry
+
+#---Setting handlers, called as handler(parser, sectionobject, value, index)---
+#values repeated across rules (actions, directions, dates, ports, the GUIDs rules reference) are interned, so
+#every rule shares one copy of each
+def setter(attrname, interned=False):
+    #returns a handler that stores the Setting value on the section object
+    def handler(parser, obj, value, index):
+        setattr(obj, attrname, sys.intern(value) if interned else value)
+    return handler
+
+def appender(attrname, interned=False):
+    #returns a handler that appends the Setting value to a list on the section object
+    def handler(parser, obj, value, index):
+        if interned:
+            value = sys.intern(value)
+        values = getattr(obj, attrname)
+        if (values is novalues):
+            setattr(obj, attrname, [value])
+        else:
+            values.append(value)
+    return handler
+
+def sectionGUID(parser, obj, value, index):
+    parser.sectionGUID = sys.intern(value)
+
+def rulelastmodified(parser, rule, value, index):
+    rule.lastmodified = sys.intern(value.split('T')[0])
+
+def transportprotocolname(value):
+    #returns the name a rule stores for a TransportProtocol number
+    return transportprotocols.get(value) or sys.intern("Transport Protocol " + value)
+
+def ruletransportprotocol(parser, rule, value, index):
+    if (index == 0):
+        rule.transportprotocol = transportprotocolname(value)
+
+def rulenetworkprotocol(parser, rule, value, index):
+    networkprotocol = networkprotocols.get(value) or "Network Protocol " + value
+    if (rule.networkprotocol != ""):
+        networkprotocol = rule.networkprotocol + "/" + networkprotocol
+    rule.networkprotocol = sys.intern(networkprotocol)
+
+def ruleenabled(parser, rule, value, index):
+    if value == "1":
+        rule.ruleenabled = "Enabled"
+    else:
+        rule.ruleenabled = "Disabled"
+
+def aggapphash(parser, agg, value, index):
+    if value == "00000000000000000000000000000000":
+        value = "None"
+    agg.apphash = value
+
+def sequenceentry(parser, sequence, value, index):
+    if (index is not None):
+        sequence.rulelist[index] = sys.intern(value)
+
+def sequencelength(parser, sequence, value, index):
+    if len(sequence.rulelist) != int(value):
+        print ("uh oh not right length", len(sequence.rulelist))
+
+rulesettings = {('', 'Name'): setter('name'),
+                ('', 'Action'): setter('action', True),
+                ('', 'Direction'): setter('direction', True),
+                ('', 'LastModified'): rulelastmodified,
+                ('', 'LastModifyingUsername'): setter('LastModifyingUsername', True),
+                ('', 'Note'): setter('rulenote'),
+                ('', 'Enabled'): ruleenabled,
+                ('', 'GUID'): sectionGUID,
+                ('+', 'LocalPort'): appender('localport', True),
+                ('+', 'RemotePort'): appender('remoteport', True),
+                ('+', 'TransportProtocol'): ruletransportprotocol,
+                ('+', 'NetworkProtocol'): rulenetworkprotocol,
+                ('+', 'MessageType'): appender('messagetype', True),
+                ('+', 'PhysicalMedium'): appender('physicalmedium', True),
+                ('+', 'AggRef'): appender('aggref', True),
+                ('+', 'TcpFlags'): appender('tcpflags', True),
+                ('', 'WeekMask'): setter('weekmask', True),
+                ('', 'StartTime'): setter('starttime', True),
+                ('', 'EndTime'): setter('endtime', True),
+                ('', 'OffHours'): setter('offhours', True)}
+
+aggregatesettings = {('', 'Name'): setter('name'),
+                     ('', 'Note'): setter('exenote'),
+                     ('', 'Type'): setter('type', True),
+                     ('', 'GUID'): sectionGUID,
+                     ('+', 'AppNote'): setter('exenote'),
+                     ('+', 'AppPath'): setter('apppath'),
+                     ('+', 'AppHash'): aggapphash,
+                     ('+', 'AppSigner'): setter('appsigner'),
+                     ('+', 'AppName'): setter('appname'),
+                     ('+', 'RemoteAddress'): setter('remotenetwork'),
+                     ('+', 'LocalAddress'): setter('localnetwork'),
+                     ('+', 'DnsSuffix'): setter('localnetwork')}
+
+sequencesettings = {('+', 'RuleIDSequence'): sequenceentry,
+                    ('_', 'RuleIDSequence'): sequencelength,
+                    ('', 'RuleListID'): sectionGUID}
+
+sectionsettings = {"Rule": rulesettings, "Aggregate": aggregatesettings, "Sequence": sequencesettings}
+sectiondispatch = {"Rule": {}, "Aggregate": {}, "Sequence": {}}
+dispatchlimit = 4096
+
+class FW8PolicyParser():
+    """Parses a single HIPS 8 FW policy export.  All of the parse state lives on the object and the expat
+    handlers are bound methods, so several policies can be parsed at once from threads or worker processes.
+
+    After parse() the rules, aggregates and rulesequences dictionaries are keyed by the GUID found in each
+    section (RuleListID for sequences, 'null' for the top level sequence).  The section name GUIDs that
+    ePO uses in the EPOPolicySettings name attribute are kept in the aliases dictionary and resolved with
+    lookup().
+    """
+    def __init__(self):
+        self.rules = {}
+        self.aggregates = {}
+        self.resolvedaggregates = {}
+        self.rulesequences = {}
+        self.aliases = {}
+        self.groupcycles = []
+        self.currentGUID = ""
+        self.currentsectiontype = ""
+        self.currentobject = None
+        self.currentdispatch = None
+        self.sectionGUID = None
+        self.bytesparsed = 0
+
+    def parse(self, xml_file):
+        #parses an open binary file object with a fresh expat parser bound to this object
+        #element and attribute names are interned in one dictionary, and attributes are passed as a flat
+        #[name, value, ...] list instead of a new dictionary per element
+        p = expat.ParserCreate(intern={})
+        p.ordered_attributes = True
+        p.StartElementHandler = self.start
+        p.EndElementHandler = self.end
+        try:
+            p.ParseFile(xml_file)
+        except expat.ExpatError as err:
+            print ("Error:", expat.errors.messages[err.code])
+        self.bytesparsed = p.CurrentByteIndex
+        return self
+
+    def parsefile(self, filename):
+        #a .xml.gz or .zip export is decompressed as expat reads it
+        with HBSS_Input_Stream.openExport(filename) as xml_file:
+            return self.parse(xml_file)
+
+    def lookup(self, ID):
+        #returns the GUID an ID is stored under, resolving section name aliases
+        return self.aliases.get(ID, ID)
+
+    def resolve(self):
+        #resolves every aggregate once, points each rule at its aggregates and returns the rule IDs in policy order
+        self.linkaggregates()
+        return self.order()
+
+    def linkaggregates(self):
+        #resolves every aggregate once and points each rule at its aggregates
+        self.resolvedaggregates = resolveaggregates(self.aggregates)
+        for rule in self.rules.values():
+            if (len(rule.aggref) != 0):
+                processaggs(rule, self.resolvedaggregates)
+
+    def order(self):
+        #returns the rule IDs in policy order, group cycles are recorded in groupcycles
+        self.groupcycles = []
+        return orderrules(self.rules, self.rulesequences, 'null', self.groupcycles)
+
+    def start(self, name, attr):
+        #handler for each start tag in the XML, Settings are dispatched through the section's handler table
+        #attr is expat's ordered [name, value, ...] list, ePO writes a Setting's name before its value
         if (name == "Setting"):
-            if (attr['name'] == "Name"):
-                #print ("adding name ", attr['value'], "to rule", currentGUID)
-                Rules[currentGUID].name = attr['value']
-            if (attr['name'] == "Action"):
-                Rules[currentGUID].action = attr['value']
-            if (attr['name'] == "Direction"):
-                Rules[currentGUID].direction = attr['value']
-            if (attr['name'] == "LastModified"):
-                date = attr['value'].split('T')
-                Rules[currentGUID].lastmodified = date[0]
-            if "+LocalPort" in attr['name']:
-                Rules[currentGUID].localport.append(attr['value'])
-            if (attr['name'] == "+TransportProtocol#0"):
-                translate = {'0':'HOPOPT','1':'ICMP','2':'IGMP','4':'IPv4','6':'TCP','17':'UDP','41':'IPv6','46':'RSVP','47':'GRE','50':'IPsec ESP','58':'ICMPv6','89':'OSPFIGP','94':'IPIP','103':'PIM','1024':'All IP'}
-                if attr['value'] in translate:
-                    Rules[currentGUID].transportprotocol = translate[attr['value']]
-                else:
-                    Rules[currentGUID].transportprotocol = "Transport Protocol " + attr['value']
-            if "+NetworkProtocol" in attr['name']:
-                translate = {'2048':'IPv4','34525':'IPv6','34958':'0x888e'}
-                if (Rules[currentGUID].networkprotocol != ""):
-                    Rules[currentGUID].networkprotocol += "/"
-                if attr['value'] in translate:
-                    Rules[currentGUID].networkprotocol += translate[attr['value']]
-                else:
-                    Rules[currentGUID].networkprotocol += "Network Protocol " + attr['value']
-                
-            if "+RemotePort" in attr['name']:
-                Rules[currentGUID].remoteport.append(attr['value'])
-            if "+AggRef" in attr['name']:
-                #print ("adding agg", attr['value'], "to", currentGUID)
-                Rules[currentGUID].aggref.append(attr['value'])
-            if (attr['name'] == "GUID"):
-                if currentGUID != attr['value']:
-                    Rules[attr['value']] = Rules[currentGUID]
-                    #print ("Rules just got a lot more complicated")
-            if "+AppSigner" in attr['name']:
-                Aggregates[currentGUID].appsigner = attr['value']
-            #---Rule Note Begin---
-            if (attr['name'] == "Note"):
-                Rules[currentGUID].rulenote = attr['value']
-                #print ("adding Rule Note ", attr['value'])
-            #---Rule Enabled Begin---
-            if (attr['name'] == "Enabled"):
-                Rules[currentGUID].ruleenabled = attr['value']
-                if attr['value'] == "1":
-                    Rules[currentGUID].ruleenabled = "Enabled"
+            dispatch = self.currentdispatch
+            if (dispatch is not None):
+                if (attr[0] == 'name') and (attr[2:3] == ['value']):
+                    settingname = attr[1]
+                    value = attr[3]
                 else:
-                    Rules[currentGUID].ruleenabled = "Disabled"
-                #print ("adding Enabled ", attr['value'])
-            #---Rule Enabled End---                
-    elif (currentsectiontype == "Aggregate"):
-        if (name == "Setting"):
-            if (attr['name'] == "Name"):
-                Aggregates[currentGUID].name = attr['value']
-            if "+AppPath" in attr['name']:
-                Aggregates[currentGUID].apppath = attr['value']
-            if "+AppHash" in attr['name']:
-                Aggregates[currentGUID].apphash = attr['value']
-                if attr['value'] == "00000000000000000000000000000000":
-                    Aggregates[currentGUID].apphash = "None"
-            if "+AppSigner" in attr['name']:
-                Aggregates[currentGUID].appsigner = attr['value']
-                #print ("adding signer ", attr['value'])
-            if "Note" in attr['name']:
-                Aggregates[currentGUID].exenote = attr['value']
-                #---Executable Note---
-            if (attr['name'] == "Type"):
-                Aggregates[currentGUID].type = attr['value']
-            if "+RemoteAddress" in attr['name']:
-                Aggregates[currentGUID].remotenetwork = attr['value']
-            if "+LocalAddress" in attr['name']:
-                Aggregates[currentGUID].localnetwork = attr['value']
-            if "+AppName" in attr['name']:
-                Aggregates[currentGUID].appname = attr['value'] 
-            if "+DnsSuffix" in attr['name']:
-                Aggregates[currentGUID].localnetwork = attr['value']
-            if (attr['name'] == "GUID"):
-                if currentGUID != attr['value']:
-                    Aggregates[attr['value']] = Aggregates[currentGUID]
-                    #print ("Aggregates just got a lot more complicated")
-    elif (currentsectiontype == "Sequence"):
-        if (name == "Setting"):
-            if "+RuleIDSequence" in attr['name']:
-                nums = attr['name'].split('#')
-                index = int(nums[1])
-                Rulesequences[currentGUID].rulelist[index] =  attr['value']
-                #print (nums[1], "set to", Rulesequences[currentGUID].rulelist[index])
-            if "_RuleIDSequence" in attr['name']:
-                if len(Rulesequences[currentGUID].rulelist) != int(attr['value']):
-                    print ("uh oh not right length", len(Rulesequences[currentGUID].rulelist))
-            if (attr['name'] == "RuleListID"):
-                listIDfound = True
-                if currentGUID != attr['value']:
-                    Rulesequences[attr['value']] = Rulesequences[currentGUID]
-                    #print ("Sequence ", attr['value'], "set to", currentGUID)
- 
-def end(name):
-    #function to parse each line in XML with an end tag
-    global Rules, currentGUID, currentsectiontype, linecount, Rulesequences, Aggregates, listIDfound
-    #if (name != "Setting"):
-        #print ("closing out", name, "for", currentGUID)
-        #currentGUID = "" 
-    if (name == "EPOPolicySettings"):
-        if currentsectiontype == "Sequence":
-            if listIDfound == False:
-                #print ("no sequence ID found null is", currentGUID)
-                Rulesequences['null'] = Rulesequences[currentGUID]
-        #print ("closing out", currentsectiontype, currentGUID, "Lines in this section: ", linecount)
-        linecount = 0
-        currentsectiontype = ""
-        currentGUID = ""
-        
-def processaggs(rule):
-    #adds in rule's aggregate information into the rule's object
-    global Aggregates
+                    attr = dict(zip(attr[::2], attr[1::2]))
+                    settingname = attr['name']
+                    value = attr['value']
+                entry = dispatch.get(settingname)
+                if (entry is None):
+                    entry = compilesetting(self.currentsectiontype, settingname)
+                if (entry[0] is not None):
+                    entry[0](self, self.currentobject, value, entry[1])
+        elif (name == "EPOPolicySettings"):
+            attr = dict(zip(attr[::2], attr[1::2]))
+            if (attr['featureid'] != 'HOSTIPS_8000_FW'):
+                raise Exception("invalid file type, cannot process ", attr['featureid'])
+            nameelements = attr['name'].split(':')
+            currentsectiontypeparam = attr['param_int']
+            if currentsectiontypeparam == '101':
+                self.currentsectiontype = "Rule"
+            elif currentsectiontypeparam == '100':
+                self.currentsectiontype = "Sequence"
+            elif currentsectiontypeparam == '104':
+                self.currentsectiontype = "Aggregate"
+            self.currentGUID = sys.intern(nameelements[2])
+            self.sectionGUID = None
+            if (self.currentsectiontype == "Rule"):
+                self.currentobject = FWRule(self.currentGUID)
+            elif (self.currentsectiontype == "Aggregate"):
+                self.currentobject = aggregate(self.currentGUID)
+            elif (self.currentsectiontype == "Sequence"):
+                self.currentobject = RuleIDSequence(self.currentGUID)
+            self.currentdispatch = sectiondispatch.get(self.currentsectiontype)
+
+    def end(self, name):
+        #handler for each end tag in the XML, files the finished section under its GUID
+        if (name != "EPOPolicySettings"):
+            return
+        if (self.currentsectiontype == "Rule"):
+            table = self.rules
+        elif (self.currentsectiontype == "Aggregate"):
+            table = self.aggregates
+        elif (self.currentsectiontype == "Sequence"):
+            table = self.rulesequences
+            if (self.sectionGUID is None):
+                #a sequence without a RuleListID is the top level rule list
+                self.sectionGUID = 'null'
+        else:
+            table = None
+        if (table is not None):
+            GUID = self.sectionGUID or self.currentGUID
+            self.currentobject.GUID = GUID
+            table[GUID] = self.currentobject
+            if (GUID != self.currentGUID):
+                self.aliases[self.currentGUID] = GUID
+        self.currentsectiontype = ""
+        self.currentGUID = ""
+        self.currentobject = None
+        self.currentdispatch = None
+        self.sectionGUID = None
+
+def processaggs(rule, resolvedaggregates):
+    #points the rule at the resolved records of the aggregates it references
+    applications = []
+    remoteaggregates = []
+    localaggregates = []
     for agg in rule.aggref:
-        if agg in Aggregates.keys():
-            #print ("proccessing agg ", agg, "for rule", rule.GUID)
-            if (int(Aggregates[agg].type) == 65547):
-                #Aggregate contains Application information
-                rule.executable.append (Aggregates[agg].apppath)
-                rule.exename.append (Aggregates[agg].appname)
-                rule.exehash.append (Aggregates[agg].apphash)
-                rule.appsigner.append (Aggregates[agg].appsigner)
-                rule.exenote.append (Aggregates[agg].exenote)
-            if (int(Aggregates[agg].type) == 65546):
-                #Aggregate contains remote network information
-                rule.remotenetwork.append(ipFieldFromHex(Aggregates[agg].remotenetwork))
-            if (int(Aggregates[agg].type) == 65541):
-                #Aggregate contains local network information
-                rule.localnetwork.append(ipFieldFromHex(Aggregates[agg].localnetwork))
-            if (int(Aggregates[agg].type) == 65543):
-                #Aggregate contains DNSSuffix information
-                rule.localnetwork.append(Aggregates[agg].localnetwork)
+        resolved = resolvedaggregates.get(agg)
+        if (resolved is None):
+            continue
+        if (resolved.type == AggregateType.APPLICATION):
+            applications.append(resolved)
+        elif (resolved.type == AggregateType.REMOTENETWORK):
+            remoteaggregates.append(resolved)
+        elif (resolved.type == AggregateType.LOCALNETWORK) or (resolved.type == AggregateType.DNSSUFFIX):
+            localaggregates.append(resolved)
+    rule.applications = applications or novalues
+    rule.remoteaggregates = remoteaggregates or novalues
+    rule.localaggregates = localaggregates or novalues
         
-def orderrules(rules, sequences, value):
+def groupmembership(rules, sequences):
+    #marks every rule that has its own sequence as a group and sets each member's group to its group's name,
+    #rules in the top level 'null' sequence are left without a group
+    for key, sequence in sequences.items():
+        grouprule = rules.get(key)
+        if (grouprule is None):
+            continue
+        grouprule.isgroup = True
+        for ID in sequence.rulelist:
+            if ID in rules:
+                rules[ID].group = grouprule.name
+
+def orderrules(rules, sequences, value='null', cycles=None):
+    #returns the rule IDs reachable from the sequence value in policy order, each group rule followed by its members
+    #groups are expanded with an explicit stack, so nesting depth is not limited by the recursion limit, and each
+    #group is flattened once; later references to the same group copy its already flattened slice
+    #a group that contains itself is reported on stderr and in the optional cycles list and is not expanded again
+    groupmembership(rules, sequences)
     finallist = []
-    #print ("processing list for", value)
-    for ID in sequences[value].rulelist:
-        if ID in rules.keys():
-            if value != 'null':
-                rules[ID].group = rules[value].group
-            finallist.append(ID)
-        if ID in sequences.keys():
-            rules[ID].group = rules[ID].name
-            rules[ID].name = ""
-            newlist = orderrules(rules, sequences, ID)
-            finallist.extend(newlist)
-            
+    flattened = {}
+    stack = [(value, iter(sequences[value].rulelist), 0)]
+    onstack = {value}
+    while stack:
+        key, members, startindex = stack[-1]
+        for ID in members:
+            if ID in rules:
+                finallist.append(ID)
+            if ID in sequences:
+                if ID in flattened:
+                    first, last = flattened[ID]
+                    finallist.extend(finallist[first:last])
+                elif ID in onstack:
+                    cycle = [entry[0] for entry in stack] + [ID]
+                    cycle = cycle[cycle.index(ID):]
+                    print ("rule group cycle:", " -> ".join(cycle), file=sys.stderr)
+                    if (cycles is not None):
+                        cycles.append(cycle)
+                else:
+                    stack.append((ID, iter(sequences[ID].rulelist), len(finallist)))
+                    onstack.add(ID)
+                    break
+        else:
+            stack.pop()
+            onstack.discard(key)
+            flattened[key] = (startindex, len(finallist))
     return finallist
         
+def groupparents(rules, orderedruleset):
+    #returns, for each position of orderedruleset, the position of the group rule that encloses it or None at the top level
+    #groups are listed before their members, so a rule's group is the nearest still open group whose name is rule.group
+    parents = []
+    opengroups = []
+    for ID in orderedruleset:
+        rule = rules[ID]
+        while opengroups and (rules[orderedruleset[opengroups[-1]]].name != rule.group):
+            opengroups.pop()
+        if opengroups and rule.group:
+            parents.append(opengroups[-1])
+        else:
+            parents.append(None)
+        if rule.isgroup:
+            opengroups.append(len(parents) - 1)
+    return parents
+
+def portranges(ports):
+    #returns the (low, high) port ranges of a rule's RemotePort or LocalPort values, e.g. ["80, 443, 8080-8081"]
+    #gives [(80, 80), (443, 443), (8080, 8081)], entries that are not ports are skipped and an empty list means Any
+    ranges = []
+    for value in ports:
+        for entry in value.split(','):
+            low, _, high = entry.strip().partition('-')
+            try:
+                low = int(low)
+                high = int(high) if high else low
+            except ValueError:
+                continue
+            ranges.append((low, high))
+    return ranges
+
+header_list = ["Group", "Name", "Action", "Direction", "Status", "Network Protocol", "Transport Protocol", "Remote Address",
+               "Remote Service", "Local Address", "Local Service", "Application", "App Path", "Fingerprint", "Signer", "ExeNote",
+               "RuleNote", "Last Modified", "Last Modifying Username"]
+
+class OutputSpec():
+    #class to describe one output of a conversion, either every rule or only the rules changed since a date,
+    #written to a CSV file next to the XML file or streamed to stdout
+    #CSV files are written through csv.writer in batches of batchsize rows into a large file buffer
+    batchsize = 2048
+    buffersize = 1 << 20
+
+    def __init__(self, rulessincestr=None, CSV=False):
+        self.rulessincestr = rulessincestr
+        self.rulessince = None
+        if (rulessincestr is not None):
+            self.rulessince = time.strptime(rulessincestr, "%m-%d-%Y")
+        self.csv = CSV
+        self.outfile = None
+        self.writer = None
+        self.pending = []
+
+    def filename(self, xmlfilename):
+        #returns the CSV file name this spec writes to for the given XML file
+        if (self.rulessincestr is None):
+            return HBSS_Input_Stream.exportBase(xmlfilename) + '_CSV_TR.csv'
+        return HBSS_Input_Stream.exportBase(xmlfilename) + '_' + self.rulessincestr + '_CSV_TR.csv'
+
+    def open(self, xmlfilename):
+        if self.csv:
+            self.outfile = open(self.filename(xmlfilename), 'w', newline='', buffering=self.buffersize)
+            self.writer = csv.writer(self.outfile)
+        else:
+            #rows are streamed to stdout as they are produced
+            self.writer = csv.writer(sys.stdout, lineterminator="\n")
+        self.writer.writerow(header_list)
+
+    def write(self, row):
+        if self.csv:
+            self.pending.append(row)
+            if (len(self.pending) >= self.batchsize):
+                self.flush()
+        else:
+            self.writer.writerow(row)
+
+    def flush(self):
+        if self.pending:
+            self.writer.writerows(self.pending)
+            self.pending = []
+
+    def close(self):
+        if (self.outfile is not None):
+            self.flush()
+            self.outfile.close()
+            self.outfile = None
+        self.writer = None
+
+def parsexml(filename):
+    #parses the XML file and returns the FW8PolicyParser holding its rules, aggregates and sequences
+    return FW8PolicyParser().parsefile(filename)
+
+def writeoutputs(filename, rules, orderedruleset, outputspecs, stats=None):
+    #fans the ordered rule set out to every output spec, a rule's row and date are built once and shared by every spec
+    #with stats (HBSS_Stats.PhaseStats) the time spent building rows and parsing rule dates is added up separately
+    stats = stats or HBSS_Stats.nostats
+    rowof = stats.timed('FWRule.row', FWRule.row)
+    parsedate = stats.timed('date filter', time.strptime)
+    datefiltered = False
+    for spec in outputspecs:
+        if (spec.rulessince is not None):
+            datefiltered = True
+    try:
+        for spec in outputspecs:
+            spec.open(filename)
+        for ID in orderedruleset:
+            rule = rules[ID]
+            if datefiltered:
+                ruledate = parsedate(rule.lastmodified, "%Y-%m-%d")
+            row = rowof(rule)
+            for spec in outputspecs:
+                if (spec.rulessince is None) or (ruledate > spec.rulessince):
+                    spec.write(row)
+    finally:
+        for spec in outputspecs:
+            spec.close()
+
+def loadpolicy(filename, cache=None, stats=None):
+    #returns the (rules, orderedruleset) of the XML file, parsing and resolving it once
+    #with a cache (HBSS_Parse_Cache.ParseCache) an unchanged file is loaded from the cache instead of parsed
+    #with stats (HBSS_Stats.PhaseStats) the parse, linkaggregates and order phases are timed
+    stats = stats or HBSS_Stats.nostats
+    if (cache is not None):
+        with stats.phase('cache load') as phase:
+            cached = cache.load(filename)
+            phase.counts['hit'] = cached is not None
+        if (cached is not None):
+            return cached
+    with stats.phase('parse') as phase:
+        policy = parsexml(filename)
+        phase.counts.update(bytes=policy.bytesparsed, rules=len(policy.rules), aggregates=len(policy.aggregates),
+                            sequences=len(policy.rulesequences))
+    with stats.phase('linkaggregates') as phase:
+        policy.linkaggregates()
+        phase.counts['aggregates'] = len(policy.resolvedaggregates)
+    with stats.phase('order') as phase:
+        orderedruleset = policy.order()
+        phase.counts.update(rules=len(orderedruleset), groupcycles=len(policy.groupcycles))
+    if (cache is not None):
+        with stats.phase('cache store'):
+            cache.store(filename, policy.rules, orderedruleset)
+    return policy.rules, orderedruleset
+
+def convert(filename, outputspecs, cache=None, stats=None):
+    #loads the ordered rules of the XML file once, then writes them to every output spec
+    stats = stats or HBSS_Stats.nostats
+    stats.setSource(filename)
+    rules, orderedruleset = loadpolicy(filename, cache, stats)
+    with stats.phase('write') as phase:
+        writeoutputs(filename, rules, orderedruleset, outputspecs, stats)
+        phase.counts.update(rules=len(orderedruleset), outputs=len(outputspecs))
+
 def main(argv, CSV = False):
-    csv = CSV
-    #print (len(argv))
     if (len(argv) < 2):
-        print ("Not enough arguments\n Usage HIPS_8_FW_XML_Parser_Action.py [XML file to parse] [Optional: Date of rules changed since in format MM-DD-YYYY]")
+        print ("Not enough arguments\n Usage HIPS_8_FW_XML_Parser_Action.py [XML file to parse] [Optional: One or more dates of rules changed since in format MM-DD-YYYY]")
         exit(0)
-    filename = argv[1]
-    onlyrulessince = False
-    
-    xml_file = open(filename, 'rb')
-    
-    #print (filename)
-    p = expat.ParserCreate()
-    p.StartElementHandler = start
-    p.EndElementHandler = end
-    global Rules, Rulesequences, Aggregates
-    global currentsectiontype, linecount
-    currentsectiontype = ""
-    linecount = 0
-    Rules = {}
-    Rulesequences = {}
-    Aggregates = {}
-    global currentGUID 
-    currentGUID = ""
-    try:
-        #print ("starting parse")
-        p.ParseFile(xml_file)
-    except expat.ExpatError as err:
-        print ("Error:", expat.errors.messages[err.code])
-    #print ("finished parse")
-    if (len(argv) >= 3):
-        #print ("date provided")
-        onlyrulessince = True
-    if csv and not onlyrulessince:
-        csv_file = open(filename[:-4] + '_CSV_TR.csv', 'w')
-    if (onlyrulessince):
-        rulessincestr = argv[2]
-        rulessince = time.strptime(rulessincestr, "%m-%d-%Y")
-        if csv:
-            csv_file = open(filename[:-4] +'_'+ rulessincestr +'_CSV_TR.csv', 'w')
-        #print (rulessince)
-    if not csv:
-        print ("Group, Name, Action, Direction, Status, Network Protocol, Transport Protocol, Remote Address, Remote Service, Local Address, Local Service, Application, App Path, Fingerprint, Signer, ExeNote, RuleNote, Last Modified, Last Modifying Username")
+    argparser = argparse.ArgumentParser(prog=os.path.basename(argv[0]), description='Convert a HIPS 8 FW export to CSV.')
+    argparser.add_argument('filename', help='XML file to parse')
+    argparser.add_argument('rulessince', nargs='*', metavar='MM-DD-YYYY',
+                           help='also write the rules changed since each date')
+    HBSS_Stats.addArguments(argparser)
+    args = argparser.parse_args(argv[1:])
+    #stdout holds a single CSV, the rows of several dates would be interleaved in it
+    if (not CSV) and (len(args.rulessince) > 1):
+        argparser.error('only one date can be written to stdout')
+    if args.rulessince:
+        outputspecs = [OutputSpec(rulessincestr, CSV) for rulessincestr in args.rulessince]
     else:
-        csv_file.write("Group, Name, Action, Direction, Status, Network Protocol, Transport Protocol, Remote Address, Remote Service, Local Address, Local Service, Application, App Path, Fingerprint, Signer, ExeNote, RuleNote, Last Modified, Last Modifying Username\n")
-    for key in Rules.keys():
-        if "Settings" in key:
-            continue
-        if (len(Rules[key].aggref) != 0):
-            #print (key)
-            processaggs(Rules[key])
-        #print (Rules[key])
-    orderedruleset = orderrules(Rules, Rulesequences, 'null')
-    for rule in orderedruleset:
-        if (onlyrulessince):
-            #parse time
-            #print (Rules[rule].lastmodified)
-            if (time.strptime(Rules[rule].lastmodified, "%Y-%m-%d") > rulessince):
-                if not csv:
-                    print (Rules[rule])
-                else:
-                    csv_file.write(str(Rules[rule]))
-                    csv_file.write('\n')
-                
-        else:
-            if not csv:
-                print (Rules[rule])
-            else:
-                csv_file.write(str(Rules[rule]))
-                csv_file.write('\n')
-    if csv:
-        csv_file.close()
-    
-
-
+        outputspecs = [OutputSpec(None, CSV)]
+    stats = HBSS_Stats.statsFromArguments(args)
+    if (stats is not None):
+        stats.start()
+    try:
+        HBSS_Stats.runProfiled(args.profile, convert, args.filename, outputspecs, None, stats)
+    finally:
+        if (stats is not None):
+            stats.stop()
+    #without CSV the rows go to stdout, so the statistics are printed to stderr
+    HBSS_Stats.reportFromArguments(stats, args, sys.stderr)
     
         
 if __name__=="__main__":
@@ -485,6 +697,78 @@ if __name__=="__main__":
 ################################################################################
 # BEGIN: Changelog
 ################################################################################
+#   v419 -      The cache of compiled Setting names holds at most dispatchlimit names
+#               per section type, so parsing many exports in one process no longer
+#               grows it with every +RuleIDSequence#N.
+#
+#   v418 -      Rules keep their TCP flags and schedule (WeekMask, StartTime, EndTime,
+#               OffHours) so HIPS_8_FW_Diff_Action reports changes to them.  The CSV
+#               output is unchanged.
+#
+#   v417 -      Only one date is accepted when the rows are written to stdout, as the
+#               rows of several dates were interleaved into one unreadable stream.
+#
+#   v416 -      The LastModifyingUsername setting of a rule is read, so the Last
+#               Modifying Username column (and fw_rules.last_modifying_user in the
+#               SQLite export) is filled instead of always being empty.
+#
+#   v415 -      Exports are opened through HBSS_Input_Stream, so .xml.gz and .zip
+#               exports are parsed straight from the archive, decompressed as expat
+#               reads them.  The CSV files of NAME.xml.gz are named NAME_CSV_TR.csv.
+#
+#   v414 -      --stats, --stats-json, --trace-memory and --profile report the wall
+#               time, CPU time, counts and heap peak of the parse, linkaggregates,
+#               order and write phases (see HBSS_Stats), with the time spent in
+#               FWRule.row() and the date filter broken out of the write phase.
+#
+#   v413 -      FW8PolicyParser.resolve() is split into linkaggregates() and order()
+#               so HBSS_Benchmark can time the two stages separately.
+#
+#   v412 -      FWRule, aggregate and RuleIDSequence use __slots__, empty list fields
+#               share one empty tuple until a value is added, and repeated values
+#               (actions, directions, dates, ports, referenced GUIDs) are interned.
+#               expat interns names and passes attributes as ordered lists.
+#               Peak memory of a 200k rule export: 401 MB -> 231 MB.
+#
+#   v411 -      Rules keep their ICMP message types and physical media for the rule
+#               analyzer.  The CSV output is unchanged.
+#
+#   v410 -      groupparents() gives the enclosing group of every position in the
+#               ordered rule set, used by HIPS_8_FW_Rule_Index and the SQLite export.
+#
+#   v409 -      loadpolicy() returns the resolved, ordered rule set for other tools
+#               (diff, SQLite export).  portranges() turns RemotePort/LocalPort
+#               values into numeric (low, high) ranges.
+#
+#   v408 -      convert() can load and store resolved rule sets in a content
+#               addressed HBSS_Parse_Cache.
+#
+#   v407 -      Rule groups are flattened iteratively with memoized group expansion
+#               and cycle detection.  Group membership is computed once and group
+#               rules are no longer renamed while the policy is ordered.
+#
+#   v406 -      Aggregates are resolved once into immutable ResolvedAggregate records
+#               with a typed AggregateType and a pre-decoded address, and rules hold
+#               references to those records instead of per rule copies.
+#
+#   v405 -      Address decoding moved to the shared, cached HBSS_IP_Decoder module.
+#
+#   v404 -      Setting names are split once into prefix/field/index and dispatched
+#               through per-section handler tables instead of a chain of string
+#               comparisons.
+#
+#   v403 -      Output rows are built as column tuples by FWRule.row() and written
+#               with csv.writer in buffered batches, so embedded quotes, commas and
+#               newlines are escaped correctly.
+#
+#   v402 -      Parse state moved off module globals into FW8PolicyParser so policies
+#               can be parsed concurrently.  Section name GUIDs are kept in an alias
+#               index instead of being duplicated as dictionary keys.
+#
+#   v401 -      Single pass conversion: the XML is parsed and resolved once and the
+#               ordered rules are written to every requested output (full CSV plus
+#               any number of "changed since" dates).
+#
 #   v400 -      CANES:  Added Last Modified column to output.
 #                       Added Last Modifying Username column to output.
 #                       Updated Transport Protocols